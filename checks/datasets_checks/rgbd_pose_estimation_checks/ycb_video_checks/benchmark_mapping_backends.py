@@ -0,0 +1,114 @@
+#!/usr/bin/env python
+
+import argparse
+import time
+
+import numpy as np
+
+import morefusion
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--n-frames", type=int, default=10, help="# frames")
+    args = parser.parse_args()
+
+    dataset = morefusion.datasets.YCBVideoRGBDPoseEstimationDataset("val")
+
+    indices = np.linspace(0, len(dataset) - 1, args.n_frames).astype(int)
+    for index in indices:
+        frame = dataset.get_frame(index)
+        K = frame["intrinsic_matrix"]
+        pcd = morefusion.geometry.pointcloud_from_depth(
+            frame["depth"], fx=K[0, 0], fy=K[1, 1], cx=K[0, 2], cy=K[1, 2],
+        )
+
+        target_ids = []
+        pitches = []
+        origins = []
+        for instance_id, class_id in zip(
+            frame["instance_ids"], frame["class_ids"]
+        ):
+            if class_id == 0:
+                continue
+            mask = frame["instance_label"] == instance_id
+            if np.isnan(pcd[mask]).all():
+                continue
+            pitch = dataset._models.get_voxel_pitch(
+                dataset._voxel_dim, class_id
+            )
+            center = np.nanmedian(pcd[mask], axis=0)
+            target_ids.append(instance_id)
+            pitches.append(pitch)
+            origins.append(center - (dataset._voxel_dim / 2 - 0.5) * pitch)
+        dimensions = (dataset._voxel_dim,) * 3
+
+        results = {}
+        for backend in ["octomap", "voxel_hash"]:
+            t_start = time.time()
+            mapping = dataset.build_octomap(
+                pcd,
+                frame["instance_label"],
+                frame["instance_ids"],
+                frame["class_ids"],
+                backend=backend,
+            )
+            t_integrate = time.time() - t_start
+
+            t_start = time.time()
+            grids = []
+            for target_id, pitch, origin in zip(target_ids, pitches, origins):
+                grids.append(
+                    mapping.get_target_grids(
+                        target_id,
+                        dimensions=dimensions,
+                        pitch=pitch,
+                        origin=origin,
+                    )
+                )
+            t_grids = time.time() - t_start
+            results[backend] = grids
+
+            print(
+                f"[{index:08d}] backend={backend:>10s}, "
+                f"integrate={t_integrate:.3f} [s], "
+                f"get_target_grids={t_grids:.3f} [s]"
+            )
+
+        if target_ids:
+            t_start = time.time()
+            grids = dataset._get_projective_target_grids(
+                frame,
+                target_ids,
+                [dict(origin=o, pitch=p) for o, p in zip(origins, pitches)],
+            )
+            results["projective"] = list(zip(*grids))
+            print(
+                f"[{index:08d}] backend={'projective':>10s}, "
+                f"projective_target_grids={time.time() - t_start:.3f} [s]"
+            )
+        else:
+            results["projective"] = []
+
+        for backend in ["voxel_hash", "projective"]:
+            for grids_octomap, grids_other in zip(
+                results["octomap"], results[backend]
+            ):
+                agreements = []
+                for grid_octomap, grid_other in zip(
+                    grids_octomap, grids_other
+                ):
+                    agreements.append(
+                        ((grid_octomap > 0) == (grid_other > 0)).mean()
+                    )
+                print(
+                    f"[{index:08d}] agreement with octomap of {backend} "
+                    "(target, nontarget, empty): "
+                    + ", ".join(f"{a:.1%}" for a in agreements)
+                )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python
+
+import argparse
+import time
+
+import numpy as np
+import trimesh
+
+import morefusion
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("--n-frames", type=int, default=10, help="# frames")
+    args = parser.parse_args()
+
+    dataset = morefusion.datasets.YCBVideoRGBDPoseEstimationDataset("val")
+    models = dataset._models
+
+    meshes = {}
+    indices = np.linspace(0, len(dataset) - 1, args.n_frames).astype(int)
+    for index in indices:
+        frame = dataset.get_frame(index)
+        height, width = frame["depth"].shape
+
+        # fovy of render_cad, whose pixel centers are at half integers
+        K = frame["intrinsic_matrix"]
+        camera = trimesh.scene.Camera(
+            resolution=(width, height), focal=(K[0, 0], K[1, 1]),
+        )
+        fy = height / 2 / np.tan(np.deg2rad(camera.fov[1]) / 2)
+        K = np.array(
+            [[fy, 0, width / 2 - 0.5], [0, fy, height / 2 - 0.5], [0, 0, 1]]
+        )
+
+        cad_files = []
+        Ts_cad2cam = []
+        for class_id, T_cad2cam in zip(
+            frame["class_ids"], frame["Ts_cad2cam"]
+        ):
+            if class_id == 0:
+                continue
+            cad_file = models.get_cad_file(class_id)
+            if cad_file not in meshes:
+                meshes[cad_file] = trimesh.load(str(cad_file), process=False)
+            cad_files.append(cad_file)
+            Ts_cad2cam.append(T_cad2cam)
+
+        t_start = time.time()
+        masks_pybullet = []
+        for cad_file, T_cad2cam in zip(cad_files, Ts_cad2cam):
+            _, _, mask = morefusion.extra.pybullet.render_cad(
+                cad_file, T_cad2cam, camera.fov[1], height, width
+            )
+            masks_pybullet.append(mask)
+        t_pybullet = time.time() - t_start
+
+        t_start = time.time()
+        _, _, masks = morefusion.extra.rasterize.rasterize_meshes(
+            [meshes[cad_file] for cad_file in cad_files],
+            Ts_cad2cam,
+            K,
+            height,
+            width,
+        )
+        t_rasterize = time.time() - t_start
+
+        ious = []
+        for mask, mask_pybullet in zip(masks, masks_pybullet):
+            union = (mask | mask_pybullet).sum()
+            if union > 0:
+                ious.append((mask & mask_pybullet).sum() / union)
+
+        print(
+            f"[{index:08d}] n_instance={len(cad_files)}, "
+            f"render_cad={t_pybullet:.3f}[s], "
+            f"rasterize_meshes={t_rasterize:.3f}[s], "
+            f"mask_iou={np.mean(ious):.3f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/env python
+
+import time
+
+import chainer
+import numpy as np
+
+import morefusion
+
+
+def average_voxelization_3d_loop(
+    values, points, batch_indices, *, batch_size, origin, pitch, dimensions
+):
+    # reference implementation with python loop over points
+    C = values.shape[1]
+    matrix = np.zeros((batch_size, C) + dimensions, dtype=np.float32)
+    counts = np.zeros((batch_size,) + dimensions, dtype=np.int32)
+    for i in range(points.shape[0]):
+        index = ((points[i] - origin) / pitch).round().astype(int)
+        if ((0 <= index) & (index < dimensions)).all():
+            ix, iy, iz = index
+            matrix[batch_indices[i], :, ix, iy, iz] += values[i]
+            counts[batch_indices[i], ix, iy, iz] += 1
+    IB, IX, IY, IZ = np.nonzero(counts)
+    matrix[IB, :, IX, IY, IZ] /= counts[IB, IX, IY, IZ][:, None]
+    return matrix
+
+
+def main():
+    batch_size = 16
+    channels = 32
+    dimensions = (32, 32, 32)
+    origin = np.zeros((3,), dtype=np.float32)
+    pitch = np.float32(1.0)
+
+    for n_point in [1000, 10000, 100000, 1000000]:
+        points = np.random.uniform(0, 32, (n_point, 3)).astype(np.float32)
+        values = np.random.uniform(-1, 1, (n_point, channels)).astype(
+            np.float32
+        )
+        batch_indices = np.random.randint(
+            0, batch_size, n_point, dtype=np.int32
+        )
+        values = chainer.Variable(values)
+        kwargs = dict(
+            batch_size=batch_size,
+            origin=origin,
+            pitch=pitch,
+            dimensions=dimensions,
+        )
+
+        t_start = time.time()
+        y = morefusion.functions.average_voxelization_3d(
+            values, points, batch_indices, **kwargs
+        )
+        t_forward = time.time() - t_start
+        y.grad = np.ones_like(y.array)
+        t_start = time.time()
+        y.backward()
+        t_backward = time.time() - t_start
+
+        t_start = time.time()
+        _, features = morefusion.functions.average_voxelization_3d(
+            values, points, batch_indices, sparse=True, **kwargs
+        )
+        t_sparse = time.time() - t_start
+
+        msg = (
+            f"n_point={n_point:>8d}, "
+            f"forward={t_forward:.4f} [s], backward={t_backward:.4f} [s], "
+            f"forward_sparse={t_sparse:.4f} [s], "
+            f"nbytes={y.array.nbytes / 2 ** 20:.1f} -> "
+            f"{features.array.nbytes / 2 ** 20:.1f} [MB]"
+        )
+        if n_point <= 10000:
+            t_start = time.time()
+            y_loop = average_voxelization_3d_loop(
+                values.array, points, batch_indices, **kwargs
+            )
+            t_loop = time.time() - t_start
+            np.testing.assert_allclose(y.array, y_loop)
+            msg += f", forward_loop={t_loop:.4f} [s]"
+        print(msg)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+
+import time
+
+import chainer
+import numpy as np
+
+import morefusion
+
+
+def main():
+    batch_size = 16
+    n_point = 1000
+
+    # feat3 and feat4 in singleview_3d.models.Model
+    for channels, dim in [(256, 16), (512, 8)]:
+        voxelized = np.random.uniform(
+            -1, 1, (batch_size, channels, dim, dim, dim)
+        ).astype(np.float32)
+        points = np.random.uniform(0, dim - 1, (batch_size * n_point, 3))
+        points = points.astype(np.float32)
+        batch_indices = np.arange(batch_size, dtype=np.int32).repeat(n_point)
+        voxelized = chainer.Variable(voxelized)
+
+        t_start = time.time()
+        y = morefusion.functions.interpolate_voxel_grid(
+            voxelized, points, batch_indices
+        )
+        t_forward = time.time() - t_start
+        y.grad = np.ones_like(y.array)
+        t_start = time.time()
+        y.backward()
+        t_backward = time.time() - t_start
+
+        n_total = batch_size * n_point
+        print(
+            f"voxelized={voxelized.shape}, n_point={n_total}, "
+            f"forward={t_forward:.4f} [s] ({n_total / t_forward:.0f} [pt/s])"
+            f", backward={t_backward:.4f} [s] "
+            f"({n_total / t_backward:.0f} [pt/s])"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,53 @@
+#!/usr/bin/env python
+
+import time
+
+import chainer
+import numpy as np
+
+import morefusion
+
+
+def main():
+    batch_size = 16
+    channels = 32
+    dimensions = (32, 32, 32)
+    origin = np.zeros((3,), dtype=np.float32)
+    pitch = np.float32(1.0)
+
+    for n_point in [1000, 10000, 100000, 1000000, 4000000]:
+        points = np.random.uniform(0, 32, (n_point, 3)).astype(np.float32)
+        values = np.random.uniform(-1, 1, (n_point, channels)).astype(
+            np.float32
+        )
+        intensities = np.linalg.norm(values, axis=1)
+        batch_indices = np.random.randint(
+            0, batch_size, n_point, dtype=np.int32
+        )
+        values = chainer.Variable(values)
+
+        t_start = time.time()
+        y = morefusion.functions.max_voxelization_3d(
+            values,
+            points,
+            batch_indices,
+            intensities,
+            batch_size=batch_size,
+            origin=origin,
+            pitch=pitch,
+            dimensions=dimensions,
+        )
+        t_forward = time.time() - t_start
+        y.grad = np.ones_like(y.array)
+        t_start = time.time()
+        y.backward()
+        t_backward = time.time() - t_start
+
+        print(
+            f"n_point={n_point:>8d}, "
+            f"forward={t_forward:.4f} [s], backward={t_backward:.4f} [s]"
+        )
+
+
+if __name__ == "__main__":
+    main()
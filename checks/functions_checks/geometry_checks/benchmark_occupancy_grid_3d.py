@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+
+import time
+import tracemalloc
+
+import chainer
+import numpy as np
+
+import morefusion
+
+
+def main():
+    dims = (32, 32, 32)
+    pitch = 1.0
+    origin = (0, 0, 0)
+    threshold = 2
+
+    for n_point in [500, 1000, 2000, 5000]:
+        points = np.random.uniform(0, 32, (n_point, 3)).astype(np.float32)
+
+        for local in [False, True]:
+            if not local and n_point > 2000:
+                # too much memory
+                print(f"n_point={n_point:>5d}, local={local}, skipped")
+                continue
+
+            points_variable = chainer.Variable(points)
+
+            tracemalloc.start()
+            t_start = time.time()
+            grid = morefusion.functions.occupancy_grid_3d(
+                points_variable,
+                pitch=pitch,
+                origin=origin,
+                dims=dims,
+                threshold=threshold,
+                local=local,
+            )
+            chainer.functions.sum(grid).backward()
+            elapsed_time = time.time() - t_start
+            _, peak_memory = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+
+            print(
+                f"n_point={n_point:>5d}, local={local}, "
+                f"time={elapsed_time:.4f} [s], "
+                f"peak_memory={peak_memory / 1e6:.1f} [MB]"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -17,6 +17,11 @@ name = "Densefusion_occupancy_result"
 occupancy_dir = contrib.get_eval_result(name)
 occupancy_dir.mkdir_p()
 
+# octree mappings shared among the evaluations
+mapping_dir = contrib.get_eval_result(name="Densefusion_mapping")
+mapping_dir.mkdir_p()
+mapping_pitch = 0.01
+
 norefine_dir = contrib.get_eval_result(name="Densefusion_wo_refine_result")
 for result_file in sorted(norefine_dir.glob("*.mat")):
     result = scipy.io.loadmat(
@@ -34,15 +39,24 @@ for result_file in sorted(norefine_dir.glob("*.mat")):
         depth, fx=K[0, 0], fy=K[1, 1], cx=K[0, 2], cy=K[1, 2],
     )
 
-    mapping = preliminary.MultiInstanceOctreeMapping()
-    mask_bg = np.ones(rgb.shape[:2], dtype=bool)
-    for ins_id, mask in zip(result["labels"], result["masks"]):
-        mask = mask.astype(bool)
-        mapping.initialize(ins_id, pitch=0.01)
-        mapping.integrate(ins_id, mask, pcd_scene)
-        mask_bg = mask_bg & (~mask)
-    mapping.initialize(0, pitch=0.01)
-    mapping.integrate(0, mask_bg, pcd_scene)
+    # the pitch is part of the name not to reuse maps of another pitch
+    mapping_file = frame_id.replace("/", "_")
+    mapping_file = mapping_dir / f"{mapping_file}_pitch{mapping_pitch}.bin"
+    if mapping_file.exists():
+        mapping = morefusion.contrib.MultiInstanceOctreeMapping.load(
+            mapping_file
+        )
+    else:
+        mapping = morefusion.contrib.MultiInstanceOctreeMapping()
+        mask_bg = np.ones(rgb.shape[:2], dtype=bool)
+        for ins_id, mask in zip(result["labels"], result["masks"]):
+            mask = mask.astype(bool)
+            mapping.initialize(ins_id, pitch=mapping_pitch)
+            mapping.integrate(ins_id, mask, pcd_scene)
+            mask_bg = mask_bg & (~mask)
+        mapping.initialize(0, pitch=mapping_pitch)
+        mapping.integrate(0, mask_bg, pcd_scene)
+        mapping.save(mapping_file)
 
     # import sys
     # sys.path.insert(0, '../preliminary')
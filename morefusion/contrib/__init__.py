@@ -3,9 +3,12 @@
 from .icp_registration import ICPRegistration
 
 from .multi_instance_octree_mapping import MultiInstanceOctreeMapping
+from .multi_instance_tsdf_mapping import MultiInstanceTSDFMapping
 
 from .iterative_closest_point_link import IterativeClosestPointLink
 
 from .iterative_collision_check_link import IterativeCollisionCheckLink
 
 from .occupancy_registration import OccupancyRegistration
+
+from .voxel_hash_occupancy_mapping import VoxelHashOccupancyMapping
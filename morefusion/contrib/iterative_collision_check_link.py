@@ -40,53 +40,73 @@ class IterativeCollisionCheckLink(chainer.Link):
             for p, t in zip(points, transform)
         ]
 
-        grid_uniform = []
-        grid_surface = []
-        grid_inside = []
-        grid_nontarget_empty = [g for g in grid_nontarget_empty]
-        for i in range(len(points)):
-            (
-                grid_uniform_i,
-                grid_surface_i,
-                grid_inside_i,
-            ) = functions_module.pseudo_occupancy_voxelization(
-                points[i],
-                sdf[i],
-                pitch=pitch[i],
-                origin=origin[i],
-                dims=(self._voxel_dim,) * 3,
-                threshold=self._voxel_threshold,
-                sdf_offset=self._sdf_offset,
-            )
-            grid_uniform.append(grid_uniform_i)
-            grid_surface.append(grid_surface_i)
-            grid_inside.append(grid_inside_i)
+        xp = self.xp
+        n_object = len(points)
+        dims = (self._voxel_dim,) * 3
+        pitch = xp.stack([xp.asarray(p, dtype=np.float32) for p in pitch])
+        origin = xp.stack([xp.asarray(o, dtype=np.float32) for o in origin])
 
-            if len(points) <= 1:
-                continue
-            points_other = F.concat(
-                [p for j, p in enumerate(points) if i != j], axis=0
-            )
-            sdf_other = self.xp.concatenate(
-                [p for j, p in enumerate(sdf) if i != j], axis=0
+        # all objects voxelized at once in each object's own grid
+        batch_indices = xp.concatenate(
+            [
+                xp.full((len(p),), i, dtype=np.int32)
+                for i, p in enumerate(points)
+            ]
+        )
+        (
+            grid_uniform,
+            grid_surface,
+            grid_inside,
+        ) = functions_module.pseudo_occupancy_voxelization(
+            F.concat(points, axis=0),
+            xp.concatenate(sdf, axis=0),
+            pitch=pitch,
+            origin=origin,
+            dims=dims,
+            threshold=self._voxel_threshold,
+            sdf_offset=self._sdf_offset,
+            batch_indices=batch_indices,
+            batch_size=n_object,
+        )
+
+        grid_nontarget_empty = F.stack([g for g in grid_nontarget_empty])
+        if n_object > 1:
+            # the other objects voxelized at once in each object's grid
+            pairs = [
+                (i, j)
+                for i in range(n_object)
+                for j in range(n_object)
+                if i != j
+            ]
+            batch_indices = xp.concatenate(
+                [
+                    xp.full((len(points[j]),), i, dtype=np.int32)
+                    for i, j in pairs
+                ]
             )
             _, _, grid_other = functions_module.pseudo_occupancy_voxelization(
-                points_other,
-                sdf_other,
-                pitch=pitch[i],
-                origin=origin[i],
-                dims=(self._voxel_dim,) * 3,
+                F.concat([points[j] for _, j in pairs], axis=0),
+                xp.concatenate([sdf[j] for _, j in pairs], axis=0),
+                pitch=pitch,
+                origin=origin,
+                dims=dims,
                 threshold=self._voxel_threshold,
+                batch_indices=batch_indices,
+                batch_size=n_object,
             )
             # TODO(wkentaro): Fix this properly
-            if not self.xp.isnan(grid_other.array).any():
-                grid_nontarget_empty[i] = F.maximum(
-                    grid_nontarget_empty[i], grid_other
-                )
-        grid_uniform = F.stack(grid_uniform)
-        grid_surface = F.stack(grid_surface)
-        grid_inside = F.stack(grid_inside)
-        grid_nontarget_empty = F.stack(grid_nontarget_empty)
+            valid = ~xp.isnan(grid_other.array).any(axis=(1, 2, 3))
+            valid = xp.broadcast_to(
+                valid[:, None, None, None], grid_other.shape
+            )
+            grid_other = F.where(
+                valid, grid_other, xp.zeros_like(grid_other.array)
+            )
+            grid_nontarget_empty = F.where(
+                valid,
+                F.maximum(grid_nontarget_empty, grid_other),
+                grid_nontarget_empty,
+            )
 
         reward = F.sum(grid_surface * grid_target) / F.sum(grid_target)
         # penalty = F.sum(grid_uniform * grid_nontarget_empty) / F.sum(
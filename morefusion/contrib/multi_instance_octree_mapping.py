@@ -1,12 +1,176 @@
+import collections
+import concurrent.futures
+import json
+
 import numpy as np
 import octomap
-import trimesh
+
+
+def _encode_keys(keys):
+    # (N, 3) keys of 16 bits -> (N,) int64
+    return (keys[:, 0] << 32) | (keys[:, 1] << 16) | keys[:, 2]
+
+
+def _extract_pointcloud_bbx(octree, bbx_min, bbx_max):
+    # octomap.OcTree.extractPointCloud only for the leaves intersecting
+    # [bbx_min, bbx_max), whose finest voxels are cropped by it
+    resolution = octree.getResolution()
+
+    coordinates = []
+    sizes = []
+    occupied = []
+    for leaf in octree.begin_leafs_bbx(bbx_min, bbx_max):
+        coordinates.append(np.asarray(leaf.getCoordinate(), dtype=float))
+        sizes.append(leaf.getSize())
+        occupied.append(octree.isNodeOccupied(leaf))
+    coordinates = np.array(coordinates, dtype=float).reshape(-1, 3)
+    sizes = np.array(sizes, dtype=float)
+    occupied = np.array(occupied, dtype=bool)
+
+    points_occupied = [np.zeros((0, 3), dtype=float)]
+    points_empty = [np.zeros((0, 3), dtype=float)]
+    for size in np.unique(sizes):
+        mask = sizes == size
+        dimension = max(1, int(np.ceil(size / resolution)))
+        indices = np.column_stack(
+            np.nonzero(np.ones((dimension,) * 3, dtype=bool))
+        )
+        offsets = (indices - (dimension / 2 - 0.5)) * resolution
+        points = coordinates[mask][:, None, :] + offsets[None, :, :]
+        points_occupied.append(points[occupied[mask]].reshape(-1, 3))
+        points_empty.append(points[~occupied[mask]].reshape(-1, 3))
+    points_occupied = np.concatenate(points_occupied)
+    points_empty = np.concatenate(points_empty)
+
+    def crop(points):
+        keep = ((points >= bbx_min) & (points < bbx_max)).all(axis=1)
+        return points[keep]
+
+    return crop(points_occupied), crop(points_empty)
+
+
+class _OctreeLeaves:
+    """Leaves of an octree as arrays for vectorized occupancy queries.
+
+    Each leaf covers a cube of 2^level finest voxels, so a point is in the
+    leaf if its finest key shifted by the level equals the leaf's one, as
+    octomap.OcTree.search does with coordToKey.
+
+    Parameters
+    ----------
+    resolution: float
+        Resolution of the octree.
+    tables: list of (level, keys, occupancies)
+        Sorted keys shifted by the level and encoded by _encode_keys, and
+        occupancies of the leaves at each level.
+    """
+
+    _tree_max_val = 32768  # for tree depth of 16
+
+    def __init__(self, resolution, tables):
+        self.resolution = resolution
+        self.tables = tables
+
+    @classmethod
+    def from_octree(cls, octree):
+        resolution = octree.getResolution()
+
+        coordinates = []
+        sizes = []
+        occupancies = []
+        for leaf in octree.begin_leafs():
+            coordinate = np.asarray(leaf.getCoordinate(), dtype=float)
+            coordinates.append(coordinate)
+            sizes.append(leaf.getSize())
+            occupancies.append(leaf.getOccupancy())
+        coordinates = np.array(coordinates, dtype=float).reshape(-1, 3)
+        sizes = np.array(sizes, dtype=float)
+        occupancies = np.array(occupancies, dtype=np.float32)
+
+        leaves = cls(resolution, [])
+        keys = leaves._coord_to_key(coordinates)
+        levels = np.round(np.log2(sizes / resolution)).astype(int)
+        for level in np.unique(levels):
+            mask = levels == level
+            keys_level = _encode_keys(keys[mask] >> level)
+            order = np.argsort(keys_level)
+            leaves.tables.append(
+                (level, keys_level[order], occupancies[mask][order])
+            )
+        return leaves
+
+    def _coord_to_key(self, points):
+        keys = np.floor(points / self.resolution).astype(np.int64)
+        return keys + self._tree_max_val
+
+    def get_occupancies(self, points):
+        points = np.asarray(points, dtype=float)
+
+        occupancies = np.full((points.shape[0],), -1, dtype=float)
+
+        keys = self._coord_to_key(points)
+        valid = ((0 <= keys) & (keys < 2 * self._tree_max_val)).all(axis=1)
+        (indices,) = np.nonzero(valid)
+        keys = keys[valid]
+        for level, keys_level, occupancies_level in self.tables:
+            query = _encode_keys(keys >> level)
+            found = np.searchsorted(keys_level, query)
+            found = np.minimum(found, keys_level.size - 1)
+            match = keys_level[found] == query
+            occupancies[indices[match]] = occupancies_level[found[match]]
+        return occupancies
+
+    def extract_pointcloud(self, bbx_min, bbx_max):
+        # same as octomap.OcTree.extractPointCloud cropped by the bbox
+        mask = (1 << 16) - 1
+        points_occupied = [np.zeros((0, 3), dtype=float)]
+        points_empty = [np.zeros((0, 3), dtype=float)]
+        for level, keys_level, occupancies_level in self.tables:
+            keys = np.stack(
+                [
+                    keys_level >> 32,
+                    (keys_level >> 16) & mask,
+                    keys_level & mask,
+                ],
+                axis=1,
+            )
+            corners = ((keys << level) - self._tree_max_val) * self.resolution
+            size = self.resolution * 2 ** level
+            keep = ((corners + size > bbx_min) & (corners < bbx_max)).all(
+                axis=1
+            )
+            dimension = 2 ** level
+            indices = np.column_stack(
+                np.nonzero(np.ones((dimension,) * 3, dtype=bool))
+            )
+            offsets = (indices + 0.5) * self.resolution
+            points = corners[keep][:, None, :] + offsets[None, :, :]
+            occupied = occupancies_level[keep] >= 0.5
+            points_occupied.append(points[occupied].reshape(-1, 3))
+            points_empty.append(points[~occupied].reshape(-1, 3))
+        points_occupied = np.concatenate(points_occupied)
+        points_empty = np.concatenate(points_empty)
+
+        def crop(points):
+            keep = ((points >= bbx_min) & (points < bbx_max)).all(axis=1)
+            return points[keep]
+
+        return crop(points_occupied), crop(points_empty)
 
 
 class MultiInstanceOctreeMapping:
+    _pcds_cache_size = 32
+
+    _file_magic = b"MIOCTMAP"
+    _file_version = 1
+
     def __init__(self):
         self._octrees = {}  # key: instance_id, value: octree
-        self._pcds = {}  # key: instance_id, value: (occupied, empty)
+        self._revisions = {}  # key: instance_id, value: int
+        # key: (instance_id, aabb_min, aabb_max, revision)
+        # value: (occupied, empty)
+        self._pcds = collections.OrderedDict()
+        self._leaves = {}  # key: instance_id, value: _OctreeLeaves
 
     @property
     def instance_ids(self):
@@ -15,22 +179,142 @@ class MultiInstanceOctreeMapping:
     def initialize(self, instance_id, *, pitch):
         if instance_id in self.instance_ids:
             raise ValueError("instance {instance_id} already exists")
-        self._octrees[instance_id] = octomap.OcTree(pitch)
+        self._octrees[instance_id] = self._create_octree(pitch)
+        self._revisions[instance_id] = 0
+
+    def _create_octree(self, pitch):
+        return octomap.OcTree(pitch)
 
-    def integrate(self, instance_id, mask, pcd, origin=(0, 0, 0)):
+    def integrate(
+        self, instance_id, mask, pcd, origin=(0, 0, 0), *, deduplicate=False
+    ):
+        """Integrate points of the instance as a scan.
+
+        Parameters
+        ----------
+        instance_id: int
+            Instance ID.
+        mask: (H, W) or (M, H, W) numpy.ndarray, bool
+            Mask of the instance, and the union of them if several masks
+            are given.
+        pcd: (H, W, 3) numpy.ndarray, float
+            Point cloud, where nan is invalid.
+        origin: (3,) array-like, float
+            Sensor origin.
+        deduplicate: bool
+            If True, the points in the same voxel of the octree are merged
+            into the voxel center before ray insertion, so a ray is cast
+            per voxel instead of per point. The hit of the voxel is
+            weighted by the number of the points, while insertPointCloud
+            updates an occupied voxel once per scan.
+        """
         origin = np.asarray(origin, dtype=float)
         octree = self._octrees[instance_id]
+        if mask.ndim == 3:
+            mask = mask.any(axis=0)
         nonnan = ~np.isnan(pcd).any(axis=2)
-        octree.insertPointCloud(pcd[mask & nonnan], origin=origin)
-        if instance_id in self._pcds:
-            self._pcds.pop(instance_id)  # clear cache
+        points = pcd[mask & nonnan]
+        if deduplicate:
+            resolution = octree.getResolution()
+            keys = np.floor(points / resolution).astype(np.int64)
+            _, index, counts = np.unique(
+                _encode_keys(keys + _OctreeLeaves._tree_max_val),
+                return_index=True,
+                return_counts=True,
+            )
+            points = (keys[index] + 0.5) * resolution
+        octree.insertPointCloud(points, origin=origin)
+        if deduplicate and (counts > 1).any():
+            # the rest of the hits of the voxels with several points
+            octree.updateNodes(
+                np.repeat(points, counts - 1, axis=0), True, lazy_eval=True
+            )
+            octree.updateInnerOccupancy()
+        self._revisions[instance_id] += 1  # invalidate cache
+        if instance_id in self._leaves:
+            self._leaves.pop(instance_id)  # clear cache
+
+    def integrate_batch(
+        self,
+        instance_ids,
+        masks,
+        pcd,
+        origin=(0, 0, 0),
+        *,
+        deduplicate=False,
+        n_workers=None,
+    ):
+        """Integrate points of instances from the same point cloud.
+
+        The octrees of the instances are independent, so they are updated
+        in a thread pool, which runs in parallel as far as the octree
+        releases the GIL (e.g. NumPy in VoxelHashOccupancyMap).
+
+        Parameters
+        ----------
+        instance_ids: (N,) array-like, int
+            Instance IDs.
+        masks: (N,) list of numpy.ndarray, bool
+            Mask of each instance as in integrate.
+        pcd: (H, W, 3) numpy.ndarray, float
+            Point cloud, where nan is invalid.
+        origin: (3,) array-like, float
+            Sensor origin.
+        deduplicate: bool
+            Whether to merge points in the same voxel as in integrate.
+        n_workers: int, optional
+            Number of threads, which is the default of ThreadPoolExecutor
+            if not given.
+        """
+        assert len(instance_ids) == len(masks)
+        assert len(set(instance_ids)) == len(instance_ids)
+
+        with concurrent.futures.ThreadPoolExecutor(n_workers) as executor:
+            futures = [
+                executor.submit(
+                    self.integrate,
+                    instance_id,
+                    mask,
+                    pcd,
+                    origin,
+                    deduplicate=deduplicate,
+                )
+                for instance_id, mask in zip(instance_ids, masks)
+            ]
+            for future in futures:
+                future.result()
 
     def update(self, instance_id, occupied):
         octree = self._octrees[instance_id]
         octree.updateNodes(occupied, True, lazy_eval=True)
         octree.updateInnerOccupancy()
-        if instance_id in self._pcds:
-            self._pcds.pop(instance_id)  # clear cache
+        self._revisions[instance_id] += 1  # invalidate cache
+        if instance_id in self._leaves:
+            self._leaves.pop(instance_id)  # clear cache
+
+    def get_occupancies(self, instance_id, points):
+        """Get occupancies of the specified instance at points.
+
+        Parameters
+        ----------
+        instance_id: int
+            Instance ID.
+        points: (N, 3) array-like, float
+            Query points.
+
+        Returns
+        -------
+        occupancies: (N,) numpy.ndarray, np.float64
+            Occupancy probabilities, which are -1 at unknown points.
+        """
+        return self._get_leaves(instance_id).get_occupancies(points)
+
+    def _get_leaves(self, instance_id):
+        if instance_id not in self._leaves:
+            self._leaves[instance_id] = _OctreeLeaves.from_octree(
+                self._octrees[instance_id]
+            )
+        return self._leaves[instance_id]
 
     def get_target_grids(self, target_id, *, dimensions, pitch, origin):
         """Get voxel grids of the specified instance.
@@ -55,47 +339,84 @@ class MultiInstanceOctreeMapping:
         grid_empty: numpy.ndarray
             Empty space.
         """
-        assert not np.isnan(origin).any()
+        return self.get_target_grids_batch(
+            [target_id],
+            dimensions=dimensions,
+            pitches=[pitch],
+            origins=[origin],
+        )[0]
+
+    def get_target_grids_batch(
+        self, target_ids, *, dimensions, pitches, origins
+    ):
+        """Get voxel grids of the specified instances at once.
+
+        The occupancies of each instance are queried once for the voxel
+        centers of all the targets.
+
+        Parameters
+        ----------
+        target_ids: (T,) array-like, int
+            Target instance IDs.
+        dimensions: (3,) array-like, int
+            Voxel dimensions (e.g., 32x32x32).
+        pitches: (T,) array-like, float
+            Voxel pitch of each target.
+        origins: (T, 3) array-like, float
+            Voxel origin of each target.
+
+        Returns
+        -------
+        grids: list of (grid_target, grid_nontarget, grid_empty)
+            Voxel grids of each target as in get_target_grids.
+        """
+        dimensions = tuple(int(d) for d in dimensions)
+        pitches = np.asarray(pitches, dtype=float)
+        origins = np.asarray(origins, dtype=float).reshape(-1, 3)
+        assert len(target_ids) == len(pitches) == len(origins)
+        assert not np.isnan(origins).any()
         assert len(dimensions) == 3
         assert (np.asarray(dimensions) > 0).all()
-        assert pitch > 0
+        assert (pitches > 0).all()
 
-        grid_target = np.zeros(dimensions, dtype=np.float32)
-        grid_nontarget = np.zeros(dimensions, dtype=np.float32)
-        grid_empty = np.zeros(dimensions, np.float32)
+        n_target = len(target_ids)
+        shape = (n_target,) + dimensions
 
-        centers = trimesh.voxel.ops.matrix_to_points(
-            np.ones(dimensions), pitch=pitch, origin=origin
+        grids_target = np.zeros(shape, dtype=np.float32)
+        grids_nontarget = np.zeros(shape, dtype=np.float32)
+        grids_empty = np.zeros(shape, dtype=np.float32)
+
+        # (T, X, Y, Z, 3) voxel centers of all targets
+        indices = np.stack(
+            np.meshgrid(*[np.arange(d) for d in dimensions], indexing="ij"),
+            axis=-1,
         )
-        indices = trimesh.voxel.ops.points_to_indices(
-            centers, pitch=pitch, origin=origin
+        centers = (
+            origins[:, None, None, None, :]
+            + indices[None] * pitches[:, None, None, None, None]
         )
-        I, J, K = indices[:, 0], indices[:, 1], indices[:, 2]
-
-        def get_occupancy(octree, point):
-            node = octree.search(point)
-            try:
-                return node.getOccupancy()
-            except octomap.NullPointerException:
-                return -1
-
-        for ins_id, octree in self._octrees.items():
-            occupancies = np.array(
-                [get_occupancy(octree, center) for center in centers]
-            )
+        centers = centers.reshape(-1, 3)
+
+        is_target = np.asarray(target_ids)[:, None, None, None]
+        for ins_id in self._octrees:
+            occupancies = self.get_occupancies(ins_id, centers)
+            occupancies = occupancies.reshape(shape)
             q = occupancies >= 0.5
-            if ins_id == target_id:
-                grid_target[I[q], J[q], K[q]] = occupancies[q]
-            else:
-                grid_nontarget[I[q], J[q], K[q]] = occupancies[q]
+            q_target = q & (is_target == ins_id)
+            q_nontarget = q & (is_target != ins_id)
+            grids_target[q_target] = occupancies[q_target]
+            grids_nontarget[q_nontarget] = occupancies[q_nontarget]
             q = (0 <= occupancies) & (occupancies < 0.5)
-            grid_empty[I[q], J[q], K[q]] = 1 - occupancies[q]
+            grids_empty[q] = 1 - occupancies[q]
 
-        return grid_target, grid_nontarget, grid_empty
+        return list(zip(grids_target, grids_nontarget, grids_empty))
 
     def get_target_pcds(self, target_id, aabb_min=None, aabb_max=None):
         """Get point clouds of the specified instance.
 
+        Only the leaves intersecting the AABB are traversed, and the
+        results are cached for the AABB until the octree is updated.
+
         Parameters
         ----------
         target_id: int
@@ -112,14 +433,142 @@ class MultiInstanceOctreeMapping:
         empty: (M, 3) numpy.ndarray, np.float64
             Empty points.
         """
-        octree = self._octrees[target_id]
-        if target_id not in self._pcds:
-            occupied, empty = octree.extractPointCloud()
-            if aabb_min is not None:
-                occupied = occupied[(occupied >= aabb_min).all(axis=1)]
-                empty = empty[(empty >= aabb_min).all(axis=1)]
-            if aabb_max is not None:
-                occupied = occupied[(occupied < aabb_max).all(axis=1)]
-                empty = empty[(empty < aabb_max).all(axis=1)]
-            self._pcds[target_id] = (occupied, empty)
-        return self._pcds[target_id]
+        if aabb_min is not None:
+            aabb_min = tuple(float(x) for x in aabb_min)
+        if aabb_max is not None:
+            aabb_max = tuple(float(x) for x in aabb_max)
+
+        key = (target_id, aabb_min, aabb_max, self._revisions[target_id])
+        if key in self._pcds:
+            self._pcds.move_to_end(key)
+            return self._pcds[key]
+
+        pcds = self._extract_pcds(target_id, aabb_min, aabb_max)
+        self._pcds[key] = pcds
+        while len(self._pcds) > self._pcds_cache_size:
+            self._pcds.popitem(last=False)
+        return pcds
+
+    def _extract_pcds(self, instance_id, aabb_min, aabb_max):
+        octree = self._octrees[instance_id]
+        if octree is None:  # loaded from file
+            resolution = self._leaves[instance_id].resolution
+        elif aabb_min is None and aabb_max is None:
+            return octree.extractPointCloud()
+        else:
+            resolution = octree.getResolution()
+
+        extent = _OctreeLeaves._tree_max_val * resolution
+        if aabb_min is None:
+            aabb_min = (-extent,) * 3
+        if aabb_max is None:
+            aabb_max = (extent,) * 3
+        aabb_min = np.asarray(aabb_min, dtype=float)
+        aabb_max = np.asarray(aabb_max, dtype=float)
+
+        if octree is None:
+            return self._leaves[instance_id].extract_pointcloud(
+                aabb_min, aabb_max
+            )
+        return _extract_pointcloud_bbx(octree, aabb_min, aabb_max)
+
+    def save(self, filename):
+        """Save occupancies of the instances to a binary file.
+
+        The leaves of each octree are saved as the sorted keys and
+        occupancies at each level, which are read through a memory map
+        by load().
+
+        Parameters
+        ----------
+        filename: str
+            Output file.
+        """
+        instances = []
+        arrays = []
+        offset = 0
+        for instance_id in self.instance_ids:
+            leaves = self._get_leaves(instance_id)
+            tables = []
+            for level, keys, occupancies in leaves.tables:
+                size = int(keys.size)
+                tables.append(dict(level=int(level), size=size, offset=offset))
+                arrays.append(np.asarray(keys, dtype="<i8"))
+                arrays.append(np.asarray(occupancies, dtype="<f4"))
+                padding = -(12 * size) % 8
+                arrays.append(np.zeros((padding,), dtype=np.uint8))
+                offset += 12 * size + padding
+            instances.append(
+                dict(
+                    instance_id=int(instance_id),
+                    resolution=float(leaves.resolution),
+                    tables=tables,
+                )
+            )
+
+        header = json.dumps(
+            dict(version=self._file_version, instances=instances)
+        ).encode()
+        # align the data to 64 bytes
+        header += b" " * (-(len(self._file_magic) + 8 + len(header)) % 64)
+
+        with open(filename, "wb") as f:
+            f.write(self._file_magic)
+            f.write(np.array(len(header), dtype="<u8").tobytes())
+            f.write(header)
+            for array in arrays:
+                f.write(array.tobytes())
+
+    @classmethod
+    def load(cls, filename):
+        """Load a mapping saved by save().
+
+        The occupancies are memory-mapped, and the loaded mapping supports
+        get_occupancies, get_target_grids(_batch) and get_target_pcds, but
+        not integrate and update.
+
+        Parameters
+        ----------
+        filename: str
+            Input file.
+
+        Returns
+        -------
+        mapping: MultiInstanceOctreeMapping
+            Loaded mapping.
+        """
+        with open(filename, "rb") as f:
+            magic = f.read(len(cls._file_magic))
+            if magic != cls._file_magic:
+                raise ValueError(f"unsupported file: {filename}")
+            header_size = int(np.frombuffer(f.read(8), dtype="<u8")[0])
+            header = json.loads(f.read(header_size).decode())
+        if header["version"] != cls._file_version:
+            raise ValueError(f"unsupported file version: {header['version']}")
+
+        data = None
+        data_offset = len(cls._file_magic) + 8 + header_size
+        if any(instance["tables"] for instance in header["instances"]):
+            data = np.memmap(
+                filename, dtype=np.uint8, mode="r", offset=data_offset
+            )
+
+        # occupancies of the leaves are independent of the backend
+        mapping = MultiInstanceOctreeMapping()
+        for instance in header["instances"]:
+            tables = []
+            for table in instance["tables"]:
+                offset, size = table["offset"], table["size"]
+                keys = data[offset : offset + 8 * size].view("<i8")
+                occupancies = data[
+                    offset + 8 * size : offset + 12 * size
+                ].view("<f4")
+                tables.append((table["level"], keys, occupancies))
+
+            instance_id = instance["instance_id"]
+            mapping._octrees[instance_id] = None
+            mapping._revisions[instance_id] = 0
+            mapping._leaves[instance_id] = _OctreeLeaves(
+                instance["resolution"], tables
+            )
+        return mapping
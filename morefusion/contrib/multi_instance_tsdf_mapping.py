@@ -0,0 +1,278 @@
+import numpy as np
+
+
+class MultiInstanceTSDFMapping:
+    """Multi-instance TSDF volume integrating depth frames projectively.
+
+    Each voxel has a truncated signed distance and its weight, and the
+    weight of each instance observed at the surface. All the voxels are
+    projected to each frame at once, so integration does not need
+    raycasting. A voxel is occupied if it is within the half pitch from
+    the surface, and is labeled with the instance of the max weight; and
+    it is empty if it is in front of the surface further than that.
+    These states are updated only at the voxels integrated since the last
+    query.
+
+    Parameters
+    ----------
+    origin: (3,) array-like, float
+        Center of the first voxel of the volume.
+    pitch: float
+        Voxel pitch.
+    dimensions: (3,) array-like, int
+        Voxel dimensions of the volume.
+    truncation: float, optional
+        Truncation distance, which is 3 * pitch by default.
+    max_weight: float, optional
+        Max weight of TSDF, which is unbounded by default.
+    """
+
+    def __init__(
+        self,
+        *,
+        origin,
+        pitch,
+        dimensions,
+        truncation=None,
+        max_weight=None,
+    ):
+        self.origin = np.asarray(origin, dtype=float)
+        self.pitch = float(pitch)
+        self.dimensions = tuple(int(d) for d in dimensions)
+        if truncation is None:
+            truncation = 3 * self.pitch
+        self.truncation = float(truncation)
+        self.max_weight = max_weight
+
+        n_voxel = int(np.prod(self.dimensions))
+        self._tsdf = np.ones((n_voxel,), dtype=np.float32)
+        self._weight = np.zeros((n_voxel,), dtype=np.float32)
+        self._instance_ids = []
+        self._instance_weights = np.zeros((0, n_voxel), dtype=np.float32)
+
+        indices = np.stack(
+            np.meshgrid(
+                *[np.arange(d) for d in self.dimensions], indexing="ij"
+            ),
+            axis=-1,
+        ).reshape(-1, 3)
+        self._centers = (self.origin + indices * self.pitch).astype(np.float32)
+
+        # occupied, empty, labels and label confidences of the voxels
+        self._states = (
+            np.zeros((n_voxel,), dtype=bool),
+            np.zeros((n_voxel,), dtype=bool),
+            np.full((n_voxel,), -1, dtype=np.int64),
+            np.zeros((n_voxel,), dtype=np.float32),
+        )
+        self._indices_updated = []  # voxels whose states are outdated
+
+    @property
+    def instance_ids(self):
+        return list(self._instance_ids)
+
+    def integrate(self, depth, instance_label, K, T_cam2world=None):
+        """Integrate a frame.
+
+        Parameters
+        ----------
+        depth: (H, W) numpy.ndarray, float
+            Depth image in meters, where nan is invalid.
+        instance_label: (H, W) numpy.ndarray, int
+            Instance label image, where negative ones are unlabeled.
+        K: (3, 3) numpy.ndarray
+            Camera intrinsic matrix.
+        T_cam2world: (4, 4) numpy.ndarray, optional
+            Camera pose in the volume coordinates, which is identity by
+            default.
+        """
+        assert depth.ndim == 2, "depth must be 2 dimensional"
+        assert depth.shape == instance_label.shape, "shape mismatch"
+
+        if T_cam2world is None:
+            T_cam2world = np.eye(4)
+        T_world2cam = np.linalg.inv(T_cam2world).astype(np.float32)
+
+        points = self._centers @ T_world2cam[:3, :3].T + T_world2cam[:3, 3]
+        z = points[:, 2]
+
+        H, W = depth.shape
+        with np.errstate(divide="ignore", invalid="ignore"):
+            c = np.round(K[0, 0] * points[:, 0] / z + K[0, 2])
+            r = np.round(K[1, 1] * points[:, 1] / z + K[1, 2])
+        valid = (z > 0) & (0 <= r) & (r < H) & (0 <= c) & (c < W)
+        (indices,) = np.nonzero(valid)
+        r = r[indices].astype(np.int64)
+        c = c[indices].astype(np.int64)
+
+        sdf = depth[r, c] - z[indices]
+        keep = ~np.isnan(sdf) & (sdf >= -self.truncation)
+        indices, sdf, r, c = indices[keep], sdf[keep], r[keep], c[keep]
+
+        # running average of TSDF
+        tsdf = np.minimum(sdf / self.truncation, 1)
+        weight = self._weight[indices]
+        self._tsdf[indices] = (self._tsdf[indices] * weight + tsdf) / (
+            weight + 1
+        )
+        weight = weight + 1
+        if self.max_weight is not None:
+            weight = np.minimum(weight, self.max_weight)
+        self._weight[indices] = weight
+        self._indices_updated.append(indices)
+
+        # instance weights at the surface
+        labels = instance_label[r, c]
+        keep = (sdf <= self.truncation) & (labels >= 0)
+        indices, labels = indices[keep], labels[keep]
+        labels_unique, labels = np.unique(labels, return_inverse=True)
+        channels = np.array(
+            [self._get_channel(ins_id) for ins_id in labels_unique],
+            dtype=np.int64,
+        )
+        self._instance_weights[channels[labels], indices] += 1
+
+    def _get_channel(self, instance_id):
+        instance_id = int(instance_id)
+        if instance_id not in self._instance_ids:
+            self._instance_ids.append(instance_id)
+            self._instance_weights = np.concatenate(
+                [
+                    self._instance_weights,
+                    np.zeros((1, self._weight.size), dtype=np.float32),
+                ]
+            )
+        return self._instance_ids.index(instance_id)
+
+    def _get_states(self):
+        # the states are recomputed only at the voxels updated in integrate
+        # since the last call, as the others are unchanged
+        if not self._indices_updated:
+            return self._states
+
+        indices = np.unique(np.concatenate(self._indices_updated))
+        self._indices_updated = []
+
+        observed = self._weight[indices] > 0
+        sdf = self._tsdf[indices] * self.truncation
+        occupied = observed & (np.abs(sdf) <= self.pitch / 2)
+        empty = observed & (sdf > self.pitch / 2)
+
+        labels = np.full(indices.shape, -1, dtype=np.int64)
+        confidences = np.zeros(indices.shape, dtype=np.float32)
+        if self._instance_ids:
+            instance_weights = self._instance_weights[:, indices]
+            channels = instance_weights.argmax(axis=0)
+            weight_sum = instance_weights.sum(axis=0)
+            labeled = weight_sum > 0
+            labels[labeled] = np.asarray(self._instance_ids)[channels[labeled]]
+            confidences[labeled] = (
+                instance_weights.max(axis=0)[labeled] / weight_sum[labeled]
+            )
+        occupied &= labels >= 0
+
+        for state, state_updated in zip(
+            self._states, (occupied, empty, labels, confidences)
+        ):
+            state[indices] = state_updated
+        return self._states
+
+    def get_target_grids(self, target_id, *, dimensions, pitch, origin):
+        """Get voxel grids of the specified instance.
+
+        Parameters
+        ----------
+        target_id: int
+            Target instance ID.
+        dimensions: (3,) array-like, int
+            Voxel dimensions (e.g., 32x32x32).
+        pitch: float
+            Voxel pitch.
+        origin: (3,) array-like, float
+            Voxel origin.
+
+        Returns
+        -------
+        grid_target: numpy.ndarray
+            Occupied space of the target instance.
+        grid_nontarget: numpy.ndarray
+            Occupied space of non-target instance.
+        grid_empty: numpy.ndarray
+            Empty space.
+        """
+        return self.get_target_grids_batch(
+            [target_id],
+            dimensions=dimensions,
+            pitches=[pitch],
+            origins=[origin],
+        )[0]
+
+    def get_target_grids_batch(
+        self, target_ids, *, dimensions, pitches, origins
+    ):
+        """Get voxel grids of the specified instances at once.
+
+        The voxel centers of the grids, which can be in any AABB, are
+        looked up in the nearest voxels of the volume, and the ones
+        outside of the volume are unknown.
+
+        Parameters
+        ----------
+        target_ids: (T,) array-like, int
+            Target instance IDs.
+        dimensions: (3,) array-like, int
+            Voxel dimensions (e.g., 32x32x32).
+        pitches: (T,) array-like, float
+            Voxel pitch of each target.
+        origins: (T, 3) array-like, float
+            Voxel origin of each target.
+
+        Returns
+        -------
+        grids: list of (grid_target, grid_nontarget, grid_empty)
+            Voxel grids of each target as in get_target_grids.
+        """
+        dimensions = tuple(int(d) for d in dimensions)
+        pitches = np.asarray(pitches, dtype=float)
+        origins = np.asarray(origins, dtype=float).reshape(-1, 3)
+        assert len(target_ids) == len(pitches) == len(origins)
+        assert len(dimensions) == 3
+        assert (pitches > 0).all()
+
+        shape = (len(target_ids),) + dimensions
+
+        indices = np.stack(
+            np.meshgrid(*[np.arange(d) for d in dimensions], indexing="ij"),
+            axis=-1,
+        )
+        centers = (
+            origins[:, None, None, None, :]
+            + indices[None] * pitches[:, None, None, None, None]
+        )
+        centers = centers.reshape(-1, 3)
+
+        ixyz = np.round((centers - self.origin) / self.pitch).astype(np.int64)
+        valid = ((0 <= ixyz) & (ixyz < self.dimensions)).all(axis=1)
+        ixyz = ixyz[valid]
+        X, Y, Z = self.dimensions
+        voxels = (ixyz[:, 0] * Y + ixyz[:, 1]) * Z + ixyz[:, 2]
+
+        occupied, empty, labels, confidences = self._get_states()
+        target_ids_voxel = np.repeat(
+            np.asarray(target_ids), np.prod(dimensions)
+        )[valid]
+        occupied = occupied[voxels]
+        q_target = occupied & (labels[voxels] == target_ids_voxel)
+        q_nontarget = occupied & ~q_target
+
+        grids_target = np.zeros(shape, dtype=np.float32)
+        grids_nontarget = np.zeros(shape, dtype=np.float32)
+        grids_empty = np.zeros(shape, dtype=np.float32)
+        (indices,) = np.nonzero(valid)
+        grids_target.flat[indices[q_target]] = confidences[voxels[q_target]]
+        grids_nontarget.flat[indices[q_nontarget]] = confidences[
+            voxels[q_nontarget]
+        ]
+        grids_empty.flat[indices[empty[voxels]]] = 1
+
+        return list(zip(grids_target, grids_nontarget, grids_empty))
@@ -37,6 +37,7 @@ class OccupancyRegistrationLink(chainer.Link):
             origin=origin,
             dims=grid_target.shape[1:],
             threshold=threshold,
+            local=True,
         )
 
         assert grid_target.dtype == np.float32
@@ -106,9 +106,23 @@ class Model(chainer.Chain):
         h_rgb = F.relu(self.conv2_rgb(h_rgb))
         h_pcd = F.relu(self.conv2_pcd(h_pcd))
         feat2 = F.concat((h_rgb, h_pcd), axis=1)
+        # shared by forward and backward of the voxelization, which reuse
+        # it only on CPU
+        voxel_index = None
+        if self.xp is np:
+            voxel_index = morefusion.functions.VoxelIndex(
+                indices,
+                batch_indices,
+                batch_size=B,
+                origin=(0, 0, 0),
+                pitch=1.0,
+                dimensions=(self._voxel_dim,) * 3,
+            )
         voxelized = self._voxelize(
             values=feat2.transpose(0, 2, 1),  # BCP -> BPC
-            points=points.transpose(0, 2, 1),  # BCP -> BPC
+            points=indices,
+            batch_indices=batch_indices,
+            voxel_index=voxel_index,
         )
 
         if self._with_occupancy:
@@ -125,31 +139,26 @@ class Model(chainer.Chain):
             voxelized = F.concat([voxelized, h_occ], axis=1)
 
         # conv3, conv4
-        h = F.relu(self.conv3(voxelized))
-        assert h.shape == (B, 256, 16, 16, 16)
-        feat3 = morefusion.functions.interpolate_voxel_grid(
-            h, indices / 2.0, batch_indices
-        )
-        feat3 = feat3.reshape(B, P, h.shape[1]).transpose(0, 2, 1)
-        h = F.relu(self.conv4(h))
-        assert h.shape == (B, 512, 8, 8, 8)
-        feat4 = morefusion.functions.interpolate_voxel_grid(
-            h, indices / 4.0, batch_indices
+        h3 = F.relu(self.conv3(voxelized))
+        assert h3.shape == (B, 256, 16, 16, 16)
+        h4 = F.relu(self.conv4(h3))
+        assert h4.shape == (B, 512, 8, 8, 8)
+        feat34 = morefusion.functions.interpolate_voxel_pyramid(
+            [h3, h4], indices, batch_indices, scales=[2.0, 4.0]
         )
-        feat4 = feat4.reshape(B, P, h.shape[1]).transpose(0, 2, 1)
-        feat = F.concat((feat1, feat2, feat3, feat4), axis=1)
+        feat34 = feat34.reshape(B, P, -1).transpose(0, 2, 1)
+        feat = F.concat((feat1, feat2, feat34), axis=1)
         return feat
 
     def _voxelize(
-        self, values, points,
+        self, values, points, batch_indices, voxel_index=None,
     ):
         B, P, _ = values.shape
         assert P == self._n_point
         dimensions = (self._voxel_dim,) * 3
 
-        batch_indices = self.xp.arange(B, dtype=np.int32).repeat(P)
         values = values.reshape(B * P, -1)
-        points = points.reshape(B * P, 3)
+        assert points.shape == (B * P, 3)
 
         voxelized = morefusion.functions.average_voxelization_3d(
             values,
@@ -159,6 +168,7 @@ class Model(chainer.Chain):
             origin=(0, 0, 0),
             pitch=1.0,
             dimensions=dimensions,
+            voxel_index=voxel_index,
         )
 
         return voxelized
@@ -441,10 +451,10 @@ class Model(chainer.Chain):
             )
 
             if self._loss in ["add+occupancy", "add/add_s+occupancy"]:
-                solid_pcd = self._models.get_solid_voxel_grid(
+                solid_pcd = self._models.get_solid_voxel_points(
                     class_id=class_id_i
                 )
-                solid_pcd = xp.asarray(solid_pcd.points, dtype=np.float32)
+                solid_pcd = xp.asarray(solid_pcd, dtype=np.float32)
                 kwargs = dict(
                     pitch=float(pitch[i]),
                     origin=cuda.to_cpu(origin[i]),
@@ -0,0 +1,275 @@
+import numpy as np
+
+from .multi_instance_octree_mapping import _encode_keys
+from .multi_instance_octree_mapping import _OctreeLeaves
+from .multi_instance_octree_mapping import MultiInstanceOctreeMapping
+
+
+def _logodds(probability):
+    return np.log(probability / (1 - probability))
+
+
+class VoxelHashOccupancyMap:
+    """Occupancy map of hashed voxels with vectorized log-odds updates.
+
+    This has the subset of octomap.OcTree API used in
+    MultiInstanceOctreeMapping, and follows its sensor model: cells on the
+    rays are updated as free, and cells at the end points are updated as
+    occupied with precedence over free in a scan. The rays are cast to the
+    end point cells, and traversed with 3D DDA (Amanatides and Woo) as
+    octomap.OcTree.computeRayKeys.
+
+    Parameters
+    ----------
+    resolution: float
+        Voxel size.
+    max_ray_samples: int
+        Max number of cell crossings along rays processed at once, which
+        bounds the memory for free-space carving.
+    """
+
+    _key_bits = 21
+    _key_offset = 1 << (_key_bits - 1)
+
+    _logodds_hit = _logodds(0.7)
+    _logodds_miss = _logodds(0.4)
+    _logodds_min = _logodds(0.1192)
+    _logodds_max = _logodds(0.971)
+
+    def __init__(self, resolution, max_ray_samples=2 ** 22):
+        self._resolution = resolution
+        self._max_ray_samples = max_ray_samples
+
+        # sorted voxel keys and their log-odds
+        self._keys = np.zeros((0,), dtype=np.int64)
+        self._logodds = np.zeros((0,), dtype=np.float32)
+
+    def getResolution(self):
+        return self._resolution
+
+    def _coord_to_key(self, points):
+        return self._voxel_to_key(points / self._resolution)
+
+    def _voxel_to_key(self, points):
+        ixyz = np.floor(points).astype(np.int64)
+        ixyz += self._key_offset
+        mask = (1 << self._key_bits) - 1
+        ixyz &= mask
+        return (
+            (ixyz[..., 0] << (2 * self._key_bits))
+            | (ixyz[..., 1] << self._key_bits)
+            | ixyz[..., 2]
+        )
+
+    def _key_to_coord(self, keys):
+        mask = (1 << self._key_bits) - 1
+        ixyz = np.stack(
+            [
+                (keys >> (2 * self._key_bits)) & mask,
+                (keys >> self._key_bits) & mask,
+                keys & mask,
+            ],
+            axis=-1,
+        )
+        return (ixyz - self._key_offset + 0.5) * self._resolution
+
+    def _update_logodds(self, keys, logodds):
+        # keys must be sorted and unique
+        index = np.searchsorted(self._keys, keys)
+        exists = np.zeros(keys.shape, dtype=bool)
+        if self._keys.size:
+            index_clip = np.minimum(index, self._keys.size - 1)
+            exists = self._keys[index_clip] == keys
+            self._logodds[index[exists]] = np.clip(
+                self._logodds[index[exists]] + logodds[exists],
+                self._logodds_min,
+                self._logodds_max,
+            )
+
+        # insert new keys keeping them sorted
+        index = index[~exists]
+        logodds = np.clip(
+            logodds[~exists], self._logodds_min, self._logodds_max
+        )
+        self._keys = np.insert(self._keys, index, keys[~exists])
+        self._logodds = np.insert(self._logodds, index, logodds)
+
+    def _compute_ray_keys(self, points, origin):
+        # keys of the cells traversed by the rays from the origin to the
+        # points with 3D DDA as octomap.OcTree.computeRayKeys: the origin
+        # cell and the ones stepped into before the end point cells.
+        # Its float32 directions and accumulated distances are followed,
+        # so the ties at cell corners are broken in the same way.
+        points = points.astype(np.float32)
+        origin = origin.astype(np.float32)
+        resolution = self._resolution
+
+        key_origin = np.floor(origin / resolution).astype(np.int64)
+        key_points = np.floor(points / resolution).astype(np.int64)
+        n_crossings = np.abs(key_points - key_origin)
+        if n_crossings.sum() == 0:
+            return np.zeros((0,), dtype=np.int64)
+
+        direction = points - origin
+        norm_sq = (
+            direction[:, 0] * direction[:, 0]
+            + direction[:, 1] * direction[:, 1]
+            + direction[:, 2] * direction[:, 2]
+        )
+        direction /= np.sqrt(norm_sq.astype(float)).astype(np.float32)[:, None]
+        steps = np.sign(direction).astype(np.int64)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            border = (key_origin + 0.5) * resolution + (
+                steps * resolution * 0.5
+            ).astype(np.float32)
+            t_max = (border - origin.astype(float)) / direction
+            t_delta = resolution / np.abs(direction.astype(float))
+
+        n_crossing_max = int(n_crossings.max())
+        chunk_size = max(self._max_ray_samples // (3 * n_crossing_max), 1)
+
+        keys = [self._voxel_to_key(key_origin[None])]
+        for i in range(0, points.shape[0], chunk_size):
+            chunk = slice(i, i + chunk_size)
+            n_crossings_i = n_crossings[chunk]
+
+            # (N, 3, M): distances of the k-th crossings on each axis,
+            # accumulated as octomap does
+            t = np.repeat(t_delta[chunk][:, :, None], n_crossing_max, axis=2)
+            t[:, :, 0] = t_max[chunk]
+            t = np.cumsum(t, axis=2)
+
+            k = np.arange(n_crossing_max)
+            valid = k[None, None, :] < n_crossings_i[:, :, None]
+            ray, axis, _ = np.nonzero(valid)
+            t = t[valid]
+
+            # crossings in the order along each ray, where ties step the
+            # later axis first as octomap
+            order = np.lexsort((-axis, t, ray))
+            ray, axis = ray[order], axis[order]
+
+            delta = np.zeros((ray.size, 3), dtype=np.int64)
+            delta[np.arange(ray.size), axis] = steps[chunk][ray, axis]
+            cells = np.cumsum(delta, axis=0)
+            n_crossings_ray = n_crossings_i.sum(axis=1)
+            starts = np.cumsum(n_crossings_ray) - n_crossings_ray
+            cells -= np.r_[np.zeros((1, 3), dtype=np.int64), cells][starts][
+                ray
+            ]
+            cells += key_origin
+
+            # the cells after the last crossings are the end point cells
+            last = np.r_[ray[1:] != ray[:-1], True]
+            keys.append(np.unique(self._voxel_to_key(cells[~last])))
+        return np.unique(np.concatenate(keys))
+
+    def insertPointCloud(self, points, origin):
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        origin = np.asarray(origin, dtype=float)
+
+        # rays are cast to the centers of the end point cells as
+        # octomap.OcTree.insertPointCloud with discretize=True
+        keys_occupied = np.unique(self._coord_to_key(points))
+        keys_free = self._compute_ray_keys(
+            self._key_to_coord(keys_occupied), origin
+        )
+        keys_free = keys_free[
+            ~np.isin(keys_free, keys_occupied, assume_unique=True)
+        ]
+
+        self._update_logodds(
+            keys_free, np.full(keys_free.shape, self._logodds_miss)
+        )
+        self._update_logodds(
+            keys_occupied, np.full(keys_occupied.shape, self._logodds_hit)
+        )
+
+    def updateNodes(self, points, occupied, lazy_eval=False):
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        keys, counts = np.unique(
+            self._coord_to_key(points), return_counts=True
+        )
+        logodds = self._logodds_hit if occupied else self._logodds_miss
+        # clipping after each update is equal to clipping after all the
+        # updates with the same sign
+        self._update_logodds(keys, counts * logodds)
+
+    def updateInnerOccupancy(self):
+        pass
+
+    def get_occupancies(self, points):
+        """Get occupancy probabilities at points, which are -1 if unknown."""
+        points = np.asarray(points, dtype=float).reshape(-1, 3)
+        keys = self._coord_to_key(points)
+
+        occupancies = np.full((points.shape[0],), -1, dtype=float)
+        if self._keys.size == 0:
+            return occupancies
+        index = np.searchsorted(self._keys, keys)
+        index = np.minimum(index, self._keys.size - 1)
+        exists = self._keys[index] == keys
+        logodds = self._logodds[index[exists]].astype(float)
+        occupancies[exists] = 1 - 1 / (1 + np.exp(logodds))
+        return occupancies
+
+    def extractPointCloud(self, bbx_min=None, bbx_max=None):
+        keys = self._keys
+        logodds = self._logodds
+        if bbx_min is None and bbx_max is None:
+            points = self._key_to_coord(keys)
+            occupied = logodds >= 0
+            return points[occupied], points[~occupied]
+
+        bbx_min = np.full((3,), -np.inf) if bbx_min is None else bbx_min
+        bbx_max = np.full((3,), np.inf) if bbx_max is None else bbx_max
+
+        # keys are sorted by x first, so the ones in the x range are
+        # contiguous
+        ix_range = np.floor(
+            np.array([bbx_min[0], bbx_max[0]]) / self._resolution
+        )
+        ix_range = np.clip(
+            ix_range + self._key_offset, 0, (1 << self._key_bits) - 1
+        ).astype(np.int64)
+        start, end = np.searchsorted(
+            keys,
+            [
+                ix_range[0] << (2 * self._key_bits),
+                (ix_range[1] + 1) << (2 * self._key_bits),
+            ],
+        )
+        keys = keys[start:end]
+        logodds = logodds[start:end]
+
+        points = self._key_to_coord(keys)
+        keep = ((points >= bbx_min) & (points < bbx_max)).all(axis=1)
+        points = points[keep]
+        occupied = logodds[keep] >= 0
+        return points[occupied], points[~occupied]
+
+
+class VoxelHashOccupancyMapping(MultiInstanceOctreeMapping):
+    """MultiInstanceOctreeMapping backed by VoxelHashOccupancyMap."""
+
+    def _create_octree(self, pitch):
+        return VoxelHashOccupancyMap(pitch)
+
+    def get_occupancies(self, instance_id, points):
+        return self._octrees[instance_id].get_occupancies(points)
+
+    def _extract_pcds(self, instance_id, aabb_min, aabb_max):
+        return self._octrees[instance_id].extractPointCloud(aabb_min, aabb_max)
+
+    def _get_leaves(self, instance_id):
+        # voxels as the finest leaves of octomap.OcTree
+        if instance_id not in self._leaves:
+            octree = self._octrees[instance_id]
+            leaves = _OctreeLeaves(octree.getResolution(), [])
+            points = octree._key_to_coord(octree._keys)
+            keys = _encode_keys(leaves._coord_to_key(points))
+            occupancies = octree.get_occupancies(points).astype(np.float32)
+            order = np.argsort(keys)
+            leaves.tables.append((0, keys[order], occupancies[order]))
+            self._leaves[instance_id] = leaves
+        return self._leaves[instance_id]
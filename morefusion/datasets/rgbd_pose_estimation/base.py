@@ -1,4 +1,4 @@
-import imgviz
+import cv2
 import numpy as np
 import trimesh
 import trimesh.transformations as tf
@@ -6,14 +6,49 @@ import trimesh.transformations as tf
 from ... import extra as extra_module
 from ... import geometry as geometry_module
 from ...contrib import MultiInstanceOctreeMapping
+from ...contrib import VoxelHashOccupancyMapping
 from ..base import DatasetBase
 
 
+_cv2_interpolations = {
+    "nearest": cv2.INTER_NEAREST,
+    "linear": cv2.INTER_LINEAR,
+}
+
+
+def _crop_and_centerize(src, mask, bbox, out, cval, interpolation):
+    """Crop, mask and centerize an image into the output as imgviz.centerize.
+
+    Only the bbox region of src is copied, and the resized crop is written
+    into the center of out, whose rest is filled with cval.
+    """
+    y1, x1, y2, x2 = bbox
+    crop = src[y1:y2, x1:x2].copy()
+    crop[~mask[y1:y2, x1:x2]] = cval
+
+    H, W = out.shape[:2]
+    h, w = crop.shape[:2]
+    scale = min(H / h, W / w)
+    h = min(int(round(h * scale)), H)
+    w = min(int(round(w * scale)), W)
+    crop = cv2.resize(
+        crop, (w, h), interpolation=_cv2_interpolations[interpolation]
+    )
+
+    out.fill(cval)
+    ph = (H - h) // 2
+    pw = (W - w) // 2
+    out[ph : ph + h, pw : pw + w] = crop.reshape((h, w) + out.shape[2:])
+    return out
+
+
 class RGBDPoseEstimationDatasetBase(DatasetBase):
 
     _n_points_minimal = 1
     _image_size = 256
     _voxel_dim = 32
+    _mapping_backend = "octomap"
+    _n_voxelized_max = 2 ** 22  # points voxelized at once
 
     def __init__(
         self, models, class_ids=None,
@@ -27,53 +62,159 @@ class RGBDPoseEstimationDatasetBase(DatasetBase):
     def get_frame(self, index):
         raise NotImplementedError
 
-    def build_octomap(self, pcd, instance_label, instance_ids, class_ids):
-        mapping = MultiInstanceOctreeMapping()
+    def build_octomap(
+        self, pcd, instance_label, instance_ids, class_ids, backend=None
+    ):
+        """Build occupancy map of instances.
+
+        The points of each instance are merged per voxel before the ray
+        insertion with count-weighted hits (deduplicate=True of
+        integrate). The background pixels, which are the ones not in
+        instance_ids, are integrated as a single scan of their union, so
+        the rays of a background object no longer clear the voxels hit by
+        another as in a scan per label.
+
+        Parameters
+        ----------
+        backend: str, optional
+            'octomap' for MultiInstanceOctreeMapping, and 'voxel_hash' for
+            VoxelHashOccupancyMapping. Default is self._mapping_backend.
+            get_example skips this and computes the grids from the depth
+            image with geometry.projective_target_grids if the default is
+            'projective'.
+        """
+        if backend is None:
+            backend = self._mapping_backend
+        if backend in ["octomap", "projective"]:
+            mapping = MultiInstanceOctreeMapping()
+        elif backend == "voxel_hash":
+            mapping = VoxelHashOccupancyMapping()
+        else:
+            raise ValueError(f"unsupported backend: {backend}")
         nonnan = ~np.isnan(pcd).any(axis=2)
 
         # map foreground objects
+        ins_ids = []
+        masks = []
         for instance_id, class_id in zip(instance_ids, class_ids):
             if class_id <= 0:
                 continue
             mask = (instance_label == instance_id) & nonnan
             pitch = self._models.get_voxel_pitch(self._voxel_dim, class_id)
             mapping.initialize(instance_id, pitch=pitch)
-            mapping.integrate(instance_id, mask, pcd)
+            ins_ids.append(instance_id)
+            masks.append(mask)
 
         # map background objects
         mapping.initialize(0, pitch=0.01)
-        for instance_id in np.unique(instance_label):
-            if instance_id in instance_ids:  # foreground
-                continue
-            mask = (instance_label == instance_id) & nonnan
-            mapping.integrate(0, mask, pcd)
+        ins_ids.append(0)
+        masks.append(~np.isin(instance_label, instance_ids) & nonnan)
+
+        mapping.integrate_batch(ins_ids, masks, pcd, deduplicate=True)
         return mapping
 
-    def _get_grid_full(self, examples, pitch, origin):
-        dims = (self._voxel_dim,) * 3
-        grid_full = np.zeros(dims, dtype=np.int32)
+    def _get_projective_target_grids(self, frame, target_ids, examples):
+        # instances that are not mapped in build_octomap are unknown
+        depth = frame["depth"].copy()
+        for instance_id, class_id in zip(
+            frame["instance_ids"], frame["class_ids"]
+        ):
+            if class_id <= 0:
+                depth[frame["instance_label"] == instance_id] = np.nan
+        return geometry_module.projective_target_grids(
+            depth,
+            frame["instance_label"],
+            frame["intrinsic_matrix"],
+            origin=[example["origin"] for example in examples],
+            pitch=[example["pitch"] for example in examples],
+            dimensions=(self._voxel_dim,) * 3,
+            target_id=target_ids,
+        )
+
+    def _get_grids_full(self, examples, indices=None):
+        # solid voxels of each instance are transformed to the camera once,
+        # and are voxelized in the grids of all the targets at once. The
+        # targets are examples[indices], which have pitch and origin, and
+        # the others only occupy the non-target grids.
+        if indices is None:
+            indices = range(len(examples))
+        indices = np.asarray(indices, dtype=np.int32)
+        if indices.size == 0:
+            return []
+
+        points = []
+        labels = []
         for i, example in enumerate(examples):
             T = tf.quaternion_matrix(example["quaternion_true"])
             T = geometry_module.compose_transform(
                 R=T[:3, :3], t=example["translation_true"]
             )
-            vox = self._models.get_solid_voxel_grid(example["class_id"])
-            points = trimesh.transform_points(vox.points, T)
-            indices = trimesh.voxel.ops.points_to_indices(
-                points, pitch=pitch, origin=origin
-            )
-            I, J, K = indices[:, 0], indices[:, 1], indices[:, 2]
-            keep = (
-                (0 <= I)
-                & (I < dims[0])
-                & (0 <= J)
-                & (J < dims[1])
-                & (0 <= K)
-                & (K < dims[2])
+            points_i = self._models.get_solid_voxel_points(example["class_id"])
+            points.append(trimesh.transform_points(points_i, T))
+            labels.append(np.full(len(points_i), i, dtype=np.int32))
+        points = np.concatenate(points)
+        labels = np.concatenate(labels)
+
+        n_targets = len(indices)
+        dims = (self._voxel_dim,) * 3
+        grids_target_full = np.zeros((n_targets,) + dims, dtype=np.int32)
+        grids_nontarget_full = np.zeros((n_targets,) + dims, dtype=np.int32)
+
+        # targets are voxelized in chunks to bound (n_chunk, n_points, 3)
+        n_chunk = max(1, self._n_voxelized_max // max(len(points), 1))
+        for start in range(0, n_targets, n_chunk):
+            chunk = slice(start, start + n_chunk)
+            indices_chunk = indices[chunk]
+            pitches = np.array([examples[i]["pitch"] for i in indices_chunk])
+            origins = np.array([examples[i]["origin"] for i in indices_chunk])
+
+            voxels = np.round(
+                (points[None] - origins[:, None]) / pitches[:, None, None]
+            ).astype(np.int64)
+            keep = ((0 <= voxels) & (voxels < dims)).all(axis=2)
+            targets, rows = np.nonzero(keep)
+            voxels = voxels[targets, rows]
+            labels_chunk = labels[rows]
+            voxels = (
+                (targets * dims[0] + voxels[:, 0]) * dims[1] + voxels[:, 1]
+            ) * dims[2] + voxels[:, 2]
+            targets = indices_chunk[targets]
+
+            is_target = labels_chunk == targets
+            grids_target_full[chunk].flat[voxels[is_target]] = 1
+
+            # labels start from 1 in the non-target instances of each target
+            # keeping the order, so the maximum is the latest instance in
+            # the voxels shared by several instances
+            labels_chunk = labels_chunk + (labels_chunk < targets)
+            np.maximum.at(
+                grids_nontarget_full[chunk].reshape(-1),
+                voxels[~is_target],
+                labels_chunk[~is_target],
             )
-            I, J, K = I[keep], J[keep], K[keep]
-            grid_full[I, J, K] = i + 1  # starts from 1
-        return grid_full
+
+        return list(zip(grids_target_full, grids_nontarget_full))
+
+    def _filter_instance(self, class_id, T_cad2cam, pcd):
+        """Check if an instance is kept before mapping and rendering.
+
+        Parameters
+        ----------
+        class_id: int
+            Class ID of the instance.
+        T_cad2cam: (4, 4) numpy.ndarray
+            Ground-truth pose of the instance.
+        pcd: (H, W, 3) numpy.ndarray
+            Cropped and centerized point cloud of the instance, where nan
+            is outside of the mask.
+
+        Returns
+        -------
+        keep: bool
+            False if the instance is skipped in get_example, while it still
+            occupies grid_nontarget_full of the other instances.
+        """
+        return True
 
     def get_example(self, index):
         frame = self.get_frame(index)
@@ -92,15 +233,14 @@ class RGBDPoseEstimationDatasetBase(DatasetBase):
         if instance_ids.size == 0:
             return []
 
-        mapping = self.build_octomap(
-            pcd, instance_label, instance_ids, class_ids
-        )
-
-        camera = trimesh.scene.Camera(
-            resolution=(rgb.shape[1], rgb.shape[0]), focal=(K[0, 0], K[1, 1]),
-        )
+        shape = (self._image_size, self._image_size)
 
-        examples = []
+        # cheap criteria from the depth, mask and pose are checked first, so
+        # rejected instances are not mapped, rendered nor voxelized. The
+        # ones rejected only by _filter_instance still occupy the full grids
+        # of the others.
+        candidates = []
+        instances = []
         for instance_id, class_id, T_cad2cam in zip(
             instance_ids, class_ids, Ts_cad2cam
         ):
@@ -115,82 +255,139 @@ class RGBDPoseEstimationDatasetBase(DatasetBase):
             y1, x1, y2, x2 = bbox.round().astype(int)
             if (y2 - y1) * (x2 - x1) == 0:
                 continue
+            bbox = (y1, x1, y2, x2)
 
-            pcd_ins = pcd.copy()
-            pcd_ins[~mask] = np.nan
-            pcd_ins = pcd_ins[y1:y2, x1:x2]
-            nonnan = ~np.isnan(pcd_ins).any(axis=2)
+            nonnan = mask[y1:y2, x1:x2] & ~np.isnan(
+                pcd[y1:y2, x1:x2]
+            ).any(axis=2)
             if nonnan.sum() < self._n_points_minimal:
                 continue
-            pcd_ins = imgviz.centerize(
-                pcd_ins,
-                (self._image_size, self._image_size),
+
+            pcd_ins = _crop_and_centerize(
+                pcd,
+                mask,
+                bbox,
+                out=np.empty(shape + pcd.shape[2:], dtype=pcd.dtype),
                 cval=np.nan,
                 interpolation="nearest",
             )
+            instances.append(
+                dict(
+                    class_id=class_id,
+                    quaternion_true=tf.quaternion_from_matrix(T_cad2cam),
+                    translation_true=tf.translation_from_matrix(T_cad2cam),
+                )
+            )
+            if not self._filter_instance(class_id, T_cad2cam, pcd_ins):
+                continue
+
+            candidates.append(
+                (
+                    instance_id,
+                    class_id,
+                    T_cad2cam,
+                    mask,
+                    bbox,
+                    pcd_ins,
+                    len(instances) - 1,
+                )
+            )
+
+        if not candidates:
+            return []
 
-            rgb_ins = rgb.copy()
-            rgb_ins[~mask] = 0
-            rgb_ins = rgb_ins[y1:y2, x1:x2]
-            rgb_ins = imgviz.centerize(
-                rgb_ins, (self._image_size, self._image_size)
+        if self._mapping_backend == "projective":
+            mapping = None
+        else:
+            mapping = self.build_octomap(
+                pcd, instance_label, instance_ids, class_ids
             )
 
-            cad_file = self._models.get_cad_file(class_id)
-            _, _, mask_rend = extra_module.pybullet.render_cad(
-                cad_file,
-                T_cad2cam,
-                fovy=camera.fov[1],
-                width=camera.resolution[0],
-                height=camera.resolution[1],
+        camera = trimesh.scene.Camera(
+            resolution=(rgb.shape[1], rgb.shape[0]), focal=(K[0, 0], K[1, 1]),
+        )
+
+        # masks for visibility are rendered with the shared renderer at once
+        cad_files = []
+        Ts_cad2cam_rend = []
+        for _, class_id, T_cad2cam, *_ in candidates:
+            cad_files.append(str(self._models.get_cad_file(class_id)))
+            Ts_cad2cam_rend.append(T_cad2cam)
+        _, _, masks_rend = extra_module.pybullet.get_cad_renderer().render(
+            cad_files,
+            Ts_cad2cam_rend,
+            fovy=camera.fov[1],
+            width=camera.resolution[0],
+            height=camera.resolution[1],
+        )
+
+        examples = []
+        target_ids = []
+        indices = []  # of the examples in instances
+        for (
+            instance_id,
+            class_id,
+            T_cad2cam,
+            mask,
+            bbox,
+            pcd_ins,
+            index,
+        ), mask_rend in zip(candidates, masks_rend):
+            rgb_ins = _crop_and_centerize(
+                rgb,
+                mask,
+                bbox,
+                out=np.empty(shape + rgb.shape[2:], dtype=rgb.dtype),
+                cval=0,
+                interpolation="linear",
             )
+
             with np.errstate(invalid="ignore"):
                 visibility = 1.0 * mask.sum() / mask_rend.sum()
 
-            quaternion_true = tf.quaternion_from_matrix(T_cad2cam)
-            translation_true = tf.translation_from_matrix(T_cad2cam)
-
             center = np.nanmedian(pcd_ins, axis=(0, 1))
             dim = self._voxel_dim
             pitch = self._models.get_voxel_pitch(self._voxel_dim, class_id)
             origin = center - (dim / 2 - 0.5) * pitch
-            grid_target, grid_nontarget, grid_empty = mapping.get_target_grids(
-                instance_id,
-                dimensions=(dim, dim, dim),
-                pitch=pitch,
-                origin=origin,
-            )
 
             example = dict(
                 class_id=class_id,
                 rgb=rgb_ins,
                 pcd=pcd_ins,
-                quaternion_true=quaternion_true,
-                translation_true=translation_true,
+                quaternion_true=instances[index]["quaternion_true"],
+                translation_true=instances[index]["translation_true"],
                 visibility=visibility,
                 origin=origin,
                 pitch=pitch,
-                grid_target=grid_target,
-                grid_nontarget=grid_nontarget,
-                grid_empty=grid_empty,
             )
 
+            instances[index] = example
             examples.append(example)
+            target_ids.append(instance_id)
+            indices.append(index)
 
-        n_examples = len(examples)
-        for i_target, example in enumerate(examples):
-            assert example["class_id"] >= 1
-
-            indices = np.arange(n_examples)
-            indices_nontarget = indices[indices != i_target]
-            examples_nontarget = [examples[i] for i in indices_nontarget]
-
-            pitch = example["pitch"]
-            origin = example["origin"]
-            grid_target_full = self._get_grid_full([example], pitch, origin)
-            grid_nontarget_full = self._get_grid_full(
-                examples_nontarget, pitch, origin
+        if mapping is None:
+            grids = zip(
+                *self._get_projective_target_grids(frame, target_ids, examples)
+            )
+        else:
+            grids = mapping.get_target_grids_batch(
+                target_ids,
+                dimensions=(self._voxel_dim,) * 3,
+                pitches=[example["pitch"] for example in examples],
+                origins=[example["origin"] for example in examples],
             )
+        for example, (grid_target, grid_nontarget, grid_empty) in zip(
+            examples, grids
+        ):
+            example["grid_target"] = grid_target
+            example["grid_nontarget"] = grid_nontarget
+            example["grid_empty"] = grid_empty
+
+        for example, (grid_target_full, grid_nontarget_full) in zip(
+            examples, self._get_grids_full(instances, indices)
+        ):
+            assert example["class_id"] >= 1
             example["grid_target_full"] = grid_target_full
             example["grid_nontarget_full"] = grid_nontarget_full
 
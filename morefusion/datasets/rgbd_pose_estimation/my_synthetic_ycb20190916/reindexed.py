@@ -16,6 +16,7 @@ class MySyntheticYCB20190916RGBDPoseEstimationDatasetReIndexed(
         class_ids=None,
         augmentation: bool = False,
         version=None,
+        keys=None,
     ):
         self._root_dir = (
             MySyntheticYCB20190916RGBDPoseEstimationDataset(
@@ -24,7 +25,10 @@ class MySyntheticYCB20190916RGBDPoseEstimationDatasetReIndexed(
             + ".reindexed"
         )  # NOQA
         super().__init__(
-            split=split, class_ids=class_ids, augmentation=augmentation,
+            split=split,
+            class_ids=class_ids,
+            augmentation=augmentation,
+            keys=keys,
         )
 
         if not self.root_dir.exists():
@@ -1,4 +1,6 @@
 import json
+import os
+import typing
 
 import concurrent.futures
 import numpy as np
@@ -6,6 +8,16 @@ import path
 import pybullet  # NOQA
 import tqdm
 
+from .reindexed_format import pack_example
+
+# datasets initialized once in each worker process
+_datasets = None
+
+
+def _initialize_worker(datasets):
+    global _datasets
+    _datasets = datasets
+
 
 def task(reindexed_root_dir, dataset, index):
     image_id = dataset._ids[index]
@@ -15,7 +27,7 @@ def task(reindexed_root_dir, dataset, index):
         instance_id = f"{image_id}/{i_example:08d}"
         npz_file = reindexed_root_dir / f"{instance_id}.npz"
         npz_file.parent.makedirs_p()
-        np.savez_compressed(npz_file, **example)
+        np.savez_compressed(npz_file, **pack_example(example))
         id_to_meta[instance_id] = {
             "class_id": int(example["class_id"]),
             "visibility": float(example["visibility"]),
@@ -23,24 +35,128 @@ def task(reindexed_root_dir, dataset, index):
     return id_to_meta
 
 
-def reindex(reindexed_root_dir: str, datasets: list):
+def _task_chunk(reindexed_root_dir, dataset_index, indices):
+    dataset = _datasets[dataset_index]
+    image_ids = []
+    id_to_meta = {}
+    for index in indices:
+        image_ids.append(dataset._ids[index])
+        id_to_meta.update(task(reindexed_root_dir, dataset, index))
+    return image_ids, id_to_meta
+
+
+def _load_progress(progress_file):
+    # image_ids and meta of finished chunks, where only the last line can
+    # be broken by a crash while writing. The line has no newline, and is
+    # truncated so that the next chunk is appended to a complete line.
+    image_ids = set()
+    id_to_meta = {}
+    if not progress_file.exists():
+        return image_ids, id_to_meta
+    with open(progress_file, "rb+") as f:
+        data = f.read()
+        size = data.rfind(b"\n") + 1
+        if size < len(data):
+            f.truncate(size)
+    for i, line in enumerate(data[:size].splitlines()):
+        try:
+            progress = json.loads(line)
+        except json.JSONDecodeError:
+            raise ValueError(f"broken line {i + 1} in {progress_file}")
+        image_ids.update(progress["image_ids"])
+        id_to_meta.update(progress["meta"])
+    return image_ids, id_to_meta
+
+
+def reindex(
+    reindexed_root_dir: str,
+    datasets: list,
+    n_workers: typing.Optional[int] = None,
+    chunk_size: int = 16,
+    max_chunks_in_flight: typing.Optional[int] = None,
+):
+    """Re-index examples of datasets into npz files per instance.
+
+    Finished chunks of frames are appended to progress.jsonl, so the
+    frames are skipped when restarted after a crash, and meta.json is
+    written from it at the end.
+
+    Parameters
+    ----------
+    reindexed_root_dir: str
+        Output directory.
+    datasets: list of RGBDPoseEstimationDatasetBase
+        Datasets to re-index.
+    n_workers: int, optional
+        Number of worker processes, which is the number of CPUs by default.
+    chunk_size: int
+        Number of frames processed in a task.
+    max_chunks_in_flight: int, optional
+        Max number of submitted tasks, which is 2 * n_workers by default.
+    """
+    reindexed_root_dir = path.Path(reindexed_root_dir)
+    reindexed_root_dir.makedirs_p()
+
     print(f"Re-indexing following datasets to: {reindexed_root_dir}:")
     for dataset in datasets:
         print(f"  - {dataset}")
 
-    id_to_meta: dict = {}
+    progress_file = reindexed_root_dir / "progress.jsonl"
+    image_ids_finished, id_to_meta = _load_progress(progress_file)
 
-    executor = concurrent.futures.ProcessPoolExecutor()
+    chunks = []
+    for dataset_index, dataset in enumerate(datasets):
+        indices = [
+            index
+            for index in range(len(dataset))
+            if dataset._ids[index] not in image_ids_finished
+        ]
+        for i in range(0, len(indices), chunk_size):
+            chunks.append((dataset_index, indices[i : i + chunk_size]))
+    if image_ids_finished:
+        print(f"Skipping {len(image_ids_finished)} finished frames")
 
-    for dataset in datasets:
-        futures = []
-        for index in range(len(dataset)):
-            future = executor.submit(task, reindexed_root_dir, dataset, index)
-            futures.append(future)
+    if n_workers is None:
+        n_workers = os.cpu_count()
+    if max_chunks_in_flight is None:
+        max_chunks_in_flight = 2 * n_workers
+    executor = concurrent.futures.ProcessPoolExecutor(
+        max_workers=n_workers,
+        initializer=_initialize_worker,
+        initargs=(datasets,),
+    )
+
+    with executor, open(progress_file, "a") as f, tqdm.tqdm(
+        total=sum(len(indices) for _, indices in chunks)
+    ) as pbar:
+        chunks = iter(chunks)
+        futures = set()
+        while True:
+            for dataset_index, indices in chunks:
+                futures.add(
+                    executor.submit(
+                        _task_chunk, reindexed_root_dir, dataset_index, indices
+                    )
+                )
+                if len(futures) >= max_chunks_in_flight:
+                    break
+            if not futures:
+                break
 
-        for index, future in tqdm.tqdm(enumerate(futures), total=len(futures)):
-            for id, meta in future.result().items():
-                id_to_meta[id] = meta
+            done, futures = concurrent.futures.wait(
+                futures, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                image_ids, id_to_meta_chunk = future.result()
+                id_to_meta.update(id_to_meta_chunk)
+                f.write(
+                    json.dumps(
+                        dict(image_ids=image_ids, meta=id_to_meta_chunk)
+                    )
+                    + "\n"
+                )
+                f.flush()
+                pbar.update(len(image_ids))
 
-    with open(path.Path(reindexed_root_dir) / "meta.json", "w") as f:
+    with open(reindexed_root_dir / "meta.json", "w") as f:
         json.dump(id_to_meta, f, indent=4)
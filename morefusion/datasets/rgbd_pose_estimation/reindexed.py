@@ -6,11 +6,13 @@ import numpy as np
 
 from ... import geometry as geometry_module
 from ..base import DatasetBase
+from .reindexed_format import unpack_example
+from .reindexed_shards import ReIndexedShardReader
 
 
 class RGBDPoseEstimationDatasetReIndexedBase(DatasetBase):
     def __init__(
-        self, split, class_ids=None, augmentation=False,
+        self, split, class_ids=None, augmentation=False, keys=None,
     ):
         if not self.root_dir.exists():
             raise IOError(f"{self.root_dir} does not exist. ")
@@ -24,6 +26,20 @@ class RGBDPoseEstimationDatasetReIndexedBase(DatasetBase):
 
         self._augmentation = augmentation
 
+        # fields to read, which are all by default
+        if keys is not None:
+            keys = tuple(keys)
+            if augmentation and not {"rgb", "pcd"}.issubset(keys):
+                raise ValueError(
+                    f"keys must have 'rgb' and 'pcd' for augmentation: {keys}"
+                )
+        self._keys = keys
+
+        # shards converted by reindexed_shards.convert_to_shards
+        self._shard_reader = None
+        if (self.root_dir / "shards" / "index.json").exists():
+            self._shard_reader = ReIndexedShardReader(self.root_dir / "shards")
+
         self._ids = self._get_ids()
 
     def get_indices_from_image_id(self, image_id):
@@ -154,8 +170,13 @@ class RGBDPoseEstimationDatasetReIndexedBase(DatasetBase):
 
     def get_example(self, index):
         id = self._ids[index]
-        npz_file = self.root_dir / f"{id}.npz"
-        example = dict(np.load(npz_file))
+        if self._shard_reader is None:
+            npz_file = self.root_dir / f"{id}.npz"
+            example = unpack_example(np.load(npz_file))
+            if self._keys is not None:
+                example = {key: example[key] for key in self._keys}
+        else:
+            example = self._shard_reader.get_example(id, keys=self._keys)
         if "visibility" in example:
             example.pop("visibility")
         if self._augmentation:
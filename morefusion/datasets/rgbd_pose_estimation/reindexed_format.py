@@ -0,0 +1,78 @@
+import numpy as np
+
+# 1: dense grids as computed in get_example
+# 2: bit-packed occupancy grids and uint8 label grids
+FORMAT_VERSION = 2
+
+_occupancy_grid_keys = ["grid_target", "grid_nontarget", "grid_empty"]
+_label_grid_keys = ["grid_target_full", "grid_nontarget_full"]
+
+
+def pack_example(example):
+    """Pack voxel grids of an example to be saved in the reindexed dataset.
+
+    The occupancy grids are thresholded at 0.5 as in the training, and
+    bit-packed, and the label grids are stored as uint8.
+
+    Parameters
+    ----------
+    example: dict
+        Example of RGBDPoseEstimationDatasetBase.get_example.
+
+    Returns
+    -------
+    packed: dict
+        Packed example, which has 'format_version'.
+    """
+    packed = dict(example)
+    for key in _occupancy_grid_keys:
+        if key not in packed:
+            continue
+        grid = np.asarray(packed.pop(key))
+        packed["grid_shape"] = np.array(grid.shape, dtype=np.int32)
+        packed[f"{key}_packbits"] = np.packbits(grid > 0.5)
+    for key in _label_grid_keys:
+        if key not in packed:
+            continue
+        grid = np.asarray(packed.pop(key))
+        assert grid.min() >= 0 and grid.max() <= np.iinfo(np.uint8).max
+        packed[key] = grid.astype(np.uint8)
+    packed["format_version"] = np.int32(FORMAT_VERSION)
+    return packed
+
+
+def unpack_example(example):
+    """Unpack an example loaded from the reindexed dataset.
+
+    Parameters
+    ----------
+    example: dict
+        Example loaded from npz file, which is packed by pack_example or
+        saved without packing.
+
+    Returns
+    -------
+    example: dict
+        Example with bool occupancy grids and int32 label grids, or as
+        saved if it has no 'format_version'.
+    """
+    example = dict(example)
+    format_version = int(example.pop("format_version", 1))
+    if format_version == 1:
+        return example
+    if format_version != FORMAT_VERSION:
+        raise ValueError(f"unsupported format version: {format_version}")
+
+    shape = tuple(example.pop("grid_shape", ()))
+    for key in _occupancy_grid_keys:
+        if f"{key}_packbits" not in example:
+            continue
+        grid = np.unpackbits(
+            example.pop(f"{key}_packbits"), count=int(np.prod(shape))
+        )
+        example[key] = grid.reshape(shape).astype(bool)
+    for key in _label_grid_keys:
+        if key not in example:
+            continue
+        example[key] = example[key].astype(np.int32)
+    return example
@@ -0,0 +1,154 @@
+import argparse
+import json
+
+import numpy as np
+import path
+import tqdm
+
+from .reindexed_format import unpack_example
+
+
+class ReIndexedShardReader:
+    """Reader of reindexed examples in memory-mapped shards.
+
+    Each shard has a .npy file per field, which stacks the field of the
+    examples in the shard. The files are opened with mmap_mode='r' on the
+    first access, and only the requested fields of an example are read.
+
+    Parameters
+    ----------
+    shard_dir: str
+        Directory created by convert_to_shards.
+    """
+
+    def __init__(self, shard_dir):
+        self._shard_dir = path.Path(shard_dir)
+        with open(self._shard_dir / "index.json") as f:
+            index = json.load(f)
+        self._shards = index["shards"]
+        self._keys = tuple(index["keys"])
+        self._id_to_location = {
+            id: tuple(location) for id, location in index["ids"].items()
+        }
+        self._columns = {}  # key: (shard, key), value: np.memmap
+
+    @property
+    def keys(self):
+        return self._keys
+
+    @property
+    def ids(self):
+        return list(self._id_to_location.keys())
+
+    def _get_column(self, shard, key):
+        if (shard, key) not in self._columns:
+            npy_file = self._shard_dir / self._shards[shard] / f"{key}.npy"
+            self._columns[(shard, key)] = np.load(npy_file, mmap_mode="r")
+        return self._columns[(shard, key)]
+
+    def get_example(self, id, keys=None):
+        """Get an example.
+
+        Parameters
+        ----------
+        id: str
+            Instance ID of the example.
+        keys: list of str, optional
+            Fields to read, which are all by default.
+
+        Returns
+        -------
+        example: dict
+            Example, whose values are copied from the shards.
+        """
+        if keys is None:
+            keys = self._keys
+        shard, row = self._id_to_location[id]
+        example = {}
+        for key in keys:
+            if key not in self._keys:
+                raise KeyError(key)
+            example[key] = np.array(self._get_column(shard, key)[row])
+        return example
+
+
+def convert_to_shards(reindexed_root_dir, shard_size=1000):
+    """Convert npz files of a reindexed dataset to memory-mappable shards.
+
+    The shards and index.json are saved in {reindexed_root_dir}/shards,
+    which is read by ReIndexedShardReader.
+
+    Parameters
+    ----------
+    reindexed_root_dir: str
+        Root directory of the reindexed dataset, which has meta.json.
+    shard_size: int
+        Number of examples in a shard.
+    """
+    reindexed_root_dir = path.Path(reindexed_root_dir)
+    shard_dir = reindexed_root_dir / "shards"
+
+    with open(reindexed_root_dir / "meta.json") as f:
+        ids = sorted(json.load(f).keys())
+
+    keys = None
+    shards = []
+    id_to_location = {}
+    for shard, i_start in enumerate(
+        tqdm.tqdm(range(0, len(ids), shard_size), desc="shards")
+    ):
+        ids_shard = ids[i_start : i_start + shard_size]
+        shard_name = f"{shard:08d}"
+        (shard_dir / shard_name).makedirs_p()
+
+        columns = None
+        for row, id in enumerate(ids_shard):
+            example = unpack_example(np.load(reindexed_root_dir / f"{id}.npz"))
+            if keys is None:
+                keys = sorted(example.keys())
+            if sorted(example.keys()) != keys:
+                raise ValueError(f"example {id} has different keys: {keys}")
+
+            if columns is None:
+                columns = {}
+                for key in keys:
+                    value = np.asarray(example[key])
+                    columns[key] = np.lib.format.open_memmap(
+                        shard_dir / shard_name / f"{key}.npy",
+                        mode="w+",
+                        dtype=value.dtype,
+                        shape=(len(ids_shard),) + value.shape,
+                    )
+            for key in keys:
+                value = np.asarray(example[key])
+                if value.shape != columns[key].shape[1:]:
+                    raise ValueError(
+                        f"example {id} has different shape of {key}: "
+                        f"{value.shape} != {columns[key].shape[1:]}"
+                    )
+                columns[key][row] = value
+            id_to_location[id] = (shard, row)
+
+        for column in columns.values():
+            column.flush()
+        shards.append(shard_name)
+
+    with open(shard_dir / "index.json", "w") as f:
+        json.dump(dict(shards=shards, keys=keys or [], ids=id_to_location), f)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("reindexed_root_dir", help="reindexed root dir")
+    parser.add_argument(
+        "--shard-size", type=int, default=1000, help="examples per shard"
+    )
+    args = parser.parse_args()
+
+    convert_to_shards(args.reindexed_root_dir, shard_size=args.shard_size)
+
+
+if __name__ == "__main__":
+    main()
@@ -81,27 +81,19 @@ class YCBVideoRGBDPoseEstimationDataset(RGBDPoseEstimationDatasetBase):
             cad_files={},
         )
 
-    def get_example(self, index):
-        examples = super().get_example(index)
-
+    def _filter_instance(self, class_id, T_cad2cam, pcd):
         if self.split == "val":
-            return examples
-
-        examples_filtered = []
-        for example in examples:
-            diagonal = self._models.get_bbox_diagonal(example["class_id"])
-            aabb_min = example["translation_true"] - (diagonal / 2.0)
-            aabb_max = aabb_min + diagonal
-
-            nonnan = ~np.isnan(example["pcd"]).any(axis=2)
-            points = example["pcd"][nonnan]
-            bounded = (aabb_min <= points).all(axis=1) & (
-                points < aabb_max
-            ).all(axis=1)
-
-            bounded_rate = bounded.sum() / len(points)
-            if bounded_rate < self._bounded_rate_minimal:
-                continue
-            examples_filtered.append(example)
-
-        return examples_filtered
+            return True
+
+        diagonal = self._models.get_bbox_diagonal(class_id)
+        aabb_min = T_cad2cam[:3, 3] - (diagonal / 2.0)
+        aabb_max = aabb_min + diagonal
+
+        nonnan = ~np.isnan(pcd).any(axis=2)
+        points = pcd[nonnan]
+        bounded = (aabb_min <= points).all(axis=1) & (
+            points < aabb_max
+        ).all(axis=1)
+
+        bounded_rate = bounded.sum() / len(points)
+        return not bounded_rate < self._bounded_rate_minimal
@@ -5,6 +5,7 @@ import os.path as osp
 import numpy as np
 
 from ...base import DatasetBase
+from ..reindexed_format import unpack_example
 from .dataset import YCBVideoPoseCNNResultsRGBDPoseEstimationDataset
 
 
@@ -58,4 +59,4 @@ class YCBVideoPoseCNNResultsRGBDPoseEstimationDatasetReIndexed(DatasetBase):
     def get_example(self, index):
         id = self._ids[index]
         npz_file = self.root_dir / f"{id}.npz"
-        return dict(np.load(npz_file))
+        return unpack_example(np.load(npz_file))
@@ -19,6 +19,7 @@ class YCBVideoModels(ModelsBase):
     _cad_cache: typing.Dict[str, trimesh.Trimesh] = {}
     _pcd_cache: typing.Dict[str, np.ndarray] = {}
     _sdf_cache: typing.Dict[str, typing.Tuple[np.ndarray, np.ndarray]] = {}
+    _solid_voxel_points_cache: typing.Dict[str, np.ndarray] = {}
 
     @property
     def class_names(self):
@@ -76,7 +77,7 @@ class YCBVideoModels(ModelsBase):
             data = np.load(sdf_file)
             points, sdf = data["points"], data["sdf"]
         else:
-            points = self.get_solid_voxel_grid(class_id=class_id).points
+            points = self.get_solid_voxel_points(class_id=class_id)
             pitch = self.get_voxel_pitch(32, class_id=class_id)
             points = extra_module.open3d.voxel_down_sample(points, pitch)
             cad = self.get_cad(class_id=class_id)
@@ -91,6 +92,15 @@ class YCBVideoModels(ModelsBase):
             vg = trimesh.exchange.binvox.load_binvox(f)
         return vg
 
+    def get_solid_voxel_points(self, class_id):
+        """Returns read-only center points of the solid voxel grid."""
+        class_name = self.class_names[class_id]
+        if class_name not in self._solid_voxel_points_cache:
+            points = self.get_solid_voxel_grid(class_id=class_id).points
+            points.flags.writeable = False
+            self._solid_voxel_points_cache[class_name] = points
+        return self._solid_voxel_points_cache[class_name]
+
     def get_cad(self, class_id):
         class_name = self.class_names[class_id]
         if class_name not in self._cad_cache:
@@ -8,4 +8,6 @@ from . import _pybullet as pybullet
 
 from . import _pyglet as pyglet
 
+from . import _rasterize as rasterize
+
 from . import _trimesh as trimesh
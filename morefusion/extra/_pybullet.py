@@ -1,3 +1,4 @@
+import os
 import typing
 
 import numpy as np
@@ -214,19 +215,24 @@ def get_top_image(visual_file: str) -> np.ndarray:
     return rgb
 
 
-def get_camera_image(view_matrix, fovy, height, width):
+def get_camera_image(view_matrix, fovy, height, width, client_id=0):
     import pybullet
 
     far = 1000
     near = 0.01
     projection_matrix = pybullet.computeProjectionMatrixFOV(
-        fov=fovy, aspect=1.0 * width / height, farVal=far, nearVal=near
+        fov=fovy,
+        aspect=1.0 * width / height,
+        farVal=far,
+        nearVal=near,
+        physicsClientId=client_id,
     )
     _, _, rgba, depth, segm = pybullet.getCameraImage(
         width=width,
         height=height,
         viewMatrix=view_matrix,
         projectionMatrix=projection_matrix,
+        physicsClientId=client_id,
     )
     rgb = rgba[:, :, :3]
     depth = np.asarray(depth, dtype=np.float32).reshape(height, width)
@@ -235,7 +241,7 @@ def get_camera_image(view_matrix, fovy, height, width):
     return rgb, depth, segm
 
 
-def render_camera(T_cam2world, fovy, height, width):
+def render_camera(T_cam2world, fovy, height, width, client_id=0):
     view_matrix = T_cam2world.copy()
     view_matrix[:3, 3] = 0
     view_matrix[3, :3] = np.linalg.inv(T_cam2world)[:3, 3]
@@ -243,47 +249,179 @@ def render_camera(T_cam2world, fovy, height, width):
     view_matrix[:, 2] *= -1
     view_matrix = view_matrix.flatten()
     rgb, depth, segm = get_camera_image(
-        view_matrix=view_matrix, fovy=fovy, height=height, width=width,
+        view_matrix=view_matrix,
+        fovy=fovy,
+        height=height,
+        width=width,
+        client_id=client_id,
     )
     return rgb, depth, segm
 
 
-def render_cad(visual_file, Ts_cad2cam, fovy, height, width, scale=None):
-    assert isinstance(visual_file, str)
+class CadRenderer:
+    """Renderer of CAD models with a persistent DIRECT client.
+
+    The client is connected on the first rendering in each process, and
+    the visual shape of each CAD file is loaded once and kept in the
+    client. Each (CAD, pose) pair is rendered with only the CAD at the
+    origin, while the other cached ones are parked out of the view.
+    """
+
+    _parking_position = (1e5, 1e5, 1e5)
+
+    def __init__(self):
+        self._client_id = None
+        self._pid = None
+        self._unique_ids = {}  # key: (visual_file, scale), value: body id
+        self._unique_id_shown = None
+
+    def _connect(self):
+        import pybullet
+
+        # the client is not inherited by forked processes
+        if self._client_id is not None and self._pid == os.getpid():
+            return
+        self._client_id = pybullet.connect(pybullet.DIRECT)
+        self._pid = os.getpid()
+        self._unique_ids = {}
+        self._unique_id_shown = None
+
+    def close(self):
+        import pybullet
+
+        if self._client_id is not None and self._pid == os.getpid():
+            pybullet.disconnect(physicsClientId=self._client_id)
+        self._client_id = None
+        self._pid = None
+        self._unique_ids = {}
+        self._unique_id_shown = None
+
+    def _show(self, visual_file, scale):
+        import pybullet
+
+        if scale is None:
+            scale = [1, 1, 1]
+        if isinstance(scale, (int, float)):
+            scale = [scale] * 3
+        key = (str(visual_file), tuple(float(x) for x in scale))
+
+        if key not in self._unique_ids:
+            visual_shape_id = pybullet.createVisualShape(
+                shapeType=pybullet.GEOM_MESH,
+                fileName=key[0],
+                visualFramePosition=(0, 0, 0),
+                meshScale=key[1],
+                physicsClientId=self._client_id,
+            )
+            self._unique_ids[key] = pybullet.createMultiBody(
+                baseMass=0,
+                baseVisualShapeIndex=visual_shape_id,
+                basePosition=self._parking_position,
+                physicsClientId=self._client_id,
+            )
 
-    Ts_cad2cam = np.asarray(Ts_cad2cam)
-    ndim = Ts_cad2cam.ndim
-    if ndim == 2:
-        Ts_cad2cam = Ts_cad2cam[None]
-    assert Ts_cad2cam.shape == (Ts_cad2cam.shape[0], 4, 4)
+        unique_id = self._unique_ids[key]
+        if unique_id != self._unique_id_shown:
+            if self._unique_id_shown is not None:
+                pybullet.resetBasePositionAndOrientation(
+                    self._unique_id_shown,
+                    self._parking_position,
+                    (0, 0, 0, 1),
+                    physicsClientId=self._client_id,
+                )
+            pybullet.resetBasePositionAndOrientation(
+                unique_id,
+                (0, 0, 0),
+                (0, 0, 0, 1),
+                physicsClientId=self._client_id,
+            )
+            self._unique_id_shown = unique_id
+        return unique_id
+
+    def render(
+        self, visual_files, Ts_cad2cam, fovy, height, width, scale=None
+    ):
+        """Render CAD models in the poses.
+
+        Parameters
+        ----------
+        visual_files: str or list of str
+            CAD file of each pose, or the one of all the poses.
+        Ts_cad2cam: (N, 4, 4) or (4, 4) numpy.ndarray
+            Poses of the CAD models in the camera coordinates.
+        fovy: float
+            Vertical field of view in degrees.
+        height: int
+            Image height.
+        width: int
+            Image width.
+        scale: float or (3,) array-like, optional
+            Mesh scale.
+
+        Returns
+        -------
+        rgbs: (N, H, W, 3) or (H, W, 3) numpy.ndarray, uint8
+            Rendered RGB images.
+        depths: (N, H, W) or (H, W) numpy.ndarray, float32
+            Rendered depth images, where nan is the background.
+        masks: (N, H, W) or (H, W) numpy.ndarray, bool
+            Masks of the CAD models.
+        """
+        Ts_cad2cam = np.asarray(Ts_cad2cam)
+        ndim = Ts_cad2cam.ndim
+        if ndim == 2:
+            Ts_cad2cam = Ts_cad2cam[None]
+        assert Ts_cad2cam.shape == (Ts_cad2cam.shape[0], 4, 4)
+
+        if isinstance(visual_files, str):
+            visual_files = [visual_files] * len(Ts_cad2cam)
+        assert len(visual_files) == len(Ts_cad2cam)
+
+        self._connect()
+
+        rgbs = []
+        depths = []
+        masks = []
+        for visual_file, T_cad2cam in zip(visual_files, Ts_cad2cam):
+            unique_id = self._show(visual_file, scale)
+            T_cam2cad = np.linalg.inv(T_cad2cam)
+            rgb, depth, segm = render_camera(
+                T_cam2world=T_cam2cad,
+                fovy=fovy,
+                height=height,
+                width=width,
+                client_id=self._client_id,
+            )
+            rgbs.append(rgb)
+            depths.append(depth)
+            masks.append(segm == unique_id)
+        rgbs = np.asarray(rgbs, dtype=np.uint8)
+        depths = np.asarray(depths)
+        masks = np.asarray(masks)
 
-    import pybullet
+        if ndim == 2:
+            assert len(rgbs) == len(depths) == len(masks) == 1
+            rgbs = rgbs[0]
+            depths = depths[0]
+            masks = masks[0]
 
-    pybullet.connect(pybullet.DIRECT)
+        return rgbs, depths, masks
 
-    add_model(visual_file, mesh_scale=scale, register=False)
 
-    rgbs = []
-    depths = []
-    masks = []
-    for T_cad2cam in Ts_cad2cam:
-        T_cam2cad = np.linalg.inv(T_cad2cam)
-        rgb, depth, segm = render_camera(
-            T_cam2world=T_cam2cad, fovy=fovy, height=height, width=width
-        )
-        rgbs.append(rgb)
-        depths.append(depth)
-        masks.append(segm == 0)
-    rgbs = np.asarray(rgbs)
-    depths = np.asarray(depths)
-    masks = np.asarray(masks)
+_cad_renderer = None
 
-    pybullet.disconnect()
 
-    if ndim == 2:
-        assert len(rgbs) == len(depths) == len(masks) == 1
-        rgbs = rgbs[0]
-        depths = depths[0]
-        masks = masks[0]
+def get_cad_renderer() -> CadRenderer:
+    """Returns CadRenderer shared in the process."""
+    global _cad_renderer
+    if _cad_renderer is None:
+        _cad_renderer = CadRenderer()
+    return _cad_renderer
+
 
-    return rgbs, depths, masks
+def render_cad(visual_file, Ts_cad2cam, fovy, height, width, scale=None):
+    assert isinstance(visual_file, str)
+
+    return get_cad_renderer().render(
+        visual_file, Ts_cad2cam, fovy, height, width, scale=scale
+    )
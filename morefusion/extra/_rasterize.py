@@ -0,0 +1,206 @@
+import typing
+
+import numpy as np
+import trimesh
+
+
+def _edge(a, b, x, y):
+    # edge function of edges a->b at points (x, y)
+    return (b[:, 0] - a[:, 0]) * (y - a[:, 1]) - (b[:, 1] - a[:, 1]) * (
+        x - a[:, 0]
+    )
+
+
+def _project_meshes(meshes, Ts_mesh2cam, K, height, width, near):
+    uvs = [np.zeros((0, 3, 2))]
+    inv_zs = [np.zeros((0, 3))]
+    object_ids = [np.zeros((0,), dtype=np.int32)]
+    face_ids = [np.zeros((0,), dtype=np.int32)]
+    for object_id, (mesh, T_mesh2cam) in enumerate(zip(meshes, Ts_mesh2cam)):
+        vertices = trimesh.transform_points(mesh.vertices, T_mesh2cam)
+        triangles = vertices[mesh.faces]  # (F, 3, 3)
+
+        # faces crossing the near plane are not clipped but discarded
+        keep = (triangles[:, :, 2] > near).all(axis=1)
+        (indices,) = np.nonzero(keep)
+        triangles = triangles[indices]
+
+        x, y, z = triangles[:, :, 0], triangles[:, :, 1], triangles[:, :, 2]
+        u = K[0, 0] * x / z + K[0, 1] * y / z + K[0, 2]
+        v = K[1, 1] * y / z + K[1, 2]
+        uvs.append(np.stack([u, v], axis=2))
+        inv_zs.append(1 / z)
+        object_ids.append(np.full(len(indices), object_id, dtype=np.int32))
+        face_ids.append(indices.astype(np.int32))
+    uv = np.concatenate(uvs)
+    inv_z = np.concatenate(inv_zs)
+    object_ids = np.concatenate(object_ids)
+    face_ids = np.concatenate(face_ids)
+
+    # twice the signed area, and pixel centers are at integer coordinates
+    area = (uv[:, 1, 0] - uv[:, 0, 0]) * (uv[:, 2, 1] - uv[:, 0, 1]) - (
+        uv[:, 1, 1] - uv[:, 0, 1]
+    ) * (uv[:, 2, 0] - uv[:, 0, 0])
+    bbox_min = np.ceil(uv.min(axis=1)).astype(np.int64)
+    bbox_max = np.floor(uv.max(axis=1)).astype(np.int64)
+    bbox_min = np.maximum(bbox_min, 0)
+    bbox_max = np.minimum(bbox_max, [width - 1, height - 1])
+    keep = (np.abs(area) > 1e-12) & (bbox_min <= bbox_max).all(axis=1)
+
+    return dict(
+        uv=uv[keep],
+        inv_z=inv_z[keep],
+        area=area[keep],
+        bbox_min=bbox_min[keep],
+        bbox_max=bbox_max[keep],
+        object_ids=object_ids[keep],
+        face_ids=face_ids[keep],
+    )
+
+
+def rasterize_meshes(
+    meshes: typing.List[trimesh.Trimesh],
+    Ts_mesh2cam: np.ndarray,
+    K: np.ndarray,
+    height: int,
+    width: int,
+    *,
+    near: float = 0.01,
+    tile_size: int = 128,
+    max_elements: int = 2 ** 20,
+    return_barycentrics: bool = False,
+) -> tuple:
+    """Rasterize meshes with a z-buffer in NumPy.
+
+    The image is processed in tiles, and the pixels in the bboxes of the
+    triangles overlapping each tile are tested at once, in chunks of at
+    most max_elements (triangle, pixel) pairs. The mask of
+    each mesh, including its occluded region, is computed in the same
+    pass as the depth and instance ID images.
+
+    Parameters
+    ----------
+    meshes: list of trimesh.Trimesh
+        Meshes to rasterize.
+    Ts_mesh2cam: (N, 4, 4) numpy.ndarray
+        Poses of the meshes in the camera coordinates.
+    K: (3, 3) numpy.ndarray
+        Camera intrinsic matrix, where pixel centers are at integer
+        coordinates.
+    height: int
+        Image height.
+    width: int
+        Image width.
+    near: float
+        Near plane, and the faces crossing it are discarded.
+    tile_size: int
+        Size of the square tiles.
+    max_elements: int
+        Max number of (triangle, pixel) pairs tested at once.
+    return_barycentrics: bool
+        If True, the face IDs and barycentric coordinates are also returned.
+
+    Returns
+    -------
+    depth: (H, W) numpy.ndarray, float32
+        Depth image, where nan is the background.
+    instance_ids: (H, W) numpy.ndarray, int32
+        Index of the visible mesh, where -1 is the background.
+    masks: (N, H, W) numpy.ndarray, bool
+        Mask of each mesh without occlusion by the others.
+    face_ids: (H, W) numpy.ndarray, int32
+        Index of the visible face in the mesh, where -1 is the background.
+        Only returned if return_barycentrics is True.
+    barycentrics: (H, W, 3) numpy.ndarray, float32
+        Perspective-correct barycentric coordinates of the visible face.
+        Only returned if return_barycentrics is True.
+    """
+    Ts_mesh2cam = np.asarray(Ts_mesh2cam, dtype=float).reshape(-1, 4, 4)
+    assert len(meshes) == len(Ts_mesh2cam)
+    K = np.asarray(K, dtype=float)
+
+    z_buffer = np.full((height, width), np.inf, dtype=np.float64)
+    instance_ids = np.full((height, width), -1, dtype=np.int32)
+    masks = np.zeros((len(meshes), height, width), dtype=bool)
+    if return_barycentrics:
+        face_ids = np.full((height, width), -1, dtype=np.int32)
+        barycentrics = np.zeros((height, width, 3), dtype=np.float32)
+
+    faces = _project_meshes(meshes, Ts_mesh2cam, K, height, width, near)
+    for y1 in range(0, height, tile_size):
+        y2 = min(y1 + tile_size, height)
+        for x1 in range(0, width, tile_size):
+            x2 = min(x1 + tile_size, width)
+
+            (indices,) = np.nonzero(
+                (faces["bbox_min"][:, 0] < x2)
+                & (faces["bbox_max"][:, 0] >= x1)
+                & (faces["bbox_min"][:, 1] < y2)
+                & (faces["bbox_max"][:, 1] >= y1)
+            )
+            if indices.size == 0:
+                continue
+
+            # pixels in the bboxes of the triangles clipped by the tile
+            bbox_min = np.maximum(faces["bbox_min"][indices], [x1, y1])
+            bbox_max = np.minimum(faces["bbox_max"][indices], [x2 - 1, y2 - 1])
+            bbox_width = bbox_max[:, 0] - bbox_min[:, 0] + 1
+            n_pixels = bbox_width * (bbox_max[:, 1] - bbox_min[:, 1] + 1)
+
+            # chunks of triangles with at most max_elements pixels
+            n_pixels_cumsum = np.cumsum(n_pixels)
+            i_start = 0
+            while i_start < len(indices):
+                offset = n_pixels_cumsum[i_start] - n_pixels[i_start]
+                i_end = np.searchsorted(
+                    n_pixels_cumsum, offset + max_elements, side="right"
+                )
+                i_end = max(i_end, i_start + 1)
+                chunk = slice(i_start, i_end)
+                i_start = i_end
+
+                t = np.repeat(np.arange(i_end - chunk.start), n_pixels[chunk])
+                k = np.arange(len(t)) - np.repeat(
+                    n_pixels_cumsum[chunk] - n_pixels[chunk] - offset,
+                    n_pixels[chunk],
+                )
+                x = bbox_min[chunk][t, 0] + k % bbox_width[chunk][t]
+                y = bbox_min[chunk][t, 1] + k // bbox_width[chunk][t]
+                t = indices[chunk][t]
+
+                uv = faces["uv"][t]
+                area = faces["area"][t]
+                w0 = _edge(uv[:, 1], uv[:, 2], x, y) / area
+                w1 = _edge(uv[:, 2], uv[:, 0], x, y) / area
+                w2 = 1 - w0 - w1
+                inside = (w0 >= 0) & (w1 >= 0) & (w2 >= 0)
+                t, x, y = t[inside], x[inside], y[inside]
+                w = np.stack([w0[inside], w1[inside], w2[inside]], axis=1)
+
+                masks[faces["object_ids"][t], y, x] = True
+
+                # 1 / z is linear in the screen space
+                inv_z = faces["inv_z"][t]
+                z = 1 / (w * inv_z).sum(axis=1)
+
+                # nearest fragment of each pixel
+                pixels = y * width + x
+                order = np.lexsort((z, pixels))
+                _, first = np.unique(pixels[order], return_index=True)
+                order = order[first]
+                keep = z[order] < z_buffer[y[order], x[order]]
+                order = order[keep]
+
+                t, x, y, z = t[order], x[order], y[order], z[order]
+                z_buffer[y, x] = z
+                instance_ids[y, x] = faces["object_ids"][t]
+                if return_barycentrics:
+                    face_ids[y, x] = faces["face_ids"][t]
+                    barycentrics[y, x] = w[order] * inv_z[order] * z[:, None]
+
+    depth = z_buffer.astype(np.float32)
+    depth[instance_ids == -1] = np.nan
+
+    if return_barycentrics:
+        return depth, instance_ids, masks, face_ids, barycentrics
+    return depth, instance_ids, masks
@@ -2,7 +2,9 @@
 
 from .geometry import average_voxelization_3d
 from .geometry import compose_transform
+from .geometry import densify_voxel_grid
 from .geometry import interpolate_voxel_grid
+from .geometry import interpolate_voxel_pyramid
 from .geometry import max_voxelization_3d
 from .geometry import occupancy_grid_3d
 from .geometry import pseudo_occupancy_voxelization
@@ -11,5 +13,6 @@ from .geometry import transform_points
 from .geometry import transformation_matrix
 from .geometry import translation_matrix
 from .geometry import truncated_distance_function
+from .geometry import VoxelIndex
 
 from .loss import average_distance
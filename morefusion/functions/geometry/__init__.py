@@ -4,6 +4,8 @@ from .average_voxelization_3d import average_voxelization_3d
 
 from .compose_transform import compose_transform
 
+from .densify_voxel_grid import densify_voxel_grid
+
 from .max_voxelization_3d import max_voxelization_3d
 
 from .occupancy_grid_1d import occupancy_grid_1d
@@ -11,6 +13,7 @@ from .occupancy_grid_2d import occupancy_grid_2d
 from .occupancy_grid_3d import occupancy_grid_3d
 
 from .interpolate_voxel_grid import interpolate_voxel_grid
+from .interpolate_voxel_pyramid import interpolate_voxel_pyramid
 
 from .quaternion_matrix import quaternion_matrix
 
@@ -22,3 +25,5 @@ from .translation_matrix import translation_matrix
 
 from .truncated_distance_function import truncated_distance_function
 from .truncated_distance_function import pseudo_occupancy_voxelization
+
+from .voxel_index import VoxelIndex
@@ -1,6 +1,9 @@
+import chainer
 from chainer.backends import cuda
+import chainer.functions as F
 import numpy as np
 
+from .voxel_index import VoxelIndex
 from .voxelization_3d import Voxelization3D
 
 
@@ -14,29 +17,33 @@ class AverageVoxelization3D(Voxelization3D):
             raise ValueError("points include nan")
 
         B = self.batch_size
-        P = points.shape[0]
         C = values.shape[1]
         X, Y, Z = self.dimensions
 
-        matrix = np.zeros([B, C, X, Y, Z], dtype=np.float32)
-        counts = np.zeros([B, X, Y, Z], dtype=np.int32)
-
-        for i in range(P):
-            batch_index = batch_indices[i]
-            point = points[i]
-            value = values[i]
-
-            index = ((point - self.origin) / self.pitch).round().astype(int)
-            valid = ((0 <= index) & (index < self.dimensions)).all()
-            if valid:
-                ix, iy, iz = index
-                matrix[batch_index, :, ix, iy, iz] += value
-                counts[batch_index, ix, iy, iz] += 1
-
-        IB, IX, IY, IZ = np.nonzero(counts)
-        matrix[IB, :, IX, IY, IZ] /= counts[IB, IX, IY, IZ][:, None]
+        indices, valid = self._get_voxel_indices_cpu(points, batch_indices)
+        if self.voxel_index is None:
+            indices, inverse, counts_occupied = np.unique(
+                indices[valid], return_inverse=True, return_counts=True
+            )
+        else:
+            indices, inverse, counts_occupied = self.voxel_index.get_unique()
+
+        # sum values per occupied voxel
+        sums = np.zeros([indices.size, C], dtype=np.float32)
+        np.add.at(sums, inverse, values[valid])
+
+        matrix = np.zeros([B, C, X * Y * Z], dtype=np.float32)
+        counts = np.zeros([B, X * Y * Z], dtype=np.int32)
+        IB, IXYZ = np.divmod(indices, X * Y * Z)
+        matrix[IB, :, IXYZ] = sums / counts_occupied[:, None]
+        counts[IB, IXYZ] = counts_occupied
+        matrix = matrix.reshape(B, C, X, Y, Z)
+        counts = counts.reshape(B, X, Y, Z)
 
         self.counts = counts
+        self._voxels = indices
+        self._inverse = inverse
+        self._valid = valid
         return (matrix,)
 
     def forward_gpu(self, inputs):
@@ -119,28 +126,20 @@ class AverageVoxelization3D(Voxelization3D):
 
     def backward_cpu(self, inputs, gy):
         points = inputs[1]
-        batch_indices = inputs[2]
         counts = self.counts
         gmatrix = gy[0]
 
         P = points.shape[0]
-        C = gmatrix.shape[1]
-        X, Y, Z = self.dimensions
+        B, C, X, Y, Z = gmatrix.shape
 
         gvalues = np.zeros((P, C), dtype=np.float32)
 
-        for i in range(P):
-            batch_index = batch_indices[i]
-            point = points[i]
-
-            index = ((point - self.origin) / self.pitch).round().astype(int)
-            valid = ((0 <= index) & (index < self.dimensions)).all()
-            if valid:
-                ix, iy, iz = index
-                gvalues[i] = (
-                    gmatrix[batch_index, :, ix, iy, iz]
-                    / counts[batch_index, ix, iy, iz]
-                )
+        # gather through the occupied voxels found in forward
+        IB, IXYZ = np.divmod(self._voxels, X * Y * Z)
+        gmatrix = gmatrix.reshape(B, C, X * Y * Z)
+        counts = counts.reshape(B, X * Y * Z)
+        gvoxels = gmatrix[IB, :, IXYZ] / counts[IB, IXYZ][:, None]
+        gvalues[self._valid] = gvoxels[self._inverse]
 
         return gvalues, None, None
 
@@ -220,6 +219,51 @@ class AverageVoxelization3D(Voxelization3D):
         return gvalues, None, None
 
 
+def _average_voxelization_3d_sparse(
+    values,
+    points,
+    batch_indices,
+    *,
+    batch_size,
+    origin,
+    pitch,
+    dimensions,
+    voxel_index=None,
+):
+    values = chainer.as_variable(values)
+    points = chainer.as_variable(points).array
+    xp = cuda.get_array_module(values)
+
+    # validation
+    if xp.isnan(points).sum():
+        raise ValueError("points include nan")
+
+    if voxel_index is None:
+        voxel_index = VoxelIndex(
+            points,
+            batch_indices,
+            batch_size=batch_size,
+            origin=origin,
+            pitch=pitch,
+            dimensions=dimensions,
+        )
+    else:
+        voxel_index._check_grid(
+            points, batch_size, dimensions, origin=origin, pitch=pitch
+        )
+
+    voxels, inverse, counts = voxel_index.get_unique()
+    (points_valid,) = xp.nonzero(voxel_index.valid)
+
+    features = xp.zeros((voxels.size, values.shape[1]), dtype=values.dtype)
+    features = F.scatter_add(features, inverse, values[points_valid])
+    features = features / counts[:, None].astype(values.dtype)
+
+    coords = xp.unravel_index(voxels, voxel_index.shape)
+    coords = xp.stack(coords, axis=1).astype(np.int32)
+    return (coords, features), counts.astype(np.int32)
+
+
 def average_voxelization_3d(
     values,
     points,
@@ -230,12 +274,44 @@ def average_voxelization_3d(
     pitch,
     dimensions,
     return_counts=False,
+    voxel_index=None,
+    sparse=False,
 ):
+    """Average values of points in each voxel.
+
+    Parameters
+    ----------
+    voxel_index: VoxelIndex, optional
+        Voxel indices precomputed from the same points and voxel grid,
+        which are reused instead of computed again on CPU.
+    sparse: bool
+        If True, only the occupied voxels are returned in the COO form
+        as (coords, features), where coords is (N, 4) int32 of (b, x, y, z)
+        and features is (N, C), and counts is (N,) int32.
+        See also ``densify_voxel_grid``.
+    """
+    if sparse:
+        voxel, counts = _average_voxelization_3d_sparse(
+            values,
+            points,
+            batch_indices,
+            batch_size=batch_size,
+            origin=origin,
+            pitch=pitch,
+            dimensions=dimensions,
+            voxel_index=voxel_index,
+        )
+        if return_counts:
+            return voxel, counts
+        else:
+            return voxel
+
     func = AverageVoxelization3D(
         batch_size=batch_size,
         origin=origin,
         pitch=pitch,
         dimensions=dimensions,
+        voxel_index=voxel_index,
     )
     voxel = func(values, points, batch_indices)
     if return_counts:
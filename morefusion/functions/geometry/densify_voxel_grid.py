@@ -0,0 +1,39 @@
+import chainer
+from chainer.backends import cuda
+import chainer.functions as F
+import numpy as np
+
+
+def densify_voxel_grid(coords, features, *, batch_size, dimensions):
+    """Dense voxel grid from sparse one in the COO form.
+
+    Parameters
+    ----------
+    coords: (N, 4) numpy.ndarray or cupy.ndarray, int32
+        Voxel coordinates (b, x, y, z) of the occupied voxels.
+    features: (N, C) numpy.ndarray, cupy.ndarray or chainer.Variable
+        Features of the occupied voxels.
+    batch_size: int
+        Number of batches B.
+    dimensions: tuple of int
+        Voxel grid dimensions (X, Y, Z).
+
+    Returns
+    -------
+    matrix: (B, C, X, Y, Z) chainer.Variable
+        Dense voxel grid, which is 0 at the unoccupied voxels.
+    """
+    features = chainer.as_variable(features)
+    xp = cuda.get_array_module(features)
+
+    B = batch_size
+    X, Y, Z = dimensions
+    C = features.shape[1]
+
+    ib, ix, iy, iz = coords.astype(np.int64).T
+    indices = ((ib * X + ix) * Y + iy) * Z + iz
+
+    matrix = xp.zeros((B * X * Y * Z, C), dtype=features.dtype)
+    matrix = F.scatter_add(matrix, indices, features)
+    matrix = matrix.reshape(B, X, Y, Z, C).transpose(0, 4, 1, 2, 3)
+    return matrix
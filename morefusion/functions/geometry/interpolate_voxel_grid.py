@@ -74,46 +74,69 @@ def _get_trilinear_interp_params(ix, iy, iz):
     hy = 1.0 - ly
     hz = 1.0 - lz
 
-    weight = np.empty((8,), dtype=np.float32)
-    weight[0] = hx * hy * hz  # w000
-    weight[1] = lx * hy * hz  # w100
-    weight[2] = hx * ly * hz  # w010
-    weight[3] = hx * hy * lz  # w001
-    weight[4] = lx * ly * hz  # w110
-    weight[5] = hx * ly * lz  # w011
-    weight[6] = lx * hy * lz  # w101
-    weight[7] = lx * ly * lz  # w111
-
-    ixyz = np.empty((8, 3), dtype=np.int32)
-    ixyz[0, 0] = ix_low
-    ixyz[0, 1] = iy_low
-    ixyz[0, 2] = iz_low
-    ixyz[1, 0] = ix_high
-    ixyz[1, 1] = iy_low
-    ixyz[1, 2] = iz_low
-    ixyz[2, 0] = ix_low
-    ixyz[2, 1] = iy_high
-    ixyz[2, 2] = iz_low
-    ixyz[3, 0] = ix_low
-    ixyz[3, 1] = iy_low
-    ixyz[3, 2] = iz_high
-    ixyz[4, 0] = ix_high
-    ixyz[4, 1] = iy_high
-    ixyz[4, 2] = iz_low
-    ixyz[5, 0] = ix_low
-    ixyz[5, 1] = iy_high
-    ixyz[5, 2] = iz_high
-    ixyz[6, 0] = ix_high
-    ixyz[6, 1] = iy_low
-    ixyz[6, 2] = iz_high
-    ixyz[7, 0] = ix_high
-    ixyz[7, 1] = iy_high
-    ixyz[7, 2] = iz_high
+    # (..., 8)
+    weight = np.stack(
+        [
+            hx * hy * hz,  # w000
+            lx * hy * hz,  # w100
+            hx * ly * hz,  # w010
+            hx * hy * lz,  # w001
+            lx * ly * hz,  # w110
+            hx * ly * lz,  # w011
+            lx * hy * lz,  # w101
+            lx * ly * lz,  # w111
+        ],
+        axis=-1,
+    ).astype(np.float32)
+
+    # (..., 8, 3)
+    ixyz = np.stack(
+        [
+            np.stack([ix_low, iy_low, iz_low], axis=-1),
+            np.stack([ix_high, iy_low, iz_low], axis=-1),
+            np.stack([ix_low, iy_high, iz_low], axis=-1),
+            np.stack([ix_low, iy_low, iz_high], axis=-1),
+            np.stack([ix_high, iy_high, iz_low], axis=-1),
+            np.stack([ix_low, iy_high, iz_high], axis=-1),
+            np.stack([ix_high, iy_low, iz_high], axis=-1),
+            np.stack([ix_high, iy_high, iz_high], axis=-1),
+        ],
+        axis=-2,
+    ).astype(np.int32)
 
     return weight, ixyz
 
 
+def _get_trilinear_interp_indices(points, batch_indices, shape):
+    """Get flattened indices and weights of 8 corners of each point.
+
+    Returns
+    -------
+    weight: (P, 8) numpy.ndarray, float32
+        Interpolation weights, which are 0 for corners outside of the grid.
+    indices: (P, 8) numpy.ndarray, int64
+        Indices in (B, X, Y, Z), which are 0 for corners outside of the grid.
+    """
+    B, _, X, Y, Z = shape
+
+    weight, ixyz = _get_trilinear_interp_params(
+        points[:, 0], points[:, 1], points[:, 2]
+    )
+    valid = ((0 <= ixyz) & (ixyz < (X, Y, Z))).all(axis=2)
+    ixyz[~valid] = 0
+    weight[~valid] = 0
+
+    indices = np.ravel_multi_index(
+        (batch_indices[:, None], ixyz[:, :, 0], ixyz[:, :, 1], ixyz[:, :, 2]),
+        (B, X, Y, Z),
+    )
+    return weight, indices
+
+
 class InterpolateVoxelGrid(chainer.Function):
+    def __init__(self, voxel_index=None):
+        self.voxel_index = voxel_index
+
     def check_type_forward(self, in_types):
         chainer.utils.type_check.expect(in_types.size() == 3)
 
@@ -130,31 +153,47 @@ class InterpolateVoxelGrid(chainer.Function):
         )
 
     def forward_cpu(self, x):
+        self.retain_inputs((1, 2))
         voxelized, points, batch_indices = x
+        self._shape = voxelized.shape
 
         P, _ = points.shape
         B, C, X, Y, Z = voxelized.shape
 
+        if self.voxel_index is None:
+            weight, indices = _get_trilinear_interp_indices(
+                points, batch_indices, voxelized.shape
+            )
+        else:
+            self.voxel_index._check_grid(
+                points, B, (X, Y, Z), in_voxel_coordinates=True
+            )
+            weight, indices = self.voxel_index.get_trilinear_interp_indices()
+        self._weight = weight
+        self._indices = indices
+
+        # BCXYZ -> (BXYZ)C to gather channels of each voxel contiguously
+        voxelized = voxelized.transpose(0, 2, 3, 4, 1).reshape(-1, C)
+
         values = np.zeros((P, C), dtype=np.float32)
-        for i, point in enumerate(points):
-            b = batch_indices[i]
-            ix, iy, iz = point
-            weight, ixyz = _get_trilinear_interp_params(ix, iy, iz)
-            for j in range(8):
-                ix, iy, iz = ixyz[j]
-                if (
-                    ix >= 0
-                    and ix < X
-                    and iy >= 0
-                    and iy < Y
-                    and iz >= 0
-                    and iz < Z
-                ):
-                    values[i] += weight[j] * voxelized[b, :, ix, iy, iz]
+        for j in range(8):
+            values += weight[:, j, None] * voxelized[indices[:, j]]
         return (values,)
 
     def backward_cpu(self, x, gy):
-        raise NotImplementedError
+        (gvalues,) = gy
+
+        B, C, X, Y, Z = self._shape
+        weight = self._weight
+        indices = self._indices
+
+        gvoxelized = np.zeros((B * X * Y * Z, C), dtype=np.float32)
+        for j in range(8):
+            np.add.at(gvoxelized, indices[:, j], weight[:, j, None] * gvalues)
+        gvoxelized = gvoxelized.reshape(B, X, Y, Z, C)
+        gvoxelized = np.ascontiguousarray(gvoxelized.transpose(0, 4, 1, 2, 3))
+
+        return gvoxelized, None, None
 
     def forward_gpu(self, x):
         self.retain_inputs((1, 2))
@@ -200,8 +239,8 @@ class InterpolateVoxelGrid(chainer.Function):
                 {
                     int index = (b * C * X * Y * Z) +
                                 (c * X * Y * Z) +
-                                (ixyz[j][0] * X * Y) +
-                                (ixyz[j][1] * Y) +
+                                (ixyz[j][0] * Y * Z) +
+                                (ixyz[j][1] * Z) +
                                 ixyz[j][2];
                     atomicAdd(&values, weight[j] * voxelized[index]);
                 }
@@ -268,8 +307,20 @@ class InterpolateVoxelGrid(chainer.Function):
         return gvoxelized, None, None
 
 
-def interpolate_voxel_grid(voxelized, points, batch_indices):
-    return InterpolateVoxelGrid()(voxelized, points, batch_indices)
+def interpolate_voxel_grid(
+    voxelized, points, batch_indices, *, voxel_index=None
+):
+    """Trilinear interpolation of voxel grid at points.
+
+    Parameters
+    ----------
+    voxel_index: VoxelIndex, optional
+        Voxel indices of the same points in the voxel grid, whose trilinear
+        corners are reused instead of computed again on CPU.
+    """
+    return InterpolateVoxelGrid(voxel_index=voxel_index)(
+        voxelized, points, batch_indices
+    )
 
 
 def main():
@@ -0,0 +1,256 @@
+import chainer
+from chainer.backends import cuda
+import numpy as np
+
+from .interpolate_voxel_grid import _get_trilinear_interp_indices
+from .interpolate_voxel_grid import _GET_TRILINEAR_INTERP_KERNEL
+
+
+class InterpolateVoxelPyramid(chainer.Function):
+    def __init__(self, *, scales):
+        self.scales = tuple(float(scale) for scale in scales)
+
+    def check_type_forward(self, in_types):
+        chainer.utils.type_check.expect(
+            in_types.size() == 2 + len(self.scales)
+        )
+
+        points_type, batch_indices_type = in_types[:2]
+        chainer.utils.type_check.expect(
+            points_type.dtype == np.float32,
+            points_type.ndim == 2,
+            points_type.shape[1] == 3,
+            batch_indices_type.dtype == np.int32,
+            batch_indices_type.ndim == 1,
+            batch_indices_type.shape[0] == points_type.shape[0],
+        )
+        for voxelized_type in in_types[2:]:
+            chainer.utils.type_check.expect(
+                voxelized_type.dtype == np.float32,
+                voxelized_type.ndim == 5,  # BCXYZ
+            )
+
+    def _get_offsets(self, shapes):
+        channels = [shape[1] for shape in shapes]
+        offsets = np.r_[0, np.cumsum(channels)[:-1]].tolist()
+        return channels, offsets
+
+    def forward_cpu(self, x):
+        self.retain_inputs((0, 1))
+        points, batch_indices = x[:2]
+        voxelized_list = x[2:]
+        self._shapes = [v.shape for v in voxelized_list]
+
+        P = points.shape[0]
+        channels, offsets = self._get_offsets(self._shapes)
+
+        values = np.zeros((P, sum(channels)), dtype=np.float32)
+        self._interp_indices = []  # (weight, indices) of each level
+        for voxelized, scale, C, offset in zip(
+            voxelized_list, self.scales, channels, offsets
+        ):
+            weight, indices = _get_trilinear_interp_indices(
+                points / np.float32(scale), batch_indices, voxelized.shape
+            )
+            self._interp_indices.append((weight, indices))
+            # BCXYZ -> (BXYZ)C to gather channels of each voxel contiguously
+            voxelized = voxelized.transpose(0, 2, 3, 4, 1).reshape(-1, C)
+
+            values_level = values[:, offset : offset + C]
+            for j in range(8):
+                values_level += weight[:, j, None] * voxelized[indices[:, j]]
+        return (values,)
+
+    def backward_cpu(self, x, gy):
+        (gvalues,) = gy
+
+        channels, offsets = self._get_offsets(self._shapes)
+
+        gvoxelized_list = []
+        for shape, (weight, indices), C, offset in zip(
+            self._shapes, self._interp_indices, channels, offsets
+        ):
+            B, _, X, Y, Z = shape
+
+            gvalues_level = gvalues[:, offset : offset + C]
+            gvoxelized = np.zeros((B * X * Y * Z, C), dtype=np.float32)
+            for j in range(8):
+                np.add.at(
+                    gvoxelized,
+                    indices[:, j],
+                    weight[:, j, None] * gvalues_level,
+                )
+            gvoxelized = gvoxelized.reshape(B, X, Y, Z, C)
+            gvoxelized = gvoxelized.transpose(0, 4, 1, 2, 3)
+            gvoxelized_list.append(np.ascontiguousarray(gvoxelized))
+
+        return (None, None) + tuple(gvoxelized_list)
+
+    def forward_gpu(self, x):
+        self.retain_inputs((0, 1))
+        points, batch_indices = x[:2]
+        voxelized_list = x[2:]
+        self._shapes = [v.shape for v in voxelized_list]
+
+        P = points.shape[0]
+        channels, offsets = self._get_offsets(self._shapes)
+        n_channel_total = sum(channels)
+
+        values = cuda.cupy.zeros((P, n_channel_total), dtype=np.float32)
+        for voxelized, scale, C, offset in zip(
+            voxelized_list, self.scales, channels, offsets
+        ):
+            shape = cuda.cupy.array(voxelized.shape, dtype=np.int32)
+            cuda.elementwise(
+                """
+                raw float32 voxelized, raw float32 points,
+                raw int32 batch_indices, raw int32 shape,
+                float32 scale, int32 offset, int32 n_channel_total
+                """,
+                "raw float32 values",
+                r"""
+                int C = shape[1];
+                int X = shape[2];
+                int Y = shape[3];
+                int Z = shape[4];
+
+                // i: index of values of this level
+                // values: (P, n_channel_total)
+                int c = i % C;  // c = {0 ... C}
+                int n = i / C;  // n = {0 ... P}
+                int b = batch_indices[n];
+
+                float ix = points[n * 3] / scale;
+                float iy = points[n * 3 + 1] / scale;
+                float iz = points[n * 3 + 2] / scale;
+
+                float weight[8];
+                int ixyz[8][3];
+                _get_trilinear_interp_params(ix, iy, iz, weight, ixyz);
+
+                float value = 0;
+                for (size_t j = 0; j < 8; j++) {
+                    if (ixyz[j][0] >= 0 && ixyz[j][0] < X &&
+                        ixyz[j][1] >= 0 && ixyz[j][1] < Y &&
+                        ixyz[j][2] >= 0 && ixyz[j][2] < Z)
+                    {
+                        int index = (b * C * X * Y * Z) +
+                                    (c * X * Y * Z) +
+                                    (ixyz[j][0] * Y * Z) +
+                                    (ixyz[j][1] * Z) +
+                                    ixyz[j][2];
+                        value += weight[j] * voxelized[index];
+                    }
+                }
+                values[n * n_channel_total + offset + c] = value;
+                """,
+                "interpolate_voxel_pyramid_fwd",
+                preamble=_GET_TRILINEAR_INTERP_KERNEL,
+            )(
+                voxelized,
+                points,
+                batch_indices,
+                shape,
+                np.float32(scale),
+                np.int32(offset),
+                np.int32(n_channel_total),
+                values,
+                size=P * C,
+            )
+
+        return (values,)
+
+    def backward_gpu(self, x, gy):
+        points, batch_indices = x[:2]
+        (gvalues,) = gy
+
+        P = points.shape[0]
+        channels, offsets = self._get_offsets(self._shapes)
+        n_channel_total = sum(channels)
+
+        gvoxelized_list = []
+        for shape, scale, C, offset in zip(
+            self._shapes, self.scales, channels, offsets
+        ):
+            gvoxelized = cuda.cupy.zeros(shape, dtype=np.float32)
+            cuda.elementwise(
+                """
+                raw float32 gvalues, raw float32 points,
+                raw int32 batch_indices, raw int32 shape,
+                float32 scale, int32 offset, int32 n_channel_total
+                """,
+                "raw float32 gvoxelized",
+                r"""
+                int C = shape[1];
+                int X = shape[2];
+                int Y = shape[3];
+                int Z = shape[4];
+
+                int c = i % C;  // c = {0 ... C}
+                int n = i / C;  // n = {0 ... P}
+                int b = batch_indices[n];
+                float gvalue = gvalues[n * n_channel_total + offset + c];
+
+                float ix = points[n * 3] / scale;
+                float iy = points[n * 3 + 1] / scale;
+                float iz = points[n * 3 + 2] / scale;
+
+                float weight[8];
+                int ixyz[8][3];
+                _get_trilinear_interp_params(ix, iy, iz, weight, ixyz);
+
+                for (size_t j = 0; j < 8; j++) {
+                    if (ixyz[j][0] >= 0 && ixyz[j][0] < X &&
+                        ixyz[j][1] >= 0 && ixyz[j][1] < Y &&
+                        ixyz[j][2] >= 0 && ixyz[j][2] < Z)
+                    {
+                        int index = (b * C * X * Y * Z) +
+                                    (c * X * Y * Z) +
+                                    (ixyz[j][0] * Y * Z) +
+                                    (ixyz[j][1] * Z) +
+                                    ixyz[j][2];
+                        atomicAdd(&gvoxelized[index], weight[j] * gvalue);
+                    }
+                }
+                """,
+                "interpolate_voxel_pyramid_bwd",
+                preamble=_GET_TRILINEAR_INTERP_KERNEL,
+            )(
+                gvalues,
+                points,
+                batch_indices,
+                cuda.cupy.array(shape, dtype=np.int32),
+                np.float32(scale),
+                np.int32(offset),
+                np.int32(n_channel_total),
+                gvoxelized,
+                size=P * C,
+            )
+            gvoxelized_list.append(gvoxelized)
+
+        return (None, None) + tuple(gvoxelized_list)
+
+
+def interpolate_voxel_pyramid(voxelized, points, batch_indices, *, scales):
+    """Interpolate features of multi-level voxel grids into one array.
+
+    Parameters
+    ----------
+    voxelized: list of (B, C_i, X_i, Y_i, Z_i) chainer.Variable
+        Voxel grids of each level.
+    points: (P, 3) numpy.ndarray or cupy.ndarray, float32
+        Points in the voxel coordinates of the finest level (scale=1).
+    batch_indices: (P,) numpy.ndarray or cupy.ndarray, int32
+        Batch indices of points.
+    scales: list of float
+        Scale of each level, by which points are divided.
+
+    Returns
+    -------
+    values: (P, sum(C_i)) chainer.Variable
+        Concatenated features of all the levels.
+    """
+    if len(voxelized) != len(scales):
+        raise ValueError("voxelized and scales must have the same length")
+    func = InterpolateVoxelPyramid(scales=scales)
+    return func(points, batch_indices, *voxelized)
@@ -1,6 +1,8 @@
+import chainer
 from chainer.backends import cuda
 import numpy as np
 
+from .voxel_index import VoxelIndex
 from .voxelization_3d import Voxelization3D
 
 
@@ -13,43 +15,48 @@ class MaxVoxelization3D(Voxelization3D):
             raise ValueError("points include nan")
 
         B = self.batch_size
+        P = points.shape[0]
         C = values.shape[1]
         X, Y, Z = self.dimensions
 
-        matrix = np.zeros([B, C, X, Y, Z], dtype=np.float32)
-        indices = np.full([B, X, Y, Z], -1, dtype=np.int32)
-        max_intensities = np.zeros([B, X, Y, Z], dtype=np.float32)
-
-        for i in range(points.shape[0]):
-            batch_index = batch_indices[i]
-            point = points[i]
-            value = values[i]
-            intensity = intensities[i]
-
-            index = ((point - self.origin) / self.pitch).round().astype(int)
-            valid = ((0 <= index) & (index < self.dimensions)).all()
-            if valid:
-                ix, iy, iz = index
-                if (indices[batch_index, ix, iy, iz] < 0) or (
-                    intensity > max_intensities[batch_index, ix, iy, iz]
-                ):  # NOQA
-                    matrix[batch_index, :, ix, iy, iz] = value
-                    indices[batch_index, ix, iy, iz] = i
-                    max_intensities[batch_index, ix, iy, iz] = intensity
+        indices, valid = self._get_voxel_indices_cpu(points, batch_indices)
+        (points_valid,) = np.nonzero(valid)
+        indices = indices[valid]
+
+        # sort by (voxel, intensity, -point) and take the last one in each
+        # voxel, which has the max intensity and is the first of the ties
+        order = np.lexsort((-points_valid, intensities[valid], indices))
+        indices = indices[order]
+        points_valid = points_valid[order]
+        last = np.r_[indices[1:] != indices[:-1], True]
+        voxels = indices[last]
+        winners = points_valid[last].astype(np.int32)
+
+        matrix = np.zeros([B, C, X * Y * Z], dtype=np.float32)
+        IB, IXYZ = np.divmod(voxels, X * Y * Z)
+        matrix[IB, :, IXYZ] = values[winners]
+        matrix = matrix.reshape(B, C, X, Y, Z)
+
+        indices = np.full([B * X * Y * Z], -1, dtype=np.int32)
+        indices[voxels] = winners
+        indices = indices.reshape(B, X, Y, Z)
 
         self.indices = indices
-        self.n_points = points.shape[0]
+        self.n_points = P
+        self._voxels = voxels
+        self._winners = winners
         return (matrix,)
 
     def backward_cpu(self, inputs, gy):
         gmatrix = gy[0]
 
-        channels = gmatrix.shape[1]
-        gvalues = np.zeros((self.n_points, channels), dtype=np.float32)
-        for i in range(self.n_points):
-            mask = self.indices == i
-            ib, ix, iy, iz = np.where(mask)
-            gvalues[i] = gmatrix[ib, :, ix, iy, iz].sum(axis=0)
+        B, C, X, Y, Z = gmatrix.shape
+        gvalues = np.zeros((self.n_points, C), dtype=np.float32)
+
+        # each point wins at most one voxel, so the gradient is a gather
+        IB, IXYZ = np.divmod(self._voxels, X * Y * Z)
+        gmatrix = gmatrix.reshape(B, C, X * Y * Z)
+        gvalues[self._winners] = gmatrix[IB, :, IXYZ]
 
         return gvalues, None, None, None
 
@@ -185,6 +192,61 @@ class MaxVoxelization3D(Voxelization3D):
         return gvalues, None, None, None
 
 
+def _max_voxelization_3d_sparse(
+    values,
+    points,
+    batch_indices,
+    intensities,
+    *,
+    batch_size,
+    origin,
+    pitch,
+    dimensions,
+    voxel_index=None,
+):
+    values = chainer.as_variable(values)
+    points = chainer.as_variable(points).array
+    xp = cuda.get_array_module(values)
+
+    # validation
+    if xp.isnan(points).sum():
+        raise ValueError("points include nan")
+
+    if voxel_index is None:
+        voxel_index = VoxelIndex(
+            points,
+            batch_indices,
+            batch_size=batch_size,
+            origin=origin,
+            pitch=pitch,
+            dimensions=dimensions,
+        )
+    else:
+        voxel_index._check_grid(
+            points, batch_size, dimensions, origin=origin, pitch=pitch
+        )
+
+    (points_valid,) = xp.nonzero(voxel_index.valid)
+    indices = voxel_index.indices[points_valid]
+
+    # sort by (voxel, intensity, -point) and take the last one in each
+    # voxel, which has the max intensity and is the first of the ties
+    order = xp.lexsort(
+        xp.stack([-points_valid, intensities[points_valid], indices])
+    )
+    indices = indices[order]
+    points_valid = points_valid[order]
+    last = xp.ones(indices.shape, dtype=bool)
+    last[:-1] = indices[1:] != indices[:-1]
+    voxels = indices[last]
+    winners = points_valid[last].astype(np.int32)
+
+    features = values[winners]
+    coords = xp.unravel_index(voxels, voxel_index.shape)
+    coords = xp.stack(coords, axis=1).astype(np.int32)
+    return (coords, features), winners
+
+
 def max_voxelization_3d(
     values,
     points,
@@ -196,12 +258,45 @@ def max_voxelization_3d(
     pitch,
     dimensions,
     return_indices=False,
+    voxel_index=None,
+    sparse=False,
 ):
+    """Values of the point with the max intensity in each voxel.
+
+    Parameters
+    ----------
+    voxel_index: VoxelIndex, optional
+        Voxel indices precomputed from the same points and voxel grid,
+        which are reused instead of computed again on CPU.
+    sparse: bool
+        If True, only the occupied voxels are returned in the COO form
+        as (coords, features), where coords is (N, 4) int32 of (b, x, y, z)
+        and features is (N, C), and indices is (N,) int32 of the points.
+        See also ``densify_voxel_grid``.
+    """
+    if sparse:
+        voxelized, indices = _max_voxelization_3d_sparse(
+            values,
+            points,
+            batch_indices,
+            intensities,
+            batch_size=batch_size,
+            origin=origin,
+            pitch=pitch,
+            dimensions=dimensions,
+            voxel_index=voxel_index,
+        )
+        if return_indices:
+            return voxelized, indices
+        else:
+            return voxelized
+
     func = MaxVoxelization3D(
         batch_size=batch_size,
         origin=origin,
         pitch=pitch,
         dimensions=dimensions,
+        voxel_index=voxel_index,
     )
     voxelized = func(values, points, batch_indices, intensities)
     if return_indices:
@@ -74,7 +74,149 @@ class OccupancyGrid3D(chainer.Function):
         return (grad_points,)
 
 
-def occupancy_grid_3d(points, *, pitch, origin, dims, threshold=1):
+def _get_local_voxel_indices(points, *, dims, threshold, batch_indices=None):
+    """Get voxels within threshold of each point and its nearest point.
+
+    Parameters
+    ----------
+    points: (P, 3) numpy.ndarray or cupy.ndarray
+        Points in the voxel coordinates.
+    batch_indices: (P,) numpy.ndarray or cupy.ndarray, optional
+        Batch index of each point. If given, the voxel indices are offset by
+        the batch index times the number of voxels X * Y * Z.
+
+    Returns
+    -------
+    voxel_indices: (N,) numpy.ndarray or cupy.ndarray, int64
+        Flattened indices of the voxels within threshold of any point.
+    point_indices: (N,) numpy.ndarray or cupy.ndarray, int64
+        Index of the nearest point of each voxel.
+    """
+    xp = cuda.get_array_module(points)
+
+    radius = int(np.ceil(threshold))
+    ksize = 2 * radius + 1
+    kernel = xp.meshgrid(*(xp.arange(ksize),) * 3, indexing="ij")
+    kernel = xp.stack(kernel, axis=-1).reshape(-1, 3)
+
+    dims = xp.asarray(dims, dtype=np.int64)
+    ixyz = xp.ceil(points - threshold).astype(np.int64)[:, None, :] + kernel
+    distance = xp.sqrt(((ixyz - points[:, None, :]) ** 2).sum(axis=2))
+    keep = ((0 <= ixyz) & (ixyz < dims)).all(axis=2) & (distance < threshold)
+
+    point_indices = xp.nonzero(keep)[0]
+    ixyz = ixyz[keep]
+    distance = distance[keep]
+    voxel_indices = (ixyz[:, 0] * dims[1] + ixyz[:, 1]) * dims[2] + ixyz[:, 2]
+    if batch_indices is not None:
+        n_voxel = int(np.prod(dims.tolist()))
+        batch_offset = batch_indices[point_indices].astype(np.int64) * n_voxel
+        voxel_indices += batch_offset
+
+    # segment-min: the first one in each voxel after sorting by
+    # (voxel, distance)
+    order = xp.lexsort(xp.stack([distance, voxel_indices]))
+    voxel_indices = voxel_indices[order]
+    point_indices = point_indices[order]
+    first = xp.ones(voxel_indices.shape, dtype=bool)
+    first[1:] = voxel_indices[1:] != voxel_indices[:-1]
+    return voxel_indices[first], point_indices[first]
+
+
+def _occupancy_grid_3d_local(
+    points,
+    *,
+    pitch,
+    origin,
+    dims,
+    threshold,
+    batch_indices=None,
+    batch_size=None,
+):
+    xp = cuda.get_array_module(points)
+    dtype = points.dtype
+    dims = tuple(int(d) for d in dims)
+
+    # a coordinate -> voxel coordinate
+    if batch_indices is None:
+        origin = xp.asarray(origin, dtype=dtype)
+        pitch = xp.asarray(pitch, dtype=dtype)
+        points = (points - origin) / pitch
+        shape = dims
+    else:
+        batch_indices = xp.asarray(batch_indices)
+        origin = xp.asarray(origin, dtype=dtype).reshape(-1, 3)
+        origin = xp.broadcast_to(origin, (batch_size, 3))
+        pitch = xp.asarray(pitch, dtype=dtype).reshape(-1)
+        pitch = xp.broadcast_to(pitch, (batch_size,))
+        points = (points - origin[batch_indices]) / pitch[batch_indices][
+            :, None
+        ]
+        shape = (batch_size,) + dims
+
+    voxel_indices, point_indices = _get_local_voxel_indices(
+        points.array,
+        dims=dims,
+        threshold=threshold,
+        batch_indices=batch_indices,
+    )
+    centers = xp.unravel_index(voxel_indices, shape)[-3:]
+    centers = xp.stack(centers, axis=1).astype(dtype)
+
+    d = F.sqrt(F.sum((centers - points[point_indices]) ** 2, axis=1))
+    m = F.relu(threshold - d)
+    m = F.minimum(m, m.array * 0 + 1)
+
+    m_IJK = xp.zeros((np.prod(shape),), dtype=dtype)
+    m_IJK = F.scatter_add(m_IJK, voxel_indices, m)
+    return m_IJK.reshape(shape)
+
+
+def occupancy_grid_3d(
+    points,
+    *,
+    pitch,
+    origin,
+    dims,
+    threshold=1,
+    local=False,
+    batch_indices=None,
+    batch_size=None,
+):
+    """Occupancy grid from points with distance from each voxel center.
+
+    Parameters
+    ----------
+    local: bool
+        If True, only the voxels within threshold of each point are
+        evaluated, and memory is O(P * k^3) instead of O(X * Y * Z * P).
+    batch_indices: (P,) numpy.ndarray or cupy.ndarray, int32, optional
+        Batch index of each point. If given, pitch and origin are given per
+        batch as (B,) and (B, 3), and the output is (B, X, Y, Z).
+        Batched grids are always computed locally.
+    batch_size: int, optional
+        Number of batches B. Required with batch_indices.
+    """
+    if batch_indices is not None:
+        if batch_size is None:
+            raise ValueError("batch_size is required with batch_indices")
+        points = chainer.as_variable(points)
+        return _occupancy_grid_3d_local(
+            points,
+            pitch=pitch,
+            origin=origin,
+            dims=dims,
+            threshold=threshold,
+            batch_indices=batch_indices,
+            batch_size=batch_size,
+        )
+
+    if local:
+        points = chainer.as_variable(points)
+        return _occupancy_grid_3d_local(
+            points, pitch=pitch, origin=origin, dims=dims, threshold=threshold
+        )
+
     d_IP, d_JP, d_KP = OccupancyGrid3D(pitch=pitch, origin=origin, dims=dims)(
         points
     )
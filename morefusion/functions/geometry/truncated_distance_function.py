@@ -4,36 +4,175 @@ import numpy as np
 
 
 class TruncatedDistanceFunction(chainer.Function):
-    def __init__(self, *, pitch, origin, dims, truncation):
+    def __init__(self, *, pitch, origin, dims, truncation, batch_size=None):
         self.pitch = pitch
         self.origin = origin
         self.dims = dims
         self.truncation = truncation
+        self.batch_size = batch_size
 
     def check_type_forward(self, in_types):
-        chainer.utils.type_check.expect(in_types.size() == 1)
+        if self.batch_size is None:
+            chainer.utils.type_check.expect(in_types.size() == 1)
+            (points_type,) = in_types
+        else:
+            chainer.utils.type_check.expect(in_types.size() == 2)
+            points_type, batch_indices_type = in_types
+            chainer.utils.type_check.expect(
+                batch_indices_type.dtype == np.int32,
+                batch_indices_type.ndim == 1,
+                batch_indices_type.shape[0] == points_type.shape[0],
+            )
 
-        (points_type,) = in_types
         chainer.utils.type_check.expect(
             points_type.ndim == 2, points_type.shape[1] == 3,
         )
 
+    def _get_batch_params(self, inputs):
+        xp = cuda.get_array_module(*inputs)
+
+        points = inputs[0]
+        dtype = points.dtype
+
+        if self.batch_size is None:
+            B = 1
+            batch_indices = xp.zeros((points.shape[0],), dtype=np.int32)
+        else:
+            B = self.batch_size
+            batch_indices = inputs[1]
+
+        pitch = xp.asarray(self.pitch, dtype=dtype).reshape(-1)
+        pitch = xp.broadcast_to(pitch, (B,))
+        origin = xp.asarray(self.origin, dtype=dtype).reshape(-1, 3)
+        origin = xp.broadcast_to(origin, (B, 3))
+        truncation = xp.asarray(self.truncation, dtype=dtype).reshape(-1)
+        truncation = xp.broadcast_to(truncation, (B,))
+        return B, batch_indices, pitch, origin, truncation
+
+    def _get_kernel_cpu(self, pitch, truncation):
+        ksize = int(np.ceil(truncation / pitch).max())
+        if ksize % 2 == 0:
+            ksize += 1
+        kernel = np.meshgrid(*(np.arange(ksize),) * 3)
+        kernel = np.stack(kernel, -1).reshape(-1, 3).astype(np.int32)
+        kernel -= ksize // 2
+        return ksize, kernel
+
+    def _unbatch(self, array):
+        if self.batch_size is None:
+            return array[0]
+        return array
+
+    def forward_cpu(self, inputs):
+        self.retain_inputs(tuple(range(len(inputs))))
+        points = inputs[0]
+        dtype = points.dtype
+
+        B, batch_indices, pitch, origin, truncation = self._get_batch_params(
+            inputs
+        )
+        shape = (B,) + tuple(self.dims)
+
+        matrix = np.empty(shape, dtype=dtype)
+        matrix[...] = truncation[:, None, None, None]
+
+        ksize, kernel = self._get_kernel_cpu(pitch, truncation)
+
+        # visit only the ksize^3 neighbourhood of each point: (P, K, 3)
+        pitch_p = pitch[batch_indices][:, None]
+        ixyz_f = (points - origin[batch_indices]) / pitch_p
+        ixyz = np.round(ixyz_f).astype(np.int32)[:, None, :] + kernel
+        valid = ((0 <= ixyz) & (ixyz < self.dims)).all(axis=2)
+        d_ixyz = ixyz_f[:, None, :] - ixyz.astype(dtype)
+        distance = pitch_p * np.linalg.norm(d_ixyz, axis=2)
+        valid &= distance < truncation[batch_indices][:, None]
+
+        # scatter-min of distances, and then argmin with the smallest
+        # (point, kernel) index among the ties
+        (point_kernel_indices,) = np.nonzero(valid.ravel())
+        point_kernel_indices = point_kernel_indices.astype(np.int32)
+        distance = distance[valid]
+        ixyz = ixyz[valid]
+        voxel_indices = np.ravel_multi_index(
+            (
+                batch_indices[point_kernel_indices // ksize ** 3],
+                ixyz[:, 0],
+                ixyz[:, 1],
+                ixyz[:, 2],
+            ),
+            shape,
+        )
+        matrix = matrix.ravel()
+        np.minimum.at(matrix, voxel_indices, distance)
+        winner = distance == matrix[voxel_indices]
+        indices = np.full(matrix.shape, np.iinfo(np.int32).max, np.int32)
+        np.minimum.at(
+            indices, voxel_indices[winner], point_kernel_indices[winner]
+        )
+        indices[indices == np.iinfo(np.int32).max] = -1
+        matrix = matrix.reshape(shape)
+        indices = indices.reshape(shape)
+
+        self._batch_indices = batch_indices
+        self._pitch = pitch
+        self._origin = origin
+        self._indices = indices
+        self._ksize = ksize
+        self._kernel = kernel
+
+        return (self._unbatch(matrix),)
+
+    def backward_cpu(self, inputs, grad_outputs):
+        points = inputs[0]
+        (gmatrix,) = grad_outputs
+        gmatrix = gmatrix.reshape(self._indices.shape)
+
+        gpoints = np.zeros(points.shape, dtype=points.dtype)
+
+        # gather through the winning (point, kernel) of each voxel
+        keep = self._indices >= 0
+        point_kernel_indices = self._indices[keep]
+        K = self._ksize ** 3
+        p = point_kernel_indices // K
+        k = point_kernel_indices % K
+        b = self._batch_indices[p]
+
+        ixyz_f = (points[p] - self._origin[b]) / self._pitch[b][:, None]
+        ixyz = np.round(ixyz_f).astype(np.int32) + self._kernel[k]
+        d_ixyz = ixyz_f - ixyz.astype(points.dtype)
+        idistance = np.linalg.norm(d_ixyz, axis=1)
+
+        nonzero = idistance > 0
+        gpoints_keep = (
+            d_ixyz[nonzero]
+            / idistance[nonzero][:, None]
+            * gmatrix[keep][nonzero][:, None]
+        )
+        np.add.at(gpoints, p[nonzero], gpoints_keep)
+
+        return (gpoints,) + (None,) * (len(inputs) - 1)
+
     def forward_gpu(self, inputs):
         cupy = cuda.cupy
 
-        self.retain_inputs((0,))
-        (points,) = inputs
+        self.retain_inputs(tuple(range(len(inputs))))
+        points = inputs[0]
         dtype = points.dtype
 
-        pitch = cupy.asarray(self.pitch, dtype=dtype)
-        origin = cupy.asarray(self.origin, dtype=dtype)
+        B, batch_indices, pitch, origin, truncation = self._get_batch_params(
+            inputs
+        )
+        shape = (B,) + tuple(self.dims)
+        pitch = cupy.ascontiguousarray(pitch)
+        origin = cupy.ascontiguousarray(origin)
+        truncation = cupy.ascontiguousarray(truncation)
         dims = cupy.asarray(self.dims, dtype=np.int32)
-        truncation = cupy.asarray(self.truncation, dtype=dtype)
 
-        matrix = cupy.full(self.dims, self.truncation, dtype=dtype)
-        indices = cupy.full(self.dims, -1, dtype=np.int32)
+        matrix = cupy.empty(shape, dtype=dtype)
+        matrix[...] = truncation[:, None, None, None]
+        indices = cupy.full(shape, -1, dtype=np.int32)
 
-        ksize = int(cupy.ceil(truncation / pitch))
+        ksize = int(cupy.ceil(truncation / pitch).max())
         if ksize % 2 == 0:
             ksize += 1
         kernel = cupy.meshgrid(*(cupy.arange(ksize),) * 3)
@@ -43,8 +182,8 @@ class TruncatedDistanceFunction(chainer.Function):
         indexer = cupy.empty((points.shape[0], ksize ** 3), dtype=np.int8)
         cuda.elementwise(
             """
-            int8 indexer, raw T points, T pitch,
-            raw T origin, raw int32 dims, T truncation,
+            int8 indexer, raw T points, raw int32 batch_indices,
+            raw T pitch, raw T origin, raw int32 dims, raw T truncation,
             int32 ksize, raw T kernel
             """,
             "raw T matrix, raw int32 indices",
@@ -52,10 +191,11 @@ class TruncatedDistanceFunction(chainer.Function):
             int K = ksize * ksize * ksize;
             int k = i % K;
             int p = i / K;
+            int b = batch_indices[p];
 
-            T ix_f = (points[3 * p] - origin[0]) / pitch;
-            T iy_f = (points[3 * p + 1] - origin[1]) / pitch;
-            T iz_f = (points[3 * p + 2] - origin[2]) / pitch;
+            T ix_f = (points[3 * p] - origin[3 * b]) / pitch[b];
+            T iy_f = (points[3 * p + 1] - origin[3 * b + 1]) / pitch[b];
+            T iz_f = (points[3 * p + 2] - origin[3 * b + 2]) / pitch[b];
 
             int ix = round(ix_f) + kernel[3 * k];
             int iy = round(iy_f) + kernel[3 * k + 1];
@@ -68,9 +208,11 @@ class TruncatedDistanceFunction(chainer.Function):
                 T idx = ix_f - ix;
                 T idy = iy_f - iy;
                 T idz = iz_f - iz;
-                T distance = pitch * sqrt(idx * idx + idy * idy + idz * idz);
-                if (distance < truncation) {
-                    int index = (ix * dims[1] * dims[2]) + (iy * dims[2]) + iz;
+                T distance = pitch[b] * sqrt(
+                    idx * idx + idy * idy + idz * idz);
+                if (distance < truncation[b]) {
+                    int index = ((b * dims[0] + ix) * dims[1] + iy) * dims[2]
+                                + iz;
                     T old = atomicMin(&matrix[index], distance);
                     if (distance < old) {
                         atomicExch(&indices[index], i);
@@ -82,6 +224,7 @@ class TruncatedDistanceFunction(chainer.Function):
         )(
             indexer,
             points,
+            batch_indices,
             pitch,
             origin,
             dims,
@@ -92,27 +235,29 @@ class TruncatedDistanceFunction(chainer.Function):
             indices,
         )
 
+        self._batch_indices = batch_indices
         self._pitch = pitch
         self._origin = origin
         self._indices = indices
         self._ksize = ksize
         self._kernel = kernel
 
-        return (matrix,)
+        return (self._unbatch(matrix),)
 
     def backward_gpu(self, inputs, grad_outputs):
         cupy = cuda.cupy
 
-        (points,) = inputs
+        points = inputs[0]
         (gmatrix,) = grad_outputs
+        gmatrix = gmatrix.reshape(self._indices.shape)
         dtype = points.dtype
 
         gpoints = cupy.zeros(points.shape, dtype=dtype)
 
         cuda.elementwise(
             """
-            T gmatrix, raw T points, int32 indices,
-            T pitch, raw T origin,
+            T gmatrix, raw T points, raw int32 batch_indices, int32 indices,
+            raw T pitch, raw T origin,
             int32 ksize, raw T kernel
             """,
             "raw T gpoints",
@@ -124,10 +269,11 @@ class TruncatedDistanceFunction(chainer.Function):
             int K = ksize * ksize * ksize;
             int k = indices % K;
             int p = indices / K;
+            int b = batch_indices[p];
 
-            T ix_f = (points[3 * p] - origin[0]) / pitch;
-            T iy_f = (points[3 * p + 1] - origin[1]) / pitch;
-            T iz_f = (points[3 * p + 2] - origin[2]) / pitch;
+            T ix_f = (points[3 * p] - origin[3 * b]) / pitch[b];
+            T iy_f = (points[3 * p + 1] - origin[3 * b + 1]) / pitch[b];
+            T iz_f = (points[3 * p + 2] - origin[3 * b + 2]) / pitch[b];
 
             int ix = round(ix_f) + kernel[3 * k];
             int iy = round(iy_f) + kernel[3 * k + 1];
@@ -148,6 +294,7 @@ class TruncatedDistanceFunction(chainer.Function):
         )(
             gmatrix,
             points,
+            self._batch_indices,
             self._indices,
             self._pitch,
             self._origin,
@@ -163,25 +310,82 @@ class TruncatedDistanceFunction(chainer.Function):
         # kernel_indices[keep] = self._indices[keep] % K
         # point_indices[keep] = self._indices[keep] / K
 
-        return (gpoints,)
+        return (gpoints,) + (None,) * (len(inputs) - 1)
 
 
 def truncated_distance_function(
-    points, *, pitch, origin, dims, truncation, return_indices=False
+    points,
+    *,
+    pitch,
+    origin,
+    dims,
+    truncation,
+    return_indices=False,
+    batch_indices=None,
+    batch_size=None,
 ):
+    """Truncated distance from each voxel center to its nearest point.
+
+    Parameters
+    ----------
+    points: (P, 3) numpy.ndarray, cupy.ndarray or chainer.Variable
+        Points in the world coordinates.
+    batch_indices: (P,) numpy.ndarray or cupy.ndarray, int32, optional
+        Batch index of each point. If given, pitch, origin and truncation
+        are given per batch as (B,), (B, 3) and (B,) (or broadcastable),
+        and the output is (B, X, Y, Z).
+    batch_size: int, optional
+        Number of batches B. Required with batch_indices.
+    """
+    if batch_indices is None:
+        inputs = (points,)
+    else:
+        if batch_size is None:
+            raise ValueError("batch_size is required with batch_indices")
+        inputs = (points, batch_indices)
+
     func = TruncatedDistanceFunction(
-        pitch=pitch, origin=origin, dims=dims, truncation=truncation,
+        pitch=pitch,
+        origin=origin,
+        dims=dims,
+        truncation=truncation,
+        batch_size=batch_size if batch_indices is not None else None,
     )
-    tdf = func(points)
+    tdf = func(*inputs)
     if return_indices:
-        return tdf, func._indices // (func._ksize ** 3)
+        indices = func._indices // (func._ksize ** 3)
+        return tdf, func._unbatch(indices)
     return tdf
 
 
 def pseudo_occupancy_voxelization(
-    points, sdf, *, pitch, origin, dims, threshold=1, sdf_offset=0
+    points,
+    sdf,
+    *,
+    pitch,
+    origin,
+    dims,
+    threshold=1,
+    sdf_offset=0,
+    batch_indices=None,
+    batch_size=None,
 ):
-    truncation = threshold * pitch
+    """Occupancy grids weighted by truncated distance and signed distance.
+
+    Parameters
+    ----------
+    batch_indices: (P,) numpy.ndarray or cupy.ndarray, int32, optional
+        Batch index of each point. If given, pitch and origin are given per
+        batch as (B,) and (B, 3), and the output grids are (B, X, Y, Z).
+    batch_size: int, optional
+        Number of batches B. Required with batch_indices.
+    """
+    xp = cuda.get_array_module(points)
+
+    if batch_indices is None:
+        truncation = threshold * pitch
+    else:
+        truncation = threshold * xp.asarray(pitch, dtype=points.dtype)
     tdf, indices = truncated_distance_function(
         points,
         pitch=pitch,
@@ -189,19 +393,25 @@ def pseudo_occupancy_voxelization(
         dims=dims,
         truncation=truncation,
         return_indices=True,
+        batch_indices=batch_indices,
+        batch_size=batch_size,
     )  # [0, truncation]
 
+    if batch_indices is not None:
+        truncation = truncation.reshape(-1, 1, 1, 1)
     grid = 1 - (tdf / truncation)  # [0, 1]
 
-    xp = cuda.get_array_module(points)
-
     weight_inside = xp.full_like(tdf.array, -1)
     mask = indices != -1
     weight_inside[mask] = sdf[indices[mask]]
     weight_inside += sdf_offset
     mask = weight_inside < 0
     weight_inside[mask] = 0
-    weight_inside = weight_inside / weight_inside.max()
+    if batch_indices is None:
+        weight_inside = weight_inside / weight_inside.max()
+    else:
+        weight_max = weight_inside.reshape(batch_size, -1).max(axis=1)
+        weight_inside = weight_inside / weight_max.reshape(-1, 1, 1, 1)
 
     weight_surface = weight_inside.copy()
     weight_surface[~mask] = 1 - weight_surface[~mask]
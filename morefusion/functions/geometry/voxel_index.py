@@ -0,0 +1,208 @@
+import chainer
+from chainer.backends import cuda
+import numpy as np
+
+from .interpolate_voxel_grid import _get_trilinear_interp_indices
+
+
+def _get_voxel_indices(
+    points, batch_indices, *, batch_size, origin, pitch, dimensions
+):
+    """Get flattened voxel indices of points in the (B, X, Y, Z) grid.
+
+    Returns
+    -------
+    indices: (P,) numpy.ndarray or cupy.ndarray, int64
+        Flattened voxel indices, where invalid ones are set to -1.
+    valid: (P,) numpy.ndarray or cupy.ndarray, bool
+        Whether the point is inside of the voxel grid.
+    """
+    xp = cuda.get_array_module(points)
+
+    X, Y, Z = dimensions
+
+    ixyz = ((points - origin) / pitch).round().astype(np.int64)
+    valid = ((0 <= ixyz) & (ixyz < xp.asarray(dimensions))).all(axis=1)
+
+    ixyz = ixyz[valid]
+    indices = xp.full((points.shape[0],), -1, dtype=np.int64)
+    indices[valid] = (
+        (batch_indices[valid].astype(np.int64) * X + ixyz[:, 0]) * Y
+        + ixyz[:, 1]
+    ) * Z + ixyz[:, 2]
+    return indices, valid
+
+
+class VoxelIndex:
+    """Voxel indices of points shared among voxel grid functions.
+
+    The voxel indices are computed once, and reused by the forward and
+    backward of ``average_voxelization_3d``, ``max_voxelization_3d`` and
+    ``interpolate_voxel_grid`` when given as ``voxel_index``, so one set of
+    points can be voxelized into several feature tensors.
+
+    Parameters
+    ----------
+    points: (P, 3) numpy.ndarray, cupy.ndarray or chainer.Variable
+        Points in the world coordinates.
+    batch_indices: (P,) numpy.ndarray or cupy.ndarray, int32
+        Batch index of each point.
+    batch_size: int
+        Number of batches B.
+    origin: (3,) array-like
+        Origin of the voxel grid.
+    pitch: float
+        Voxel size.
+    dimensions: tuple of int
+        Voxel grid dimensions (X, Y, Z).
+
+    Attributes
+    ----------
+    indices: (P,) numpy.ndarray or cupy.ndarray, int64
+        Flattened indices in (B, X, Y, Z), where invalid ones are -1.
+    valid: (P,) numpy.ndarray or cupy.ndarray, bool
+        Whether the point is inside of the voxel grid.
+    """
+
+    def __init__(
+        self, points, batch_indices, *, batch_size, origin, pitch, dimensions
+    ):
+        points = chainer.as_variable(points).array
+
+        self.batch_size = batch_size
+        self.origin = origin
+        self.pitch = pitch
+        self.dimensions = tuple(dimensions)
+        self.points = points
+        self.batch_indices = batch_indices
+
+        self.indices, self.valid = _get_voxel_indices(
+            points,
+            batch_indices,
+            batch_size=batch_size,
+            origin=origin,
+            pitch=pitch,
+            dimensions=self.dimensions,
+        )
+
+        self._counts = None
+        self._unique = None
+        self._trilinear_interp_indices = None
+        self._points_voxel = None
+
+    @property
+    def shape(self):
+        return (self.batch_size,) + self.dimensions
+
+    @property
+    def counts(self):
+        """Number of points in each voxel, (B, X, Y, Z) int32."""
+        if self._counts is None:
+            xp = cuda.get_array_module(self.indices)
+            counts = xp.bincount(
+                self.indices[self.valid], minlength=int(np.prod(self.shape))
+            )
+            self._counts = counts.astype(np.int32).reshape(self.shape)
+        return self._counts
+
+    def get_unique(self):
+        """Get occupied voxels and the voxel of each valid point.
+
+        Returns
+        -------
+        voxels: (N,) numpy.ndarray or cupy.ndarray, int64
+            Flattened indices of the occupied voxels.
+        inverse: (P',) numpy.ndarray or cupy.ndarray, int64
+            Index in voxels of each valid point.
+        counts: (N,) numpy.ndarray or cupy.ndarray, int64
+            Number of points in each occupied voxel.
+        """
+        if self._unique is None:
+            xp = cuda.get_array_module(self.indices)
+            self._unique = xp.unique(
+                self.indices[self.valid],
+                return_inverse=True,
+                return_counts=True,
+            )
+        return self._unique
+
+    def get_trilinear_interp_indices(self):
+        """Get flattened indices and weights of 8 corners of each point.
+
+        Returns
+        -------
+        weight: (P, 8) numpy.ndarray, float32
+            Interpolation weights, which are 0 for corners outside of the grid.
+        indices: (P, 8) numpy.ndarray, int64
+            Indices in (B, X, Y, Z).
+        """
+        if self._trilinear_interp_indices is None:
+            B, (X, Y, Z) = self.batch_size, self.dimensions
+            self._trilinear_interp_indices = _get_trilinear_interp_indices(
+                self._get_points_voxel(),
+                self.batch_indices,
+                (B, None, X, Y, Z),
+            )
+        return self._trilinear_interp_indices
+
+    def _get_points_voxel(self):
+        # points in the voxel coordinates as given to interpolate_voxel_grid
+        if self._points_voxel is None:
+            self._points_voxel = (
+                (self.points - self.origin) / self.pitch
+            ).astype(np.float32)
+        return self._points_voxel
+
+    def _check_grid(
+        self,
+        points,
+        batch_size,
+        dimensions,
+        *,
+        origin=None,
+        pitch=None,
+        in_voxel_coordinates=False,
+    ):
+        """Check the arguments match the ones of the voxel index.
+
+        points are compared with the ones of the voxel index unless they
+        are the same array, and are in the voxel coordinates if
+        in_voxel_coordinates is True, as in interpolate_voxel_grid.
+        """
+        if points.shape != self.points.shape:
+            raise ValueError(
+                "voxel_index is built from a different number of points: "
+                f"{self.points.shape[0]} != {points.shape[0]}"
+            )
+        shape = (batch_size,) + tuple(dimensions)
+        if shape != self.shape:
+            raise ValueError(
+                "voxel_index is built for a different voxel grid: "
+                f"{self.shape} != {shape}"
+            )
+        if origin is not None and not np.allclose(
+            cuda.to_cpu(origin), cuda.to_cpu(self.origin)
+        ):
+            raise ValueError(
+                "voxel_index is built for a different origin: "
+                f"{self.origin} != {origin}"
+            )
+        if pitch is not None and not np.isclose(
+            float(pitch), float(self.pitch)
+        ):
+            raise ValueError(
+                "voxel_index is built for a different pitch: "
+                f"{self.pitch} != {pitch}"
+            )
+
+        if points is self.points:
+            return
+        xp = cuda.get_array_module(points)
+        if in_voxel_coordinates:
+            same = xp.allclose(
+                points, self._get_points_voxel(), rtol=0, atol=1e-4
+            )
+        else:
+            same = xp.array_equal(points, self.points)
+        if not same:
+            raise ValueError("voxel_index is built from different points")
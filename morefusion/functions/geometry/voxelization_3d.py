@@ -1,9 +1,13 @@
 import chainer
 import numpy as np
 
+from .voxel_index import _get_voxel_indices
+
 
 class Voxelization3D(chainer.Function):
-    def __init__(self, *, batch_size, pitch, origin, dimensions):
+    def __init__(
+        self, *, batch_size, pitch, origin, dimensions, voxel_index=None
+    ):
         self.batch_size = batch_size
         self.pitch = pitch
         self.origin = origin
@@ -16,6 +20,7 @@ class Voxelization3D(chainer.Function):
             raise ValueError("dimensions must be a tuple of 4 integers")
 
         self.dimensions = dimensions
+        self.voxel_index = voxel_index
 
     def check_type_forward(self, in_types):
         values_type, points_type, batch_indices_type = in_types[:3]
@@ -30,3 +35,31 @@ class Voxelization3D(chainer.Function):
             batch_indices_type.ndim == 1,
             batch_indices_type.shape[0] == values_type.shape[0],
         )
+
+    def _get_voxel_indices_cpu(self, points, batch_indices):
+        """Get flattened voxel indices of points in the (B, X, Y, Z) grid.
+
+        Returns
+        -------
+        indices: (P,) numpy.ndarray, int64
+            Flattened voxel indices, where invalid ones are set to -1.
+        valid: (P,) numpy.ndarray, bool
+            Whether the point is inside of the voxel grid.
+        """
+        if self.voxel_index is not None:
+            self.voxel_index._check_grid(
+                points,
+                self.batch_size,
+                self.dimensions,
+                origin=self.origin,
+                pitch=self.pitch,
+            )
+            return self.voxel_index.indices, self.voxel_index.valid
+        return _get_voxel_indices(
+            points,
+            batch_indices,
+            batch_size=self.batch_size,
+            origin=self.origin,
+            pitch=self.pitch,
+            dimensions=self.dimensions,
+        )
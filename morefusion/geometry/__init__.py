@@ -17,9 +17,12 @@ from .masks_to_bboxes import masks_to_bboxes
 from .knn import nn
 
 from .pointcloud_from_depth import pointcloud_from_depth
+from .pointcloud_from_depth import PointcloudProjector
 
 from .points_from_angles import points_from_angles
 
 from .project_to_camera import project_to_camera
 
+from .projective_target_grids import projective_target_grids
+
 from .voxel_mapping import VoxelMapping
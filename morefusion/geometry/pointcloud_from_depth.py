@@ -1,6 +1,108 @@
+import functools
+import typing
+
 import numpy as np
 
 
+class PointcloudProjector(object):
+    """Back-projection of depth images with cached ray directions.
+
+    The ray directions are computed once per image shape, so projecting
+    depth images with the same intrinsics is a single multiplication.
+
+    Parameters
+    ----------
+    fx, fy, cx, cy: float
+        Camera intrinsics.
+    depth_type: str
+        'z' for depth along z-axis, and 'euclidean' for distance from
+        the camera center.
+    dtype: numpy.dtype
+        Dtype of the ray directions, and so of the output point cloud.
+    """
+
+    def __init__(
+        self,
+        fx: float,
+        fy: float,
+        cx: float,
+        cy: float,
+        depth_type: str = "z",
+        dtype: np.dtype = np.float64,
+    ):
+        assert depth_type in ["z", "euclidean"], "Unexpected depth_type"
+
+        self.fx = fx
+        self.fy = fy
+        self.cx = cx
+        self.cy = cy
+        self.depth_type = depth_type
+        self.dtype = np.dtype(dtype)
+
+        self._rays = {}
+
+    def get_rays(self, shape: tuple) -> np.ndarray:
+        """Get ray directions of (H, W, 3), whose z is 1 or norm is 1."""
+        rows, cols = shape
+        if (rows, cols) not in self._rays:
+            c, r = np.meshgrid(np.arange(cols), np.arange(rows))
+            rays = np.empty((rows, cols, 3), dtype=np.float64)
+            rays[:, :, 0] = (c - self.cx) / self.fx
+            rays[:, :, 1] = (r - self.cy) / self.fy
+            rays[:, :, 2] = 1
+            if self.depth_type == "euclidean":
+                rays /= np.linalg.norm(rays, axis=2, keepdims=True)
+            rays = rays.astype(self.dtype)
+            rays.flags.writeable = False
+            self._rays[(rows, cols)] = rays
+        return self._rays[(rows, cols)]
+
+    def __call__(
+        self,
+        depth: np.ndarray,
+        roi: typing.Optional[tuple] = None,
+        out: typing.Optional[np.ndarray] = None,
+    ) -> np.ndarray:
+        """Project depth image to point cloud.
+
+        Parameters
+        ----------
+        depth: (H, W) numpy.ndarray, float
+            Depth image in meters, where nan is invalid.
+        roi: (y1, x1, y2, x2), optional
+            Region of interest to project, and depth[y1:y2, x1:x2] is used.
+        out: (h, w, 3) numpy.ndarray, optional
+            Buffer to write the point cloud into.
+
+        Returns
+        -------
+        pcd: (h, w, 3) numpy.ndarray
+            Point cloud, which is nan at invalid depth.
+        """
+        assert depth.ndim == 2, "depth must be 2 dimensional"
+        assert (
+            depth.dtype.kind == "f"
+        ), "depth must be float and have meter values"
+
+        rays = self.get_rays(depth.shape)
+        if roi is not None:
+            y1, x1, y2, x2 = (int(round(v)) for v in roi)
+            depth = depth[y1:y2, x1:x2]
+            rays = rays[y1:y2, x1:x2]
+
+        if out is None:
+            dtype = np.result_type(depth.dtype, self.dtype)
+            out = np.empty(depth.shape + (3,), dtype=dtype)
+        assert out.shape == depth.shape + (3,), "out has unexpected shape"
+        np.multiply(depth[:, :, None], rays, out=out)
+        return out
+
+
+@functools.lru_cache(maxsize=8)
+def _get_projector(fx, fy, cx, cy, depth_type):
+    return PointcloudProjector(fx, fy, cx, cy, depth_type=depth_type)
+
+
 def pointcloud_from_depth(
     depth: np.ndarray,
     fx: float,
@@ -12,15 +114,7 @@ def pointcloud_from_depth(
     assert depth_type in ["z", "euclidean"], "Unexpected depth_type"
     assert depth.dtype.kind == "f", "depth must be float and have meter values"
 
-    rows, cols = depth.shape
-    c, r = np.meshgrid(np.arange(cols), np.arange(rows), sparse=True)
-    valid = ~np.isnan(depth)
-    z = np.where(valid, depth, np.nan)
-    x = np.where(valid, z * (c - cx) / fx, np.nan)
-    y = np.where(valid, z * (r - cy) / fy, np.nan)
-    pc = np.dstack((x, y, z))
-
-    if depth_type == "euclidean":
-        norm = np.linalg.norm(pc, axis=2)
-        pc = pc * (z / norm)[:, :, None]
-    return pc
+    projector = _get_projector(
+        float(fx), float(fy), float(cx), float(cy), depth_type
+    )
+    return projector(depth)
@@ -0,0 +1,108 @@
+import typing
+
+import numpy as np
+
+# occupancy probabilities of a cell after a single hit / miss as octomap
+_probability_hit = 0.7
+_probability_miss = 0.4
+
+
+def projective_target_grids(
+    depth: np.ndarray,
+    instance_label: np.ndarray,
+    K: np.ndarray,
+    origin: np.ndarray,
+    pitch: typing.Union[float, np.ndarray],
+    dimensions: tuple,
+    target_id: typing.Union[int, np.ndarray],
+) -> typing.Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Get voxel grids of target instances from a single depth image.
+
+    This computes the grids of MultiInstanceOctreeMapping.get_target_grids
+    after integrating a single frame, without building the octrees:
+    each voxel center is projected to the image, and is empty if it is in
+    front of the observed depth, and occupied by the observed instance if
+    it is within the half pitch from the depth. The voxels behind the
+    depth, or projected to pixels with invalid depth, are unknown.
+
+    Parameters
+    ----------
+    depth: (H, W) numpy.ndarray, float
+        Depth image in meters, where nan is invalid.
+    instance_label: (H, W) numpy.ndarray, int
+        Instance label image.
+    K: (3, 3) numpy.ndarray
+        Camera intrinsic matrix.
+    origin: (3,) or (T, 3) array-like, float
+        Voxel origin of each target.
+    pitch: float or (T,) array-like, float
+        Voxel pitch of each target.
+    dimensions: (3,) array-like, int
+        Voxel dimensions (e.g., 32x32x32).
+    target_id: int or (T,) array-like, int
+        Target instance ID.
+
+    Returns
+    -------
+    grid_target: (X, Y, Z) or (T, X, Y, Z) numpy.ndarray, np.float32
+        Occupied space of the target instance.
+    grid_nontarget: (X, Y, Z) or (T, X, Y, Z) numpy.ndarray, np.float32
+        Occupied space of non-target instance.
+    grid_empty: (X, Y, Z) or (T, X, Y, Z) numpy.ndarray, np.float32
+        Empty space.
+    """
+    assert depth.ndim == 2, "depth must be 2 dimensional"
+    assert depth.shape == instance_label.shape, "shape mismatch"
+
+    batched = np.ndim(origin) == 2
+    origins = np.asarray(origin, dtype=float).reshape(-1, 3)
+    n_target = origins.shape[0]
+    pitches = np.broadcast_to(np.asarray(pitch, dtype=float), (n_target,))
+    target_ids = np.broadcast_to(np.asarray(target_id), (n_target,))
+    dimensions = tuple(int(d) for d in dimensions)
+    assert len(dimensions) == 3
+    assert (pitches > 0).all()
+
+    # (T, X, Y, Z, 3) voxel centers of all targets
+    indices = np.stack(
+        np.meshgrid(*[np.arange(d) for d in dimensions], indexing="ij"),
+        axis=-1,
+    )
+    centers = (
+        origins[:, None, None, None, :]
+        + indices[None] * pitches[:, None, None, None, None]
+    )
+    shape = centers.shape[:-1]
+    centers = centers.reshape(-1, 3)
+
+    H, W = depth.shape
+    z = centers[:, 2]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        c = K[0, 0] * centers[:, 0] / z + K[0, 2]
+        r = K[1, 1] * centers[:, 1] / z + K[1, 2]
+    c = np.round(c)
+    r = np.round(r)
+    valid = (z > 0) & (0 <= r) & (r < H) & (0 <= c) & (c < W)
+    r = np.where(valid, r, 0).astype(np.int64)
+    c = np.where(valid, c, 0).astype(np.int64)
+
+    depth_observed = depth[r, c]
+    label_observed = instance_label[r, c]
+    valid &= ~np.isnan(depth_observed) & (depth_observed > 0)
+
+    band = np.repeat(pitches / 2, np.prod(dimensions))
+    with np.errstate(invalid="ignore"):
+        empty = valid & (z < depth_observed - band)
+        occupied = valid & (np.abs(z - depth_observed) <= band)
+    is_target = label_observed == np.repeat(target_ids, np.prod(dimensions))
+
+    grid_target = np.zeros(shape, dtype=np.float32)
+    grid_nontarget = np.zeros(shape, dtype=np.float32)
+    grid_empty = np.zeros(shape, dtype=np.float32)
+    grid_target.flat[occupied & is_target] = _probability_hit
+    grid_nontarget.flat[occupied & ~is_target] = _probability_hit
+    grid_empty.flat[empty] = 1 - _probability_miss
+
+    if not batched:
+        return grid_target[0], grid_nontarget[0], grid_empty[0]
+    return grid_target, grid_nontarget, grid_empty
@@ -0,0 +1,346 @@
+import numpy as np
+import pytest
+
+from morefusion.contrib import MultiInstanceOctreeMapping
+from morefusion.contrib import VoxelHashOccupancyMapping
+
+
+class _Leaf:
+    def __init__(self, coordinate, size, occupancy):
+        self._coordinate = coordinate
+        self._size = size
+        self._occupancy = occupancy
+
+    def getCoordinate(self):
+        return self._coordinate
+
+    def getSize(self):
+        return self._size
+
+    def getOccupancy(self):
+        return self._occupancy
+
+
+class _OcTree:
+    """Octree of leaves at several levels with octomap.OcTree API."""
+
+    _tree_max_val = 32768
+
+    def __init__(self, resolution):
+        self._resolution = resolution
+        self._leaves = {}  # key: (level, key), value: occupancy
+
+    def getResolution(self):
+        return self._resolution
+
+    def add_leaves(self, random_state, n_leaves, max_level=2):
+        while len(self._leaves) < n_leaves:
+            level = random_state.randint(0, max_level + 1)
+            key = self._tree_max_val + random_state.randint(-8, 8, (3,))
+            key = tuple(int(k) for k in key >> level)
+            # leaves must not overlap at the coarser level of the two
+            if any(
+                tuple(np.array(k) >> max(level - l_, 0))
+                == tuple(np.array(key) >> max(l_ - level, 0))
+                for l_, k in self._leaves
+            ):
+                continue
+            self._leaves[(level, key)] = random_state.uniform(0, 1)
+
+    def begin_leafs(self):
+        for (level, key), occupancy in self._leaves.items():
+            size = self._resolution * 2**level
+            coordinate = (
+                np.array(key) * 2**level - self._tree_max_val
+            ) * self._resolution + size / 2
+            yield _Leaf(coordinate, size, occupancy)
+
+    def search(self, point):
+        key = np.floor(np.asarray(point) / self._resolution).astype(int)
+        key += self._tree_max_val
+        for (level, key_leaf), occupancy in self._leaves.items():
+            if tuple(key >> level) == key_leaf:
+                return _Leaf(None, None, occupancy)
+        return None
+
+
+class _Mapping(MultiInstanceOctreeMapping):
+    def _create_octree(self, pitch):
+        return _OcTree(pitch)
+
+
+def _get_mapping():
+    random_state = np.random.RandomState(0)
+    mapping = _Mapping()
+    for instance_id, pitch in [(1, 0.01), (2, 0.013), (0, 0.02)]:
+        mapping.initialize(instance_id, pitch=pitch)
+        mapping._octrees[instance_id].add_leaves(random_state, n_leaves=100)
+    return mapping
+
+
+def test_get_occupancies():
+    mapping = _get_mapping()
+    points = np.random.RandomState(1).uniform(-0.2, 0.2, (500, 3))
+    for instance_id, octree in mapping._octrees.items():
+        occupancies = mapping.get_occupancies(instance_id, points)
+        assert occupancies.shape == (len(points),)
+
+        expected = []
+        for point in points:
+            leaf = octree.search(point)
+            expected.append(-1 if leaf is None else leaf.getOccupancy())
+        np.testing.assert_allclose(occupancies, expected, rtol=1e-6)
+        assert (occupancies >= 0).any() and (occupancies == -1).any()
+
+
+def test_get_target_grids_batch():
+    mapping = _get_mapping()
+
+    target_ids = [1, 2, 0]
+    dimensions = (12, 12, 12)
+    pitches = [0.011, 0.009, 0.02]
+    origins = [(-0.07, -0.06, -0.05), (-0.04, -0.08, -0.03), (-0.1,) * 3]
+    grids = mapping.get_target_grids_batch(
+        target_ids, dimensions=dimensions, pitches=pitches, origins=origins
+    )
+    assert len(grids) == len(target_ids)
+    for target_id, pitch, origin, grids_i in zip(
+        target_ids, pitches, origins, grids
+    ):
+        expected = mapping.get_target_grids(
+            target_id, dimensions=dimensions, pitch=pitch, origin=origin
+        )
+        for grid, grid_expected in zip(grids_i, expected):
+            assert grid.shape == dimensions
+            assert grid.dtype == np.float32
+            np.testing.assert_equal(grid, grid_expected)
+        assert all((grid > 0).any() for grid in grids_i)
+
+    # occupancies of the voxel centers
+    indices = np.stack(
+        np.meshgrid(*[np.arange(d) for d in dimensions], indexing="ij"),
+        axis=-1,
+    )
+    centers = np.asarray(origins[0]) + indices * pitches[0]
+    grid_target, grid_nontarget, grid_empty = grids[0]
+    for instance_id in mapping.instance_ids:
+        occupancies = mapping.get_occupancies(
+            instance_id, centers.reshape(-1, 3)
+        ).reshape(dimensions)
+        occupied = occupancies >= 0.5
+        grid = grid_target if instance_id == 1 else grid_nontarget
+        assert (grid[occupied] > 0).all()
+
+
+def _get_scene():
+    # planes of instance 1 and 2 in front of the background
+    H, W = 48, 64
+    v, u = np.mgrid[:H, :W]
+    pcd = np.stack([(u - 31.5) / 64, (v - 23.5) / 64, np.ones((H, W))], 2)
+    instance_label = np.zeros((H, W), dtype=np.int32)
+    instance_label[10:30, 5:30] = 1
+    instance_label[15:40, 35:60] = 2
+    instance_label[40:, :10] = 3
+    depth = np.select(
+        [instance_label == 1, instance_label == 2], [0.5, 0.6], 0.8
+    )
+    pcd *= depth[:, :, None]
+    pcd[0, :5] = np.nan
+    return pcd, instance_label
+
+
+def test_integrate_batch():
+    pcd, instance_label = _get_scene()
+    instance_ids = [1, 2, 0]
+    masks = [
+        instance_label == 1,
+        instance_label == 2,
+        np.stack([instance_label == 0, instance_label == 3]),
+    ]
+
+    for deduplicate in [False, True]:
+        mapping_batch = VoxelHashOccupancyMapping()
+        mapping = VoxelHashOccupancyMapping()
+        for instance_id in instance_ids:
+            mapping_batch.initialize(instance_id, pitch=0.01)
+            mapping.initialize(instance_id, pitch=0.01)
+
+        mapping_batch.integrate_batch(
+            instance_ids, masks, pcd, deduplicate=deduplicate
+        )
+        for instance_id, mask in zip(instance_ids, masks):
+            mapping.integrate(instance_id, mask, pcd, deduplicate=deduplicate)
+
+        for instance_id in instance_ids:
+            octree_batch = mapping_batch._octrees[instance_id]
+            octree = mapping._octrees[instance_id]
+            assert octree._keys.size > 0
+            np.testing.assert_equal(octree_batch._keys, octree._keys)
+            np.testing.assert_equal(octree_batch._logodds, octree._logodds)
+
+
+def test_integrate_deduplicate():
+    pcd, instance_label = _get_scene()
+    mask = instance_label == 1
+
+    mappings = []
+    pcds = []
+    for deduplicate in [False, True]:
+        mapping = VoxelHashOccupancyMapping()
+        mapping.initialize(1, pitch=0.01)
+        mapping.integrate(1, mask, pcd, deduplicate=deduplicate)
+        mappings.append(mapping)
+        pcds.append(mapping.get_target_pcds(1))
+
+    # same occupied and empty voxels
+    for points, points_dedup in zip(*pcds):
+        np.testing.assert_allclose(
+            np.unique(points, axis=0), np.unique(points_dedup, axis=0)
+        )
+
+    # hits weighted by the number of points in the voxel
+    occupied = pcds[0][0]
+    occupancies = [
+        mapping.get_occupancies(1, occupied) for mapping in mappings
+    ]
+    points = pcd[mask]
+    counts = (
+        (np.floor(points / 0.01)[:, None] == np.floor(occupied / 0.01)[None])
+        .all(axis=2)
+        .sum(axis=0)
+    )
+    assert (counts > 1).any()
+    octree = mapping._octrees[1]
+    logodds = np.minimum(counts * octree._logodds_hit, octree._logodds_max)
+    np.testing.assert_allclose(occupancies[0], 0.7, rtol=1e-6)
+    np.testing.assert_allclose(
+        occupancies[1], 1 - 1 / (1 + np.exp(logodds)), rtol=1e-6
+    )
+
+
+def test_get_target_pcds_cache():
+    pcd, instance_label = _get_scene()
+    mapping = VoxelHashOccupancyMapping()
+    mapping.initialize(1, pitch=0.01)
+    mapping.integrate(1, instance_label == 1, pcd)
+
+    extracted = []
+    extract_pcds = mapping._extract_pcds
+
+    def _extract_pcds(instance_id, aabb_min, aabb_max):
+        extracted.append((aabb_min, aabb_max))
+        return extract_pcds(instance_id, aabb_min, aabb_max)
+
+    mapping._extract_pcds = _extract_pcds
+
+    aabb1 = ((-0.3, -0.3, 0), (0, 0, 1))
+    aabb2 = ((-0.3, -0.3, 0), (0.3, 0.3, 1))
+
+    # hit with the same aabb, and miss with a different one
+    pcds1 = mapping.get_target_pcds(1, *aabb1)
+    assert mapping.get_target_pcds(1, *aabb1) is pcds1
+    assert len(extracted) == 1
+    pcds2 = mapping.get_target_pcds(1, *aabb2)
+    assert len(extracted) == 2
+    assert len(pcds2[0]) > len(pcds1[0])
+
+    # invalidated by integrate and update
+    points = pcd[instance_label == 2]
+    for i, fn in enumerate(
+        [
+            lambda: mapping.integrate(1, instance_label == 2, pcd),
+            lambda: mapping.update(1, points + (0, 0, 0.1)),
+        ]
+    ):
+        occupied_old = mapping.get_target_pcds(1, *aabb2)[0]
+        fn()
+        occupied, empty = mapping.get_target_pcds(1, *aabb2)
+        assert len(extracted) == 3 + i
+        assert len(occupied) > len(occupied_old)
+        occupied_expected, empty_expected = extract_pcds(1, *aabb2)
+        np.testing.assert_equal(occupied, occupied_expected)
+        np.testing.assert_equal(empty, empty_expected)
+
+
+def test_get_target_pcds_cache_size():
+    pcd, instance_label = _get_scene()
+    mapping = VoxelHashOccupancyMapping()
+    mapping._pcds_cache_size = 2
+    mapping.initialize(1, pitch=0.01)
+    mapping.integrate(1, instance_label == 1, pcd)
+
+    aabbs = [((-0.3, -0.3, 0), (x, 0.3, 1)) for x in [0, 0.1, 0.2]]
+    for aabb in aabbs:
+        mapping.get_target_pcds(1, *aabb)
+    assert len(mapping._pcds) == 2
+
+    # the least recently used one is evicted
+    keys = list(mapping._pcds.keys())
+    mapping.get_target_pcds(1, *aabbs[1])
+    assert list(mapping._pcds.keys()) == keys[::-1]
+    mapping.get_target_pcds(1, *aabbs[0])
+    assert len(mapping._pcds) == 2
+    assert keys[1] not in mapping._pcds
+
+
+def test_save_load(tmp_path):
+    filename = str(tmp_path / "mapping.bin")
+
+    mapping = _get_mapping()
+    mapping.save(filename)
+    with open(filename, "rb") as f:
+        assert f.read(8) == MultiInstanceOctreeMapping._file_magic
+        header_size = int(np.frombuffer(f.read(8), dtype="<u8")[0])
+    assert (16 + header_size) % 64 == 0
+
+    mapping_loaded = MultiInstanceOctreeMapping.load(filename)
+    assert mapping_loaded.instance_ids == mapping.instance_ids
+    points = np.random.RandomState(1).uniform(-0.2, 0.2, (500, 3))
+    for instance_id in mapping.instance_ids:
+        np.testing.assert_equal(
+            mapping_loaded.get_occupancies(instance_id, points),
+            mapping.get_occupancies(instance_id, points),
+        )
+    for target_id in mapping.instance_ids:
+        kwargs = dict(
+            dimensions=(12, 12, 12), pitch=0.011, origin=(-0.07,) * 3
+        )
+        grids = mapping.get_target_grids(target_id, **kwargs)
+        grids_loaded = mapping_loaded.get_target_grids(target_id, **kwargs)
+        for grid, grid_loaded in zip(grids, grids_loaded):
+            np.testing.assert_equal(grid_loaded, grid)
+
+    # point clouds from the loaded leaves
+    pcd, instance_label = _get_scene()
+    mapping = VoxelHashOccupancyMapping()
+    mapping.initialize(1, pitch=0.01)
+    mapping.integrate(1, instance_label == 1, pcd)
+    mapping.save(filename)
+    mapping_loaded = MultiInstanceOctreeMapping.load(filename)
+    aabb = ((-0.3, -0.3, 0), (0, 0, 1))
+    for points, points_loaded in zip(
+        mapping.get_target_pcds(1, *aabb),
+        mapping_loaded.get_target_pcds(1, *aabb),
+    ):
+        assert len(points) > 0
+        np.testing.assert_allclose(
+            np.unique(points_loaded, axis=0), np.unique(points, axis=0)
+        )
+
+
+def test_load_invalid(tmp_path):
+    filename = str(tmp_path / "mapping.bin")
+    _get_mapping().save(filename)
+    with open(filename, "rb") as f:
+        data = f.read()
+
+    with open(filename, "wb") as f:
+        f.write(b"NOTAMAP!" + data[8:])
+    with pytest.raises(ValueError):
+        MultiInstanceOctreeMapping.load(filename)
+
+    assert data.count(b'"version": 1') == 1
+    with open(filename, "wb") as f:
+        f.write(data.replace(b'"version": 1', b'"version": 9'))
+    with pytest.raises(ValueError):
+        MultiInstanceOctreeMapping.load(filename)
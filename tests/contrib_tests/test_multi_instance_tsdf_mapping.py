@@ -0,0 +1,123 @@
+import numpy as np
+import trimesh
+
+from morefusion.contrib import MultiInstanceTSDFMapping
+
+
+def _get_frame(H=256, W=256):
+    K = trimesh.scene.Camera(resolution=(W, H), fov=(60, 60)).K
+
+    # plane at z=1, whose left half is instance 1 and right half is 2
+    depth = np.full((H, W), 1.0)
+    instance_label = np.zeros((H, W), dtype=np.int32)
+    instance_label[:, : W // 2] = 1
+    instance_label[:, W // 2 :] = 2
+    return depth, instance_label, K
+
+
+def _get_mapping():
+    # z = 0.93 + k * 0.01
+    return MultiInstanceTSDFMapping(
+        origin=(-0.075, -0.075, 0.93),
+        pitch=0.01,
+        dimensions=(16, 16, 16),
+    )
+
+
+def _get_grids(mapping, target_id):
+    return mapping.get_target_grids(
+        target_id,
+        dimensions=mapping.dimensions,
+        pitch=mapping.pitch,
+        origin=mapping.origin,
+    )
+
+
+def test_integrate():
+    depth, instance_label, K = _get_frame()
+    mapping = _get_mapping()
+    mapping.integrate(depth, instance_label, K)
+    assert mapping.instance_ids == [1, 2]
+
+    grid_target, grid_nontarget, grid_empty = _get_grids(mapping, 1)
+    for grid in [grid_target, grid_nontarget, grid_empty]:
+        assert grid.shape == mapping.dimensions
+        assert grid.dtype == np.float32
+
+    assert (grid_empty[:, :, :7] == 1).all()
+    assert (grid_empty[:, :, 7:] == 0).all()
+    assert (grid_target[:8, :, 7] == 1).all()
+    assert (grid_nontarget[8:, :, 7] == 1).all()
+    occupied = (grid_target > 0) | (grid_nontarget > 0)
+    assert not occupied[:, :, :7].any() and not occupied[:, :, 8:].any()
+    assert not ((grid_target > 0) & (grid_nontarget > 0)).any()
+
+    # camera moved along z, so the plane is at z=1.05
+    T_cam2world = np.eye(4)
+    T_cam2world[2, 3] = 0.05
+    mapping = _get_mapping()
+    mapping.integrate(depth, instance_label, K, T_cam2world=T_cam2world)
+    grid_target, grid_nontarget, grid_empty = _get_grids(mapping, 2)
+    assert (grid_empty[:, :, :12] == 1).all()
+    assert (grid_target[8:, :, 12] == 1).all()
+    assert (grid_nontarget[:8, :, 12] == 1).all()
+
+
+def test_get_target_grids_batch():
+    depth, instance_label, K = _get_frame()
+    mapping = _get_mapping()
+    mapping.integrate(depth, instance_label, K)
+
+    target_ids = [1, 2, 1]
+    dimensions = (8, 8, 8)
+    pitches = [0.01, 0.005, 0.02]
+    origins = [(-0.04, -0.04, 0.96), (0, 0, 0.98), (10, 10, 10)]
+    grids = mapping.get_target_grids_batch(
+        target_ids, dimensions=dimensions, pitches=pitches, origins=origins
+    )
+    assert len(grids) == len(target_ids)
+    for target_id, pitch, origin, grids_i in zip(
+        target_ids, pitches, origins, grids
+    ):
+        expected = mapping.get_target_grids(
+            target_id, dimensions=dimensions, pitch=pitch, origin=origin
+        )
+        for grid, grid_expected in zip(grids_i, expected):
+            assert grid.shape == dimensions
+            np.testing.assert_equal(grid, grid_expected)
+
+    # voxels outside of the volume are unknown
+    assert not any(grid.any() for grid in grids[2])
+    assert (grids[0][0] > 0).any() and (grids[1][0] > 0).any()
+
+
+def test_get_states():
+    depth, instance_label, K = _get_frame()
+    mapping = _get_mapping()
+    mapping.integrate(depth, instance_label, K)
+    grid_target, grid_nontarget, _ = _get_grids(mapping, 1)
+    assert grid_target[4, 8, 7] == 1 and grid_nontarget[4, 8, 7] == 0
+
+    # the cached states are updated by integrate, including the voxels of
+    # the new instance
+    instance_label[:] = 3
+    T_cam2world = np.eye(4)
+    T_cam2world[0, 3] = 0.05
+    for _ in range(2):
+        mapping.integrate(depth, instance_label, K, T_cam2world=T_cam2world)
+    assert mapping.instance_ids == [1, 2, 3]
+    grid_target, grid_nontarget, _ = _get_grids(mapping, 1)
+    assert grid_target[4, 8, 7] == 0
+    np.testing.assert_allclose(grid_nontarget[4, 8, 7], 2 / 3)
+    grid_target, _, _ = _get_grids(mapping, 3)
+    np.testing.assert_allclose(grid_target[4, 8, 7], 2 / 3)
+
+    # same as the states of all the voxels from scratch
+    mapping_full = _get_mapping()
+    for name in ["_tsdf", "_weight", "_instance_ids", "_instance_weights"]:
+        setattr(mapping_full, name, getattr(mapping, name))
+    mapping_full._indices_updated = [np.arange(mapping._weight.size)]
+    for state, state_full in zip(
+        mapping._get_states(), mapping_full._get_states()
+    ):
+        np.testing.assert_equal(state, state_full)
@@ -0,0 +1,136 @@
+import numpy as np
+
+from morefusion.contrib import MultiInstanceOctreeMapping
+from morefusion.contrib import VoxelHashOccupancyMapping
+from morefusion.contrib.voxel_hash_occupancy_mapping import (
+    VoxelHashOccupancyMap,  # NOQA
+)
+
+
+def _get_voxels(octree, points):
+    # voxel indices of points
+    return np.floor(np.asarray(points) / octree.getResolution()).astype(int)
+
+
+def test_insert_point_cloud_axis():
+    octree = VoxelHashOccupancyMap(0.01)
+    origin = np.array([0.005, 0.005, 0.005])
+    octree.insertPointCloud([[0.055, 0.005, 0.005]], origin=origin)
+
+    occupied, empty = octree.extractPointCloud()
+    np.testing.assert_equal(_get_voxels(octree, occupied), [[5, 0, 0]])
+    np.testing.assert_equal(
+        _get_voxels(octree, empty), [[i, 0, 0] for i in range(5)]
+    )
+
+    occupancies = octree.get_occupancies(
+        [[0.055, 0.005, 0.005], [0.015, 0.005, 0.005], [0.065, 0.005, 0.005]]
+    )
+    np.testing.assert_allclose(occupancies, [0.7, 0.4, -1], rtol=1e-6)
+
+
+def test_insert_point_cloud_diagonal():
+    octree = VoxelHashOccupancyMap(0.01)
+    origin = np.array([0.005, 0.005, 0.005])
+    point = np.array([0.045, 0.035, -0.025])
+    octree.insertPointCloud([point], origin=origin)
+
+    occupied, empty = octree.extractPointCloud()
+    np.testing.assert_equal(_get_voxels(octree, occupied), [[4, 3, -3]])
+
+    # the free voxels are connected by faces from the origin voxel to the
+    # end point voxel, and are crossed by the ray
+    voxels = _get_voxels(octree, empty)
+    assert len(voxels) == 4 + 3 + 3
+    assert [0, 0, 0] in voxels.tolist()
+    assert [4, 3, -3] not in voxels.tolist()
+    lower = voxels * 0.01
+    upper = lower + 0.01
+    direction = point - origin
+    with np.errstate(divide="ignore"):
+        t1 = (lower - origin) / direction
+        t2 = (upper - origin) / direction
+    t_enter = np.minimum(t1, t2).max(axis=1)
+    t_exit = np.maximum(t1, t2).min(axis=1)
+    assert (t_enter <= t_exit + 1e-9).all()
+    assert (t_enter <= 1).all() and (t_exit >= 0).all()
+
+
+def test_update_nodes_clamp():
+    octree = VoxelHashOccupancyMap(0.01)
+    point = [0.005, 0.005, 0.005]
+    for _ in range(20):
+        octree.updateNodes([point], True)
+    np.testing.assert_allclose(octree.get_occupancies([point]), [0.971])
+    octree.updateNodes([point] * 20, False)
+    np.testing.assert_allclose(octree.get_occupancies([point]), [0.1192])
+
+    # a voxel becomes occupied after hits as many as the clamped misses
+    n_hits = int(np.ceil(-octree._logodds_min / octree._logodds_hit + 1e-6))
+    octree.updateNodes([point] * (n_hits - 1), True)
+    assert octree.get_occupancies([point])[0] < 0.5
+    octree.updateNodes([point], True)
+    assert octree.get_occupancies([point])[0] > 0.5
+
+
+def test_extract_point_cloud_bbx():
+    octree = VoxelHashOccupancyMap(0.01)
+    points = np.random.RandomState(0).uniform(-0.1, 0.1, (100, 3))
+    points[:, 2] += 0.5
+    octree.insertPointCloud(points, origin=(0, 0, 0))
+    occupied_all, empty_all = octree.extractPointCloud()
+
+    bbx_min = np.array([-0.05, -0.03, 0.42])
+    bbx_max = np.array([0.04, 0.06, 0.55])
+    occupied, empty = octree.extractPointCloud(bbx_min, bbx_max)
+    assert len(occupied) > 0 and len(empty) > 0
+    for points, points_all in [(occupied, occupied_all), (empty, empty_all)]:
+        assert ((bbx_min <= points) & (points < bbx_max)).all()
+        inside = ((bbx_min <= points_all) & (points_all < bbx_max)).all(axis=1)
+        np.testing.assert_equal(
+            np.unique(points, axis=0), np.unique(points_all[inside], axis=0)
+        )
+
+
+def test_get_target_grids():
+    H, W = 64, 64
+    # planes at z=0.5 and z=0.6 on the left and right halves
+    v, u = np.mgrid[:H, :W]
+    pcd = np.stack([(u - 31.5) / 64, (v - 31.5) / 64, np.ones((H, W))], 2)
+    pcd *= np.where(u < W // 2, 0.5, 0.6)[:, :, None]
+    label = np.where(u < W // 2, 1, 2)
+
+    mapping = VoxelHashOccupancyMapping()
+    for instance_id in [1, 2]:
+        mapping.initialize(instance_id, pitch=0.01)
+        mapping.integrate(instance_id, label == instance_id, pcd)
+
+    dimensions = (16, 16, 16)
+    pitch = 0.01
+    origin = (-0.1, -0.075, 0.45)
+    grids = mapping.get_target_grids(
+        1, dimensions=dimensions, pitch=pitch, origin=origin
+    )
+    assert len(grids) == 3
+    for grid in grids:
+        assert grid.shape == dimensions
+        assert grid.dtype == np.float32
+        assert ((0 <= grid) & (grid <= 1)).all()
+    grid_target, grid_nontarget, grid_empty = grids
+    assert (grid_target > 0).any() and (grid_empty > 0).any()
+    assert not ((grid_target > 0) & (grid_empty > 0)).any()
+
+    # same as the leaves queried by MultiInstanceOctreeMapping
+    indices = np.stack(
+        np.meshgrid(*[np.arange(d) for d in dimensions], indexing="ij"),
+        axis=-1,
+    ).reshape(-1, 3)
+    centers = origin + indices * pitch
+    for instance_id in mapping.instance_ids:
+        np.testing.assert_allclose(
+            mapping.get_occupancies(instance_id, centers),
+            MultiInstanceOctreeMapping.get_occupancies(
+                mapping, instance_id, centers
+            ),
+            rtol=1e-6,
+        )
@@ -0,0 +1,36 @@
+import json
+
+import path
+import pytest
+
+from morefusion.datasets.rgbd_pose_estimation.reindex import _load_progress
+
+
+def _dumps(image_ids, meta):
+    return json.dumps(dict(image_ids=image_ids, meta=meta)) + "\n"
+
+
+def test_load_progress(tmp_path):
+    progress_file = path.Path(tmp_path) / "progress.jsonl"
+    assert _load_progress(progress_file) == (set(), {})
+
+    # last line broken by a crash while writing
+    line1 = _dumps(["a", "b"], {"a/00000000": {"class_id": 1}})
+    line2 = _dumps(["c"], {"c/00000000": {"class_id": 2}})
+    with open(progress_file, "w") as f:
+        f.write(line1 + line2 + line2[:10])
+
+    image_ids, id_to_meta = _load_progress(progress_file)
+    assert image_ids == {"a", "b", "c"}
+    assert id_to_meta == {
+        "a/00000000": {"class_id": 1},
+        "c/00000000": {"class_id": 2},
+    }
+    with open(progress_file) as f:
+        assert f.read() == line1 + line2
+
+    # broken line before the last one
+    with open(progress_file, "w") as f:
+        f.write(line1[:10] + "\n" + line2)
+    with pytest.raises(ValueError):
+        _load_progress(progress_file)
@@ -0,0 +1,38 @@
+import io
+
+import numpy as np
+
+from morefusion.datasets.rgbd_pose_estimation.reindexed_format import (
+    pack_example,  # NOQA
+)
+from morefusion.datasets.rgbd_pose_estimation.reindexed_format import (
+    unpack_example,  # NOQA
+)
+
+
+def test_pack_example():
+    dims = (32, 32, 32)
+    example = dict(
+        class_id=np.int32(1),
+        grid_target=np.random.uniform(0, 1, dims).astype(np.float32),
+        grid_nontarget=np.random.uniform(0, 1, dims).astype(np.float32),
+        grid_empty=np.random.uniform(0, 1, dims).astype(np.float32),
+        grid_target_full=np.random.randint(0, 2, dims).astype(np.int32),
+        grid_nontarget_full=np.random.randint(0, 4, dims).astype(np.int32),
+    )
+
+    f = io.BytesIO()
+    np.savez_compressed(f, **pack_example(example))
+    f.seek(0)
+    unpacked = unpack_example(np.load(f))
+
+    assert sorted(unpacked.keys()) == sorted(example.keys())
+    for key in ["grid_target", "grid_nontarget", "grid_empty"]:
+        assert unpacked[key].dtype == bool
+        np.testing.assert_equal(unpacked[key], example[key] > 0.5)
+    for key in ["grid_target_full", "grid_nontarget_full"]:
+        assert unpacked[key].dtype == np.int32
+        np.testing.assert_equal(unpacked[key], example[key])
+
+    # unpacked example
+    np.testing.assert_equal(unpack_example(example), example)
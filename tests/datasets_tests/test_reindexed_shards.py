@@ -0,0 +1,64 @@
+import json
+
+import numpy as np
+import pytest
+
+from morefusion.datasets.rgbd_pose_estimation.reindexed import (
+    RGBDPoseEstimationDatasetReIndexedBase,  # NOQA
+)
+from morefusion.datasets.rgbd_pose_estimation.reindexed_format import (
+    pack_example,  # NOQA
+)
+from morefusion.datasets.rgbd_pose_estimation.reindexed_shards import (
+    convert_to_shards,  # NOQA
+)
+from morefusion.datasets.rgbd_pose_estimation.reindexed_shards import (
+    ReIndexedShardReader,  # NOQA
+)
+
+
+def test_convert_to_shards(tmp_path):
+    examples = {}
+    for i in range(5):
+        id = f"data/{i // 2:06d}/{i % 2:08d}"
+        examples[id] = dict(
+            class_id=np.int32(i),
+            rgb=np.random.randint(0, 256, (8, 8, 3), dtype=np.uint8),
+            pcd=np.random.uniform(-1, 1, (8, 8, 3)),
+            grid_target=np.random.uniform(0, 1, (4, 4, 4)),
+        )
+        npz_file = tmp_path / f"{id}.npz"
+        npz_file.parent.mkdir(parents=True, exist_ok=True)
+        np.savez_compressed(npz_file, **pack_example(examples[id]))
+    with open(tmp_path / "meta.json", "w") as f:
+        json.dump({id: {} for id in examples}, f)
+
+    convert_to_shards(tmp_path, shard_size=2)
+
+    reader = ReIndexedShardReader(tmp_path / "shards")
+    assert sorted(reader.ids) == sorted(examples.keys())
+    for id, example in examples.items():
+        example_read = reader.get_example(id)
+        assert example_read["class_id"] == example["class_id"]
+        np.testing.assert_equal(example_read["rgb"], example["rgb"])
+        assert example_read["pcd"].dtype == example["pcd"].dtype
+        np.testing.assert_equal(example_read["pcd"], example["pcd"])
+        np.testing.assert_equal(
+            example_read["grid_target"], example["grid_target"] > 0.5
+        )
+
+        example_read = reader.get_example(id, keys=["class_id"])
+        assert list(example_read.keys()) == ["class_id"]
+
+
+def test_reindexed_keys(tmp_path):
+    class Dataset(RGBDPoseEstimationDatasetReIndexedBase):
+        _root_dir = str(tmp_path)
+
+        def _get_ids(self):
+            return []
+
+    Dataset("train", keys=["class_id"])
+    Dataset("train", augmentation=True, keys=["class_id", "rgb", "pcd"])
+    with pytest.raises(ValueError):
+        Dataset("train", augmentation=True, keys=["class_id", "rgb"])
@@ -0,0 +1,275 @@
+import imgviz
+import numpy as np
+import trimesh
+
+from morefusion.contrib import VoxelHashOccupancyMapping
+from morefusion.datasets.rgbd_pose_estimation.base import (
+    RGBDPoseEstimationDatasetBase,  # NOQA
+)
+from morefusion.datasets.rgbd_pose_estimation.base import _crop_and_centerize
+from morefusion.extra import rasterize
+from morefusion.geometry import pointcloud_from_depth
+
+
+class Models:
+    def __init__(self, root_dir):
+        self._root_dir = root_dir
+        self._meshes = {}
+        for class_id in [1, 2, 3]:
+            mesh = trimesh.creation.box((0.08, 0.08, 0.06 + 0.01 * class_id))
+            mesh.export(str(self.get_cad_file(class_id)))
+            self._meshes[class_id] = mesh
+
+    def get_mesh(self, class_id):
+        return self._meshes[class_id]
+
+    def get_cad_file(self, class_id):
+        return self._root_dir / f"{class_id}.obj"
+
+    def get_voxel_pitch(self, dimension, class_id):
+        return 0.1 / dimension
+
+    def get_solid_voxel_points(self, class_id):
+        mesh = self._meshes[class_id]
+        return mesh.voxelized(0.01).fill().points
+
+
+class Dataset(RGBDPoseEstimationDatasetBase):
+
+    _image_size = 64
+    _voxel_dim = 16
+    _mapping_backend = "projective"
+
+    def __init__(self, models, class_ids_rejected=()):
+        super().__init__(models=models)
+        self._class_ids_rejected = class_ids_rejected
+
+    def get_frame(self, index):
+        H, W = 120, 160
+        K = trimesh.scene.Camera(resolution=(W, H), fov=(60, 45)).K
+
+        class_ids = np.array([1, 2, 3], dtype=np.int32)
+        Ts_cad2cam = np.array(
+            [
+                trimesh.transformations.translation_matrix(t)
+                for t in [(-0.07, 0, 0.6), (0, 0.01, 0.62), (0.07, 0, 0.64)]
+            ]
+        )
+        depth, instance_ids, _ = rasterize.rasterize_meshes(
+            [self._models.get_mesh(class_id) for class_id in class_ids],
+            Ts_cad2cam,
+            K,
+            H,
+            W,
+        )
+        depth[instance_ids == -1] = 1.0
+
+        return dict(
+            instance_ids=class_ids,
+            class_ids=class_ids,
+            rgb=np.full((H, W, 3), 127, dtype=np.uint8),
+            depth=depth,
+            instance_label=instance_ids + 1,
+            intrinsic_matrix=K,
+            Ts_cad2cam=Ts_cad2cam,
+        )
+
+    def _filter_instance(self, class_id, T_cad2cam, pcd):
+        return class_id not in self._class_ids_rejected
+
+
+def test_get_example_filter_instance(tmp_path):
+    models = Models(tmp_path)
+
+    # rejected instances are removed from the examples as they were
+    # filtered after get_example
+    examples_all = Dataset(models).get_example(0)
+    assert [example["class_id"] for example in examples_all] == [1, 2, 3]
+    examples_expected = [examples_all[0], examples_all[2]]
+
+    examples = Dataset(models, class_ids_rejected=[2]).get_example(0)
+    assert len(examples) == len(examples_expected)
+    for example, example_expected in zip(examples, examples_expected):
+        assert example.keys() == example_expected.keys()
+        for key in example:
+            np.testing.assert_equal(example[key], example_expected[key])
+
+    # the rejected instance still occupies the non-target grids
+    assert (examples[0]["grid_nontarget_full"] == 1).any()
+    assert (examples[1]["grid_nontarget_full"] == 2).any()
+
+
+def test_build_octomap(tmp_path):
+    dataset = Dataset(Models(tmp_path))
+    frame = dataset.get_frame(0)
+    K = frame["intrinsic_matrix"]
+    pcd = pointcloud_from_depth(
+        frame["depth"], fx=K[0, 0], fy=K[1, 1], cx=K[0, 2], cy=K[1, 2]
+    )
+
+    # two background objects, which are not in instance_ids
+    instance_label = frame["instance_label"].copy()
+    instance_label[(instance_label == 0) & (np.arange(160) < 40)] = 9
+
+    mapping = dataset.build_octomap(
+        pcd,
+        instance_label,
+        frame["instance_ids"],
+        frame["class_ids"],
+        backend="voxel_hash",
+    )
+    assert sorted(mapping.instance_ids) == [0, 1, 2, 3]
+
+    # background is integrated as a single scan of the union of its labels
+    mask = np.isin(instance_label, [0, 9])
+    mapping_expected = VoxelHashOccupancyMapping()
+    mapping_expected.initialize(0, pitch=0.01)
+    mapping_expected.integrate(0, mask, pcd, deduplicate=True)
+    octree = mapping._octrees[0]
+    octree_expected = mapping_expected._octrees[0]
+    np.testing.assert_equal(octree._keys, octree_expected._keys)
+    np.testing.assert_equal(octree._logodds, octree_expected._logodds)
+    assert (mapping.get_occupancies(0, pcd[mask]) > 0.5).all()
+
+    # foreground objects are integrated with deduplication
+    for instance_id in frame["instance_ids"]:
+        mapping_expected.initialize(
+            instance_id, pitch=dataset._models.get_voxel_pitch(16, 1)
+        )
+        mapping_expected.integrate(
+            instance_id,
+            instance_label == instance_id,
+            pcd,
+            deduplicate=True,
+        )
+        octree = mapping._octrees[instance_id]
+        octree_expected = mapping_expected._octrees[instance_id]
+        np.testing.assert_equal(octree._keys, octree_expected._keys)
+        np.testing.assert_equal(octree._logodds, octree_expected._logodds)
+
+
+def test_crop_and_centerize():
+    random_state = np.random.RandomState(0)
+    H, W = 48, 64
+    rgb = random_state.randint(0, 256, (H, W, 3)).astype(np.uint8)
+    pcd = random_state.uniform(-1, 1, (H, W, 3))
+    pcd[random_state.uniform(size=(H, W)) < 0.1] = np.nan
+    label = random_state.randint(1, 256, (H, W)).astype(np.uint8)
+    mask = random_state.uniform(size=(H, W)) < 0.8
+
+    # the crops are scaled by integers so that the interpolated values do
+    # not depend on the resizing backend of imgviz
+    for bbox, shape in [
+        ((8, 4, 16, 20), (32, 32)),  # wide
+        ((0, 10, 16, 18), (32, 32)),  # tall on the top border
+        ((40, 48, 48, 64), (32, 32)),  # on the bottom-right corner
+        ((20, 0, 30, 16), (16, 16)),  # not resized on the left border
+        ((0, 0, H, W), (H, W)),  # whole image
+        ((0, 0, H, W), (96, 192)),  # taller output
+    ]:
+        y1, x1, y2, x2 = bbox
+        for src, cval, interpolation, kwargs in [
+            (rgb, 0, "linear", {}),
+            (
+                pcd,
+                np.nan,
+                "nearest",
+                dict(cval=np.nan, interpolation="nearest"),
+            ),
+            (label, 0, "nearest", dict(cval=0, interpolation="nearest")),
+        ]:
+            # as cropped from the masked full image before
+            src_masked = src.copy()
+            src_masked[~mask] = cval
+            expected = imgviz.centerize(
+                src_masked[y1:y2, x1:x2], shape, **kwargs
+            )
+
+            actual = _crop_and_centerize(
+                src,
+                mask,
+                bbox,
+                out=np.empty(shape + src.shape[2:], dtype=src.dtype),
+                cval=cval,
+                interpolation=interpolation,
+            )
+            assert actual.shape == expected.shape
+            assert actual.dtype == expected.dtype
+            if interpolation == "linear":
+                np.testing.assert_allclose(
+                    actual.astype(int), expected.astype(int), atol=1
+                )
+            else:
+                # float32 resizing of some backends
+                np.testing.assert_allclose(actual, expected, rtol=1e-6)
+
+
+def _get_grid_full(models, examples, pitch, origin, dimension):
+    # the instances are voxelized one by one for each target as before
+    grid_full = np.zeros((dimension,) * 3, dtype=np.int32)
+    for i, example in enumerate(examples):
+        T = trimesh.transformations.quaternion_matrix(
+            example["quaternion_true"]
+        )
+        T[:3, 3] = example["translation_true"]
+        points = models.get_solid_voxel_points(example["class_id"])
+        points = trimesh.transform_points(points, T)
+        indices = trimesh.voxel.ops.points_to_indices(
+            points, pitch=pitch, origin=origin
+        )
+        keep = ((indices >= 0) & (indices < dimension)).all(axis=1)
+        I, J, K = indices[keep].T
+        grid_full[I, J, K] = i + 1
+    return grid_full
+
+
+def test_get_grids_full(tmp_path):
+    models = Models(tmp_path)
+    dataset = Dataset(models)
+    dim = dataset._voxel_dim
+
+    random_state = np.random.RandomState(0)
+    examples = []
+    for class_id in [1, 2, 3, 1, 2]:
+        quaternion = trimesh.transformations.random_quaternion(
+            random_state.uniform(size=3)
+        )
+        translation = random_state.uniform(-0.03, 0.03, 3) + (0, 0, 0.5)
+        pitch = models.get_voxel_pitch(dim, class_id)
+        origin = translation - (dim / 2 - 0.5) * pitch
+        origin += random_state.uniform(-0.02, 0.02, 3)
+        examples.append(
+            dict(
+                class_id=class_id,
+                quaternion_true=quaternion,
+                translation_true=translation,
+                pitch=pitch,
+                origin=origin,
+            )
+        )
+
+    # the non-target instances overlap in the grid
+    example = examples[0]
+    grids = [
+        _get_grid_full(models, [e], example["pitch"], example["origin"], dim)
+        for e in examples[1:]
+    ]
+    assert ((np.array(grids) > 0).sum(axis=0) > 1).any()
+
+    for n_voxelized_max in [2 ** 22, 1]:  # 1 for a target in each chunk
+        dataset._n_voxelized_max = n_voxelized_max
+        for indices in [None, [3, 0]]:
+            grids = dataset._get_grids_full(examples, indices)
+            if indices is None:
+                indices = range(len(examples))
+            assert len(grids) == len(indices)
+            for index, (grid_target, grid_nontarget) in zip(indices, grids):
+                example = examples[index]
+                others = examples[:index] + examples[index + 1 :]
+                args = (example["pitch"], example["origin"], dim)
+                np.testing.assert_equal(
+                    grid_target, _get_grid_full(models, [example], *args)
+                )
+                np.testing.assert_equal(
+                    grid_nontarget, _get_grid_full(models, others, *args)
+                )
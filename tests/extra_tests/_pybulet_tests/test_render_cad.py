@@ -39,3 +39,33 @@ def test_render_cad():
     assert depths.dtype == np.float32
     assert masks.shape == (2, H, W)
     assert masks.dtype == bool
+
+
+def test_cad_renderer():
+    dataset = YCBVideoModels()
+    visual_files = [
+        dataset.get_cad_file(class_id=2),
+        dataset.get_cad_file(class_id=3),
+    ]
+
+    H, W = 256, 256
+
+    T_cam2cad = geometry.look_at((1, 1, 1), (0, 0, 0), up=(0, 0, -1))
+    T_cad2cam = np.linalg.inv(T_cam2cad)
+    Ts_cad2cam = T_cad2cam[None].repeat(2, axis=0)
+
+    renderer = pybullet_module.CadRenderer()
+    rgbs, depths, masks = renderer.render(
+        visual_files, Ts_cad2cam, fovy=45, height=H, width=W,
+    )
+    assert rgbs.shape == (2, H, W, 3)
+    assert depths.shape == (2, H, W)
+    assert masks.shape == (2, H, W)
+    assert masks.dtype == bool
+
+    for visual_file, mask in zip(visual_files, masks):
+        _, _, mask_expected = pybullet_module.render_cad(
+            visual_file, T_cad2cam, fovy=45, height=H, width=W,
+        )
+        np.testing.assert_equal(mask, mask_expected)
+    renderer.close()
@@ -0,0 +1,55 @@
+import numpy as np
+import trimesh
+
+from morefusion.extra._rasterize import rasterize_meshes
+
+
+def test_rasterize_meshes():
+    H, W = 120, 160
+    K = np.array([[100, 0, 79.5], [0, 100, 59.5], [0, 0, 1]], dtype=float)
+
+    box = trimesh.creation.box((0.2, 0.2, 0.2))
+    T_box2cam = np.eye(4)
+    T_box2cam[:3, 3] = (0, 0, 1)
+
+    depth, instance_ids, masks, face_ids, barycentrics = rasterize_meshes(
+        [box], [T_box2cam], K, H, W, return_barycentrics=True,
+    )
+    assert depth.shape == (H, W)
+    assert depth.dtype == np.float32
+    assert instance_ids.shape == (H, W)
+    assert instance_ids.dtype == np.int32
+    assert masks.shape == (1, H, W)
+    assert masks.dtype == bool
+    assert face_ids.shape == (H, W)
+    assert barycentrics.shape == (H, W, 3)
+
+    # front face at z=0.9, which is 0.2 / 0.9 * 100 pixels wide
+    np.testing.assert_allclose(depth[instance_ids == 0], 0.9, rtol=1e-5)
+    assert (instance_ids == 0).sum() == 22 * 22
+    np.testing.assert_equal(masks[0], instance_ids == 0)
+    assert np.isnan(depth[instance_ids == -1]).all()
+
+    # points interpolated with the barycentrics are on the depth
+    foreground = instance_ids == 0
+    triangles = box.vertices[box.faces[face_ids[foreground]]]
+    points = (barycentrics[foreground][:, :, None] * triangles).sum(axis=1)
+    points += T_box2cam[:3, 3]
+    np.testing.assert_allclose(points[:, 2], depth[foreground], rtol=1e-5)
+
+    # occlusion by a nearer box, and the tiles and chunks do not matter
+    T_box2cam2 = np.eye(4)
+    T_box2cam2[:3, 3] = (0.1, 0, 0.7)
+    depth2, instance_ids2, masks2 = rasterize_meshes(
+        [box, box],
+        [T_box2cam, T_box2cam2],
+        K,
+        H,
+        W,
+        tile_size=17,
+        max_elements=100,
+    )
+    np.testing.assert_equal(masks2[0], masks[0])
+    np.testing.assert_equal(masks2[1], instance_ids2 == 1)
+    assert 0 < (instance_ids2 == 0).sum() < (instance_ids == 0).sum()
+    np.testing.assert_allclose(depth2[instance_ids2 == 1], 0.6, rtol=1e-5)
@@ -2,6 +2,7 @@ import unittest
 
 import numpy
 
+import chainer
 from chainer import cuda
 from chainer import gradient_check
 from chainer import testing
@@ -14,6 +15,9 @@ from morefusion.functions.geometry.average_voxelization_3d import (
 from morefusion.functions.geometry.average_voxelization_3d import (
     AverageVoxelization3D,  # NOQA
 )
+from morefusion.functions.geometry.densify_voxel_grid import (
+    densify_voxel_grid,  # NOQA
+)
 
 
 class TestAverageVoxelization3D(unittest.TestCase):
@@ -60,6 +64,39 @@ class TestAverageVoxelization3D(unittest.TestCase):
     def test_forward_cpu(self):
         self.check_forward(self.values, self.points, self.batch_indices)
 
+    def test_forward_cpu_values(self):
+        y, counts = average_voxelization_3d(
+            self.values,
+            self.points,
+            self.batch_indices,
+            batch_size=self.batch_size,
+            origin=self.origin,
+            pitch=self.pitch,
+            dimensions=self.dimensions,
+            return_counts=True,
+        )
+
+        shape = (self.batch_size, self.channels) + self.dimensions
+        y_expected = numpy.zeros(shape, dtype=numpy.float32)
+        counts_expected = numpy.zeros(
+            (self.batch_size,) + self.dimensions, dtype=numpy.int32
+        )
+        for point, value, batch_index in zip(
+            self.points, self.values, self.batch_indices
+        ):
+            index = ((point - self.origin) / self.pitch).round().astype(int)
+            if ((0 <= index) & (index < self.dimensions)).all():
+                ix, iy, iz = index
+                y_expected[batch_index, :, ix, iy, iz] += value
+                counts_expected[batch_index, ix, iy, iz] += 1
+        nonzero = counts_expected > 0
+        y_expected = y_expected.transpose(0, 2, 3, 4, 1)
+        y_expected[nonzero] /= counts_expected[nonzero][:, None]
+        y_expected = y_expected.transpose(0, 4, 1, 2, 3)
+
+        testing.assert_allclose(y.array, y_expected)
+        testing.assert_allclose(counts, counts_expected, atol=0, rtol=0)
+
     @attr.gpu
     @condition.retry(3)
     def test_forward_gpu(self):
@@ -101,6 +138,70 @@ class TestAverageVoxelization3D(unittest.TestCase):
             counts_cpu, cuda.to_cpu(counts_gpu), atol=0, rtol=0
         )
 
+    def check_forward_sparse(
+        self, values_data, points_data, batch_indices_data, y_grad
+    ):
+        kwargs = dict(
+            batch_size=self.batch_size,
+            origin=self.origin,
+            pitch=self.pitch,
+            dimensions=self.dimensions,
+        )
+        values_dense = chainer.Variable(values_data)
+        y_dense, counts_dense = average_voxelization_3d(
+            values_dense,
+            points_data,
+            batch_indices_data,
+            return_counts=True,
+            **kwargs,
+        )
+        values_sparse = chainer.Variable(values_data)
+        (coords, features), counts = average_voxelization_3d(
+            values_sparse,
+            points_data,
+            batch_indices_data,
+            return_counts=True,
+            sparse=True,
+            **kwargs,
+        )
+        y_sparse = densify_voxel_grid(
+            coords,
+            features,
+            batch_size=self.batch_size,
+            dimensions=self.dimensions,
+        )
+
+        self.assertEqual(coords.shape, (features.shape[0], 4))
+        testing.assert_allclose(
+            cuda.to_cpu(counts_dense[tuple(coords.T)]),
+            cuda.to_cpu(counts),
+            atol=0,
+            rtol=0,
+        )
+        testing.assert_allclose(
+            cuda.to_cpu(y_dense.array), cuda.to_cpu(y_sparse.array)
+        )
+
+        chainer.functions.sum(y_dense * y_grad).backward()
+        chainer.functions.sum(y_sparse * y_grad).backward()
+        testing.assert_allclose(
+            cuda.to_cpu(values_dense.grad), cuda.to_cpu(values_sparse.grad)
+        )
+
+    def test_forward_sparse_cpu(self):
+        self.check_forward_sparse(
+            self.values, self.points, self.batch_indices, self.gy
+        )
+
+    @attr.gpu
+    def test_forward_sparse_gpu(self):
+        self.check_forward_sparse(
+            cuda.to_gpu(self.values),
+            cuda.to_gpu(self.points),
+            cuda.to_gpu(self.batch_indices),
+            cuda.to_gpu(self.gy),
+        )
+
     def check_backward(
         self, values_data, points_data, batch_indices_data, y_grad
     ):
@@ -1,5 +1,6 @@
 import unittest
 
+import chainer
 from chainer import cuda
 from chainer import gradient_check
 from chainer import testing
@@ -80,11 +81,11 @@ class TestInterpolateVoxelGrid(unittest.TestCase):
             **self.check_backward_options,
         )
 
-    # @condition.retry(3)
-    # def test_backward_cpu(self):
-    #     self.check_backward(
-    #         self.voxelized, self.points, self.batch_indices, self.gy
-    #     )
+    @condition.retry(3)
+    def test_backward_cpu(self):
+        self.check_backward(
+            self.voxelized, self.points, self.batch_indices, self.gy
+        )
 
     @attr.gpu
     @condition.retry(3)
@@ -96,5 +97,26 @@ class TestInterpolateVoxelGrid(unittest.TestCase):
             cuda.to_gpu(self.gy),
         )
 
+    @attr.gpu
+    @condition.retry(3)
+    def test_backward_cpu_gpu_equal(self):
+        def get_grad(voxelized, points, batch_indices, gy):
+            voxelized = chainer.Variable(voxelized)
+            y = interpolate_voxel_grid(voxelized, points, batch_indices)
+            y.grad = gy
+            y.backward()
+            return cuda.to_cpu(voxelized.grad)
+
+        grad_cpu = get_grad(
+            self.voxelized, self.points, self.batch_indices, self.gy
+        )
+        grad_gpu = get_grad(
+            cuda.to_gpu(self.voxelized),
+            cuda.to_gpu(self.points),
+            cuda.to_gpu(self.batch_indices),
+            cuda.to_gpu(self.gy),
+        )
+        testing.assert_allclose(grad_cpu, grad_gpu)
+
 
 testing.run_module(__name__, __file__)
@@ -0,0 +1,107 @@
+import unittest
+
+from chainer import cuda
+from chainer import gradient_check
+from chainer import testing
+from chainer.testing import attr
+from chainer.testing import condition
+import numpy as np
+
+from morefusion.functions.geometry.interpolate_voxel_grid import (
+    interpolate_voxel_grid,  # NOQA
+)
+from morefusion.functions.geometry.interpolate_voxel_pyramid import (
+    interpolate_voxel_pyramid,  # NOQA
+)
+from morefusion.functions.geometry.interpolate_voxel_pyramid import (
+    InterpolateVoxelPyramid,  # NOQA
+)
+
+
+class TestInterpolateVoxelPyramid(unittest.TestCase):
+    def setUp(self):
+        batch_size = 3
+        n_point = 128
+        dim = 16
+
+        self.scales = [2.0, 4.0]
+        self.voxelized = [
+            np.random.uniform(
+                -1, 1, (batch_size, 4, dim // 2, dim // 2, dim // 2)
+            ).astype(np.float32),
+            np.random.uniform(
+                -1, 1, (batch_size, 6, dim // 4, dim // 4, dim // 4)
+            ).astype(np.float32),
+        ]
+        self.points = np.random.uniform(0, dim - 1, (n_point, 3)).astype(
+            np.float32
+        )
+        self.batch_indices = np.random.randint(
+            0, batch_size, size=self.points.shape[0], dtype=np.int32
+        )
+        self.gy = np.random.uniform(-1, 1, (n_point, 10)).astype(np.float32)
+        self.check_backward_options = {"atol": 5e-4, "rtol": 5e-3}
+
+    def check_forward(self, voxelized_data, points_data, batch_indices_data):
+        y = interpolate_voxel_pyramid(
+            voxelized_data,
+            points_data,
+            batch_indices_data,
+            scales=self.scales,
+        )
+        self.assertEqual(y.data.dtype, np.float32)
+        y_data = cuda.to_cpu(y.data)
+        self.assertEqual(self.gy.shape, y_data.shape)
+
+        xp = cuda.get_array_module(points_data)
+        y_expected = [
+            interpolate_voxel_grid(
+                v, points_data / xp.float32(s), batch_indices_data
+            ).array
+            for v, s in zip(voxelized_data, self.scales)
+        ]
+        y_expected = cuda.to_cpu(xp.concatenate(y_expected, axis=1))
+        testing.assert_allclose(y_data, y_expected)
+
+    @condition.retry(3)
+    def test_forward_cpu(self):
+        self.check_forward(self.voxelized, self.points, self.batch_indices)
+
+    @attr.gpu
+    @condition.retry(3)
+    def test_forward_gpu(self):
+        self.check_forward(
+            [cuda.to_gpu(v) for v in self.voxelized],
+            cuda.to_gpu(self.points),
+            cuda.to_gpu(self.batch_indices),
+        )
+
+    def check_backward(
+        self, voxelized_data, points_data, batch_indices_data, y_grad
+    ):
+        gradient_check.check_backward(
+            InterpolateVoxelPyramid(scales=self.scales),
+            (points_data, batch_indices_data) + tuple(voxelized_data),
+            y_grad,
+            no_grads=[True, True] + [False] * len(voxelized_data),
+            **self.check_backward_options,
+        )
+
+    @condition.retry(3)
+    def test_backward_cpu(self):
+        self.check_backward(
+            self.voxelized, self.points, self.batch_indices, self.gy
+        )
+
+    @attr.gpu
+    @condition.retry(3)
+    def test_backward_gpu(self):
+        self.check_backward(
+            [cuda.to_gpu(v) for v in self.voxelized],
+            cuda.to_gpu(self.points),
+            cuda.to_gpu(self.batch_indices),
+            cuda.to_gpu(self.gy),
+        )
+
+
+testing.run_module(__name__, __file__)
@@ -2,6 +2,7 @@ import unittest
 
 import numpy
 
+import chainer
 from chainer import cuda
 from chainer import gradient_check
 from chainer import testing
@@ -11,6 +12,9 @@ from chainer.testing import condition
 from morefusion.functions.geometry.max_voxelization_3d import (
     max_voxelization_3d,  # NOQA
 )
+from morefusion.functions.geometry.densify_voxel_grid import (
+    densify_voxel_grid,  # NOQA
+)
 from morefusion.functions.geometry.max_voxelization_3d import MaxVoxelization3D
 
 
@@ -64,6 +68,38 @@ class TestMaxVoxelization3D(unittest.TestCase):
             self.values, self.points, self.batch_indices, self.intensities
         )
 
+    def test_forward_cpu_values(self):
+        y, indices = max_voxelization_3d(
+            self.values,
+            self.points,
+            self.batch_indices,
+            self.intensities,
+            batch_size=self.batch_size,
+            origin=self.origin,
+            pitch=self.pitch,
+            dimensions=self.dimensions,
+            return_indices=True,
+        )
+
+        shape = (self.batch_size, self.channels) + self.dimensions
+        y_expected = numpy.zeros(shape, dtype=numpy.float32)
+        indices_expected = numpy.full(
+            (self.batch_size,) + self.dimensions, -1, dtype=numpy.int32
+        )
+        for i, point in enumerate(self.points):
+            index = ((point - self.origin) / self.pitch).round().astype(int)
+            if not ((0 <= index) & (index < self.dimensions)).all():
+                continue
+            ix, iy, iz = index
+            b = self.batch_indices[i]
+            j = indices_expected[b, ix, iy, iz]
+            if j < 0 or self.intensities[i] > self.intensities[j]:
+                y_expected[b, :, ix, iy, iz] = self.values[i]
+                indices_expected[b, ix, iy, iz] = i
+
+        testing.assert_allclose(y.array, y_expected)
+        testing.assert_allclose(indices, indices_expected, atol=0, rtol=0)
+
     @attr.gpu
     @condition.retry(3)
     def test_forward_gpu(self):
@@ -103,6 +139,81 @@ class TestMaxVoxelization3D(unittest.TestCase):
 
         testing.assert_allclose(y_cpu.data, cuda.to_cpu(y_gpu.data))
 
+    def check_forward_sparse(
+        self,
+        values_data,
+        points_data,
+        batch_indices_data,
+        intensities_data,
+        y_grad,
+    ):
+        kwargs = dict(
+            batch_size=self.batch_size,
+            origin=self.origin,
+            pitch=self.pitch,
+            dimensions=self.dimensions,
+        )
+        values_dense = chainer.Variable(values_data)
+        y_dense, indices_dense = max_voxelization_3d(
+            values_dense,
+            points_data,
+            batch_indices_data,
+            intensities_data,
+            return_indices=True,
+            **kwargs,
+        )
+        values_sparse = chainer.Variable(values_data)
+        (coords, features), indices = max_voxelization_3d(
+            values_sparse,
+            points_data,
+            batch_indices_data,
+            intensities_data,
+            return_indices=True,
+            sparse=True,
+            **kwargs,
+        )
+        y_sparse = densify_voxel_grid(
+            coords,
+            features,
+            batch_size=self.batch_size,
+            dimensions=self.dimensions,
+        )
+
+        testing.assert_allclose(
+            cuda.to_cpu(indices_dense[tuple(coords.T)]),
+            cuda.to_cpu(indices),
+            atol=0,
+            rtol=0,
+        )
+        testing.assert_allclose(
+            cuda.to_cpu(y_dense.array), cuda.to_cpu(y_sparse.array)
+        )
+
+        chainer.functions.sum(y_dense * y_grad).backward()
+        chainer.functions.sum(y_sparse * y_grad).backward()
+        testing.assert_allclose(
+            cuda.to_cpu(values_dense.grad), cuda.to_cpu(values_sparse.grad)
+        )
+
+    def test_forward_sparse_cpu(self):
+        self.check_forward_sparse(
+            self.values,
+            self.points,
+            self.batch_indices,
+            self.intensities,
+            self.gy,
+        )
+
+    @attr.gpu
+    def test_forward_sparse_gpu(self):
+        self.check_forward_sparse(
+            cuda.to_gpu(self.values),
+            cuda.to_gpu(self.points),
+            cuda.to_gpu(self.batch_indices),
+            cuda.to_gpu(self.intensities),
+            cuda.to_gpu(self.gy),
+        )
+
     def check_backward(
         self,
         values_data,
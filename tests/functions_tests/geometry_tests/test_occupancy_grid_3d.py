@@ -60,6 +60,78 @@ class TestOccupancyGrid3D(unittest.TestCase):
 
         testing.assert_allclose(y_cpu.array, cuda.to_cpu(y_gpu.array))
 
+    def check_forward_local(self, points_data):
+        xp = cuda.get_array_module(points_data)
+        points_data = xp.random.uniform(-1, 6, (64, 3)).astype(np.float32)
+        for threshold in [1, 1.5, 2]:
+            kwargs = dict(
+                pitch=self.pitch,
+                origin=self.origin,
+                dims=self.dims,
+                threshold=threshold,
+            )
+            points_dense = chainer.Variable(points_data)
+            y_dense = occupancy_grid_3d(points_dense, **kwargs)
+            points_local = chainer.Variable(points_data)
+            y_local = occupancy_grid_3d(points_local, local=True, **kwargs)
+            testing.assert_allclose(y_dense.array, y_local.array)
+
+            grad_matrix = xp.asarray(self.grad_matrix)
+            chainer.functions.sum(y_dense * grad_matrix).backward()
+            chainer.functions.sum(y_local * grad_matrix).backward()
+            testing.assert_allclose(points_dense.grad, points_local.grad)
+
+    def test_forward_local_cpu(self):
+        self.check_forward_local(self.points)
+
+    @testing.attr.gpu
+    def test_forward_local_gpu(self):
+        self.check_forward_local(cuda.to_gpu(self.points))
+
+    def check_forward_batch(self, points_data):
+        xp = cuda.get_array_module(points_data)
+        pitch = xp.asarray([1, 0.5, 0.8], dtype=np.float32)
+        origin = xp.asarray(
+            [[0, 0, 0], [-1, 0, 1], [0.5, 0.5, 0.5]], dtype=np.float32
+        )
+        points = [
+            xp.random.uniform(-1, 4, (n, 3)).astype(np.float32)
+            for n in [16, 8, 32]
+        ]
+        batch_indices = xp.concatenate(
+            [
+                xp.full((len(p),), i, dtype=np.int32)
+                for i, p in enumerate(points)
+            ]
+        )
+        y_batch = occupancy_grid_3d(
+            xp.concatenate(points),
+            pitch=pitch,
+            origin=origin,
+            dims=self.dims,
+            threshold=1.5,
+            batch_indices=batch_indices,
+            batch_size=len(points),
+        )
+        self.assertEqual(y_batch.shape, (len(points),) + self.dims)
+        for i, points_i in enumerate(points):
+            y_i = occupancy_grid_3d(
+                points_i,
+                pitch=pitch[i],
+                origin=origin[i],
+                dims=self.dims,
+                threshold=1.5,
+                local=True,
+            )
+            testing.assert_allclose(y_batch.array[i], y_i.array)
+
+    def test_forward_batch_cpu(self):
+        self.check_forward_batch(self.points)
+
+    @testing.attr.gpu
+    def test_forward_batch_gpu(self):
+        self.check_forward_batch(cuda.to_gpu(self.points))
+
     def check_backward(self, points_data, grad_matrix):
         chainer.gradient_check.check_backward(
             lambda x: occupancy_grid_3d(
@@ -0,0 +1,168 @@
+import unittest
+
+from chainer.backends import cuda
+import chainer.gradient_check
+from chainer import testing
+from chainer.testing import attr
+from chainer.testing import condition
+import numpy as np
+
+from morefusion.functions.geometry.truncated_distance_function import (
+    pseudo_occupancy_voxelization,  # NOQA
+)
+from morefusion.functions.geometry.truncated_distance_function import (
+    truncated_distance_function,  # NOQA
+)
+
+
+class TestTruncatedDistanceFunction(unittest.TestCase):
+    def setUp(self):
+        self.pitch = 0.5
+        self.origin = (0, 0, 0)
+        self.dims = (8, 8, 8)
+        self.truncation = 1.2
+        self.points = np.random.uniform(0.2, 3.3, (16, 3)).astype(np.float32)
+        self.sdf = np.random.uniform(0, 1, (16,)).astype(np.float32)
+        self.grad_matrix = np.random.uniform(-1, 1, self.dims).astype(
+            np.float32
+        )
+
+    def check_forward(self, points_data):
+        matrix = truncated_distance_function(
+            points_data,
+            pitch=self.pitch,
+            origin=self.origin,
+            dims=self.dims,
+            truncation=self.truncation,
+        )
+        self.assertEqual(matrix.shape, self.dims)
+
+        ksize = int(np.ceil(self.truncation / self.pitch))
+        ksize += 1 - ksize % 2
+        offsets = np.arange(ksize) - ksize // 2
+        matrix_expected = np.full(self.dims, self.truncation)
+        for point in cuda.to_cpu(points_data):
+            ixyz_f = (point - self.origin) / self.pitch
+            for offset in np.stack(
+                np.meshgrid(offsets, offsets, offsets), -1
+            ).reshape(-1, 3):
+                ixyz = np.round(ixyz_f).astype(int) + offset
+                if not ((0 <= ixyz) & (ixyz < self.dims)).all():
+                    continue
+                distance = self.pitch * np.linalg.norm(ixyz_f - ixyz)
+                ix, iy, iz = ixyz
+                matrix_expected[ix, iy, iz] = min(
+                    matrix_expected[ix, iy, iz], distance
+                )
+        testing.assert_allclose(
+            cuda.to_cpu(matrix.array), matrix_expected, atol=1e-5, rtol=1e-4
+        )
+
+    def test_forward_cpu(self):
+        self.check_forward(self.points)
+
+    @attr.gpu
+    def test_forward_gpu(self):
+        self.check_forward(cuda.to_gpu(self.points))
+
+    @attr.gpu
+    @condition.retry(3)
+    def test_forward_cpu_gpu_equal(self):
+        kwargs = dict(
+            pitch=self.pitch,
+            origin=self.origin,
+            dims=self.dims,
+            truncation=self.truncation,
+            return_indices=True,
+        )
+        y_cpu, indices_cpu = truncated_distance_function(self.points, **kwargs)
+        y_gpu, indices_gpu = truncated_distance_function(
+            cuda.to_gpu(self.points), **kwargs
+        )
+        testing.assert_allclose(y_cpu.array, cuda.to_cpu(y_gpu.array))
+        testing.assert_allclose(
+            indices_cpu, cuda.to_cpu(indices_gpu), atol=0, rtol=0
+        )
+
+    def check_backward(self, points_data, grad_matrix):
+        chainer.gradient_check.check_backward(
+            lambda x: truncated_distance_function(
+                x,
+                pitch=self.pitch,
+                origin=self.origin,
+                dims=self.dims,
+                truncation=self.truncation,
+            ),
+            points_data,
+            grad_matrix,
+            eps=1e-3,
+            atol=1e-2,
+            rtol=1e-2,
+        )
+
+    @condition.retry(5)
+    def test_backward_cpu(self):
+        self.check_backward(self.points, self.grad_matrix)
+
+    @attr.gpu
+    @condition.retry(5)
+    def test_backward_gpu(self):
+        self.check_backward(
+            cuda.to_gpu(self.points), cuda.to_gpu(self.grad_matrix)
+        )
+
+    def check_forward_batch(self, points_data, sdf_data):
+        xp = cuda.get_array_module(points_data)
+        pitch = xp.asarray([0.5, 0.4], dtype=np.float32)
+        origin = xp.asarray([[0, 0, 0], [0.3, -0.2, 0.1]], dtype=np.float32)
+        batch_indices = xp.asarray(
+            [0] * 6 + [1] * (len(points_data) - 6), dtype=np.int32
+        )
+        grids_batch = pseudo_occupancy_voxelization(
+            points_data,
+            sdf_data,
+            pitch=pitch,
+            origin=origin,
+            dims=self.dims,
+            threshold=2,
+            batch_indices=batch_indices,
+            batch_size=2,
+        )
+        for i in range(2):
+            mask = batch_indices == i
+            grids_i = pseudo_occupancy_voxelization(
+                points_data[mask],
+                sdf_data[mask],
+                pitch=pitch[i],
+                origin=origin[i],
+                dims=self.dims,
+                threshold=2,
+            )
+            for grid_batch, grid_i in zip(grids_batch, grids_i):
+                self.assertEqual(grid_batch.shape, (2,) + self.dims)
+                testing.assert_allclose(grid_batch.array[i], grid_i.array)
+
+    def test_forward_batch_cpu(self):
+        self.check_forward_batch(self.points, self.sdf)
+
+    @attr.gpu
+    def test_forward_batch_gpu(self):
+        self.check_forward_batch(
+            cuda.to_gpu(self.points), cuda.to_gpu(self.sdf)
+        )
+
+    def test_pseudo_occupancy_voxelization_cpu(self):
+        grids = pseudo_occupancy_voxelization(
+            self.points,
+            self.sdf,
+            pitch=self.pitch,
+            origin=self.origin,
+            dims=self.dims,
+            threshold=2,
+        )
+        for grid in grids:
+            self.assertEqual(grid.shape, self.dims)
+            self.assertTrue(((0 <= grid.array) & (grid.array <= 1)).all())
+
+
+testing.run_module(__name__, __file__)
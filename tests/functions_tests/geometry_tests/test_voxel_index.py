@@ -0,0 +1,162 @@
+import unittest
+
+import chainer
+from chainer import testing
+import numpy as np
+
+from morefusion.functions.geometry.average_voxelization_3d import (
+    average_voxelization_3d,  # NOQA
+)
+from morefusion.functions.geometry.interpolate_voxel_grid import (
+    interpolate_voxel_grid,  # NOQA
+)
+from morefusion.functions.geometry.max_voxelization_3d import (
+    max_voxelization_3d,  # NOQA
+)
+from morefusion.functions.geometry.voxel_index import VoxelIndex
+
+
+class TestVoxelIndex(unittest.TestCase):
+    def setUp(self):
+        self.dimensions = (8, 8, 8)
+        self.origin = np.array([-1, -1, -1], dtype=np.float32)
+        self.pitch = np.float32(2.0 / 8)
+        self.batch_size = 3
+
+        n_points = 256
+        self.points = np.random.uniform(-1.2, 1.2, (n_points, 3)).astype(
+            np.float32
+        )
+        self.batch_indices = np.random.randint(
+            0, self.batch_size, n_points
+        ).astype(np.int32)
+        self.kwargs = dict(
+            batch_size=self.batch_size,
+            origin=self.origin,
+            pitch=self.pitch,
+            dimensions=self.dimensions,
+        )
+        self.voxel_index = VoxelIndex(
+            self.points, self.batch_indices, **self.kwargs
+        )
+
+    def test_counts(self):
+        _, counts = average_voxelization_3d(
+            np.zeros((len(self.points), 1), dtype=np.float32),
+            self.points,
+            self.batch_indices,
+            return_counts=True,
+            **self.kwargs,
+        )
+        testing.assert_allclose(self.voxel_index.counts, counts)
+
+    def check_voxelization(self, func, *args):
+        for channels in [4, 16]:
+            values = np.random.uniform(
+                -1, 1, (len(self.points), channels)
+            ).astype(np.float32)
+            grad = np.random.uniform(
+                -1, 1, (self.batch_size, channels) + self.dimensions
+            ).astype(np.float32)
+
+            values1 = chainer.Variable(values)
+            y1 = func(
+                values1, self.points, self.batch_indices, *args, **self.kwargs
+            )
+            chainer.functions.sum(y1 * grad).backward()
+
+            values2 = chainer.Variable(values)
+            y2 = func(
+                values2,
+                self.points,
+                self.batch_indices,
+                *args,
+                voxel_index=self.voxel_index,
+                **self.kwargs,
+            )
+            chainer.functions.sum(y2 * grad).backward()
+
+            testing.assert_allclose(y1.array, y2.array, atol=0, rtol=0)
+            testing.assert_allclose(values1.grad, values2.grad)
+
+    def test_average_voxelization_3d(self):
+        self.check_voxelization(average_voxelization_3d)
+
+    def test_max_voxelization_3d(self):
+        intensities = np.random.uniform(0, 1, len(self.points)).astype(
+            np.float32
+        )
+        self.check_voxelization(max_voxelization_3d, intensities)
+
+    def test_interpolate_voxel_grid(self):
+        voxelized = np.random.uniform(
+            -1, 1, (self.batch_size, 4) + self.dimensions
+        ).astype(np.float32)
+        points = (self.points - self.origin) / self.pitch
+
+        y1 = interpolate_voxel_grid(voxelized, points, self.batch_indices)
+        y2 = interpolate_voxel_grid(
+            voxelized,
+            points,
+            self.batch_indices,
+            voxel_index=self.voxel_index,
+        )
+        testing.assert_allclose(y1.array, y2.array)
+
+    def test_invalid_grid(self):
+        with self.assertRaises(ValueError):
+            average_voxelization_3d(
+                np.zeros((len(self.points), 1), dtype=np.float32),
+                self.points,
+                self.batch_indices,
+                batch_size=self.batch_size,
+                origin=self.origin,
+                pitch=self.pitch,
+                dimensions=(4, 4, 4),
+                voxel_index=self.voxel_index,
+            )
+
+    def test_invalid_points(self):
+        values = np.zeros((len(self.points), 1), dtype=np.float32)
+        kwargs = dict(self.kwargs, voxel_index=self.voxel_index)
+
+        points = self.points.copy()
+        average_voxelization_3d(values, points, self.batch_indices, **kwargs)
+
+        points[0] += self.pitch
+        with self.assertRaises(ValueError):
+            average_voxelization_3d(
+                values, points, self.batch_indices, **kwargs
+            )
+
+        voxelized = np.zeros(
+            (self.batch_size, 1) + self.dimensions, dtype=np.float32
+        )
+        with self.assertRaises(ValueError):
+            interpolate_voxel_grid(
+                voxelized,
+                (points - self.origin) / self.pitch,
+                self.batch_indices,
+                voxel_index=self.voxel_index,
+            )
+
+    def test_invalid_origin_pitch(self):
+        values = np.zeros((len(self.points), 1), dtype=np.float32)
+        for key, value in [
+            ("origin", self.origin + self.pitch),
+            ("pitch", self.pitch * 2),
+        ]:
+            kwargs = dict(self.kwargs, voxel_index=self.voxel_index)
+            kwargs[key] = value
+            for sparse in [False, True]:
+                with self.assertRaises(ValueError):
+                    average_voxelization_3d(
+                        values,
+                        self.points,
+                        self.batch_indices,
+                        sparse=sparse,
+                        **kwargs,
+                    )
+
+
+testing.run_module(__name__, __file__)
@@ -2,6 +2,7 @@ import numpy as np
 import trimesh
 
 from morefusion.geometry import pointcloud_from_depth
+from morefusion.geometry import PointcloudProjector
 
 
 def test_pointcloud_from_depth():
@@ -15,3 +16,41 @@ def test_pointcloud_from_depth():
     pcd = pointcloud_from_depth(depth, fx, fy, cx, cy)
     assert pcd.shape == (H, W, 3)
     assert pcd.dtype == np.float64
+
+
+def test_pointcloud_projector():
+    H, W = 256, 256
+    K = trimesh.scene.Camera(resolution=(W, H), fov=(60, 60)).K
+    fx, fy = K[0, 0], K[1, 1]
+    cx, cy = K[0, 2], K[1, 2]
+
+    depth = np.random.uniform(0, 3, (H, W)).astype(np.float32)
+    depth[depth < 0.5] = np.nan
+
+    for depth_type in ["z", "euclidean"]:
+        pcd_expected = pointcloud_from_depth(
+            depth.astype(np.float64), fx, fy, cx, cy, depth_type=depth_type
+        )
+        if depth_type == "z":
+            c, r = np.meshgrid(np.arange(W), np.arange(H))
+            np.testing.assert_allclose(
+                pcd_expected[:, :, 0], depth * (c - cx) / fx, rtol=1e-6
+            )
+        else:
+            np.testing.assert_allclose(
+                np.linalg.norm(pcd_expected, axis=2), depth, rtol=1e-6
+            )
+
+        projector = PointcloudProjector(
+            fx, fy, cx, cy, depth_type=depth_type, dtype=np.float32
+        )
+        pcd = projector(depth)
+        assert pcd.shape == (H, W, 3)
+        assert pcd.dtype == np.float32
+        np.testing.assert_allclose(pcd, pcd_expected, rtol=1e-5)
+
+        roi = (10, 20, 100, 200)
+        out = np.empty((90, 180, 3), dtype=np.float32)
+        pcd_roi = projector(depth, roi=roi, out=out)
+        assert pcd_roi is out
+        np.testing.assert_allclose(pcd_roi, pcd[10:100, 20:200])
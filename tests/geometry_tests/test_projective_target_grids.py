@@ -0,0 +1,60 @@
+import numpy as np
+import trimesh
+
+from morefusion.geometry import projective_target_grids
+
+
+def test_projective_target_grids():
+    H, W = 256, 256
+    K = trimesh.scene.Camera(resolution=(W, H), fov=(60, 60)).K
+
+    # plane at z=1, whose left half is instance 1 and right half is 2
+    depth = np.full((H, W), 1.0)
+    instance_label = np.zeros((H, W), dtype=np.int32)
+    instance_label[:, : W // 2] = 1
+    instance_label[:, W // 2 :] = 2
+    depth[:, -8:] = np.nan
+
+    dimensions = (16, 16, 16)
+    pitch = 0.01
+    origin = np.array([-0.075, -0.075, 0.925])
+
+    grid_target, grid_nontarget, grid_empty = projective_target_grids(
+        depth,
+        instance_label,
+        K,
+        origin=origin,
+        pitch=pitch,
+        dimensions=dimensions,
+        target_id=1,
+    )
+    for grid in [grid_target, grid_nontarget, grid_empty]:
+        assert grid.shape == dimensions
+        assert grid.dtype == np.float32
+
+    # z = 0.925 + k * 0.01
+    assert (grid_empty[:, :, :7] > 0).all()
+    assert (grid_empty[:, :, 8:] == 0).all()
+    occupied = (grid_target > 0) | (grid_nontarget > 0)
+    assert occupied[:, :, 7].all()
+    assert not occupied[:, :, :7].any() and not occupied[:, :, 8:].any()
+    assert (grid_target[:8, :, 7] > 0).all()
+    assert (grid_nontarget[8:, :, 7] > 0).all()
+    assert not ((grid_target > 0) & (grid_nontarget > 0)).any()
+
+    # batched
+    grids = projective_target_grids(
+        depth,
+        instance_label,
+        K,
+        origin=[origin, origin],
+        pitch=[pitch, pitch],
+        dimensions=dimensions,
+        target_id=[1, 2],
+    )
+    for grid in grids:
+        assert grid.shape == (2,) + dimensions
+    np.testing.assert_equal(grids[0][0], grid_target)
+    np.testing.assert_equal(grids[0][1], grid_nontarget)
+    np.testing.assert_equal(grids[1][1], grid_target)
+    np.testing.assert_equal(grids[2][1], grid_empty)